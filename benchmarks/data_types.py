@@ -0,0 +1,147 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+"""Benchmark property validation against deeply nested data types.
+
+Validates the properties of thousands of node templates whose type
+property is a chain of nested (and derived) data types, once with plain
+data types definitions, compiling every schema on each use, once with
+``utils.CompiledDataTypes`` which compiles each data type once, and once
+more sharing the node type's compiled schema between templates. A full
+blueprint parse of a smaller number of node templates is timed as well.
+
+    PYTHONPATH=. python benchmarks/data_types.py --nodes 5000 --depth 6
+"""
+
+import argparse
+import copy
+import timeit
+
+import yaml
+
+from dsl_parser import utils
+from dsl_parser.parser import parse
+
+
+def data_types_definitions(depth):
+    data_types = {}
+    for level in range(depth):
+        properties = {
+            'name': {'type': 'string', 'default': 'level_{0}'.format(level)},
+            'count': {'type': 'integer', 'default': level},
+            'enabled': {'type': 'boolean', 'required': False},
+        }
+        if level + 1 < depth:
+            properties['child'] = {
+                'type': 'level_{0}_derived'.format(level + 1),
+                'default': {}
+            }
+        data_types['level_{0}'.format(level)] = {'properties': properties}
+        data_types['level_{0}_derived'.format(level)] = {
+            'derived_from': 'level_{0}'.format(level),
+            'properties': {
+                'ratio': {'type': 'float', 'default': 0.5}
+            }
+        }
+    return data_types
+
+
+def _instance_value(depth, index):
+    value = {}
+    current = value
+    for level in range(depth - 1):
+        if (index + level) % 2:
+            current['count'] = index
+        current['child'] = {}
+        current = current['child']
+    current['enabled'] = bool(index % 2)
+    return value
+
+
+def blueprint(nodes, depth):
+    return {
+        'tosca_definitions_version': 'cloudify_dsl_1_3',
+        'data_types': data_types_definitions(depth),
+        'node_types': {
+            'type': {
+                'properties': {
+                    'config': {'type': 'level_0_derived'}
+                }
+            }
+        },
+        'node_templates': dict(
+            ('node_{0}'.format(index), {
+                'type': 'type',
+                'properties': {'config': _instance_value(depth, index)}
+            }) for index in range(nodes))
+    }
+
+
+def _parsed_data_types(depth):
+    # the data types as parsed, with derived types schemas merged
+    definitions = data_types_definitions(depth)
+    parsed = {}
+    for name, data_type in definitions.items():
+        properties = copy.deepcopy(data_type['properties'])
+        parent = data_type.get('derived_from')
+        if parent:
+            for key, prop in definitions[parent]['properties'].items():
+                properties.setdefault(key, copy.deepcopy(prop))
+        parsed[name] = {'properties': properties}
+    return parsed
+
+
+def validate(data_types, nodes, depth, schema=None):
+    schema = schema or {'config': {'type': 'level_0_derived'}}
+    for index in range(nodes):
+        utils.merge_schema_and_instance_properties(
+            instance_properties={'config': _instance_value(depth, index)},
+            schema_properties=schema,
+            data_types=data_types,
+            undefined_property_error_message='{0} {1}',
+            missing_property_error_message='{0} {1}',
+            node_name='node_{0}'.format(index))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--nodes', type=int, default=5000)
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--parse-nodes', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data_types = _parsed_data_types(args.depth)
+    compiled = utils.CompiledDataTypes(data_types)
+    # templates sharing a node type share its compiled schema as well
+    node_type_schema = utils.PropertiesSchema(
+        {'config': {'type': 'level_0_derived'}})
+    for name, value, schema in [('plain', data_types, None),
+                                ('compiled', compiled, None),
+                                ('shared', compiled, node_type_schema)]:
+        elapsed = min(timeit.repeat(
+            lambda: validate(value, args.nodes, args.depth, schema),
+            number=1, repeat=args.repeat))
+        print('validate {0:8} {1} nodes: {2:.3f}s'.format(
+            name, args.nodes, elapsed))
+
+    plan_yaml = yaml.safe_dump(blueprint(args.parse_nodes, args.depth))
+    elapsed = min(timeit.repeat(lambda: parse(plan_yaml),
+                                number=1, repeat=args.repeat))
+    print('parse {0} nodes: {1:.3f}s'.format(args.parse_nodes, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+"""Compare prepare_deployment_plan with a compiled deployment template.
+
+Prepares deployment plans of one blueprint for several input sets, either
+by calling ``prepare_deployment_plan`` with the plan for every input set
+or through a template compiled once with ``compile_deployment_template``.
+
+    PYTHONPATH=. python benchmarks/deployment_template.py --nodes 100
+"""
+
+import argparse
+import timeit
+
+import yaml
+
+from dsl_parser.parser import parse
+from dsl_parser.tasks import (prepare_deployment_plan,
+                              compile_deployment_template)
+
+
+def blueprint(nodes):
+    node_templates = {}
+    for index in range(nodes):
+        node_templates['node_{0}'.format(index)] = {
+            'type': 'app_type',
+            'properties': {
+                'port': {'get_input': 'port'} if index % 10 == 0 else index,
+                'name': 'node_{0}'.format(index),
+                'config': {'values': range(20), 'enabled': True}
+            }
+        }
+    return {
+        'tosca_definitions_version': 'cloudify_dsl_1_3',
+        'plugins': {'plugin': {'executor': 'central_deployment_agent',
+                               'source': 'plugin'}},
+        'inputs': {'port': {'default': 8080}},
+        'node_types': {
+            'app_type': {
+                'properties': {'port': {}, 'name': {}, 'config': {}},
+                'interfaces': {
+                    'cloudify.interfaces.lifecycle': dict(
+                        (operation, 'plugin.tasks.{0}'.format(operation))
+                        for operation in ['create', 'configure', 'start',
+                                          'stop', 'delete'])
+                }
+            }
+        },
+        'node_templates': node_templates
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--nodes', type=int, default=100)
+    parser.add_argument('--deployments', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    plan = parse(yaml.safe_dump(blueprint(args.nodes)))
+    inputs = [{'port': 8000 + i} for i in range(args.deployments)]
+
+    def plain():
+        for deployment_inputs in inputs:
+            prepare_deployment_plan(plan, inputs=deployment_inputs)
+
+    def compiled():
+        template = compile_deployment_template(plan)
+        for deployment_inputs in inputs:
+            template.prepare_deployment_plan(inputs=deployment_inputs)
+
+    for name, func in [('plain', plain), ('compiled', compiled)]:
+        print('{0:10} {1:.3f}s'.format(
+            name, min(timeit.repeat(func, number=1, repeat=args.repeat))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+
+"""A parameterized synthetic blueprint generator.
+
+``blueprint`` generates the main blueprint and the blueprints it imports
+as dicts, ``write_blueprint`` writes them as YAML files. The blueprint
+is deterministic for given parameters:
+
+* ``node_types`` node types, each derived from a chain of
+  ``inheritance_depth`` base types adding properties and operations.
+* ``data_type_depth`` data types nested in one another, the type of a
+  property of every node type.
+* ``node_templates`` node templates, every tenth template is a host the
+  following ones are contained in, and each template is connected to up to
+  ``relationships`` of the templates before it.
+* ``scaling_groups`` scaling groups of hosts.
+* ``imports`` imported blueprints the node types and data types are
+  spread over.
+* ``function_density`` the probability of property values, operation
+  inputs and outputs to be intrinsic functions.
+"""
+
+import os
+import random
+
+import yaml
+
+DSL_VERSION = 'cloudify_dsl_1_3'
+INPUTS = 10
+# a host, and the templates contained in it
+HOST_EVERY = 10
+
+
+def blueprint(node_types=10,
+              node_templates=100,
+              inheritance_depth=3,
+              data_type_depth=3,
+              imports=0,
+              relationships=2,
+              scaling_groups=2,
+              function_density=0.3,
+              seed=0):
+    """The main blueprint and the imported blueprints by file name."""
+    rand = random.Random(seed)
+
+    def function(value):
+        return rand.random() < function_density and value
+
+    types = _types(node_types, inheritance_depth, data_type_depth, function)
+    templates = _node_templates(node_types, node_templates, relationships,
+                                data_type_depth, function)
+    hosts = [name for index, name in enumerate(sorted(
+        templates, key=lambda name: int(name.split('_')[1])))
+        if index % HOST_EVERY == 0]
+    main = {
+        'tosca_definitions_version': DSL_VERSION,
+        'inputs': dict(('input_{0}'.format(index),
+                        {'default': 8000 + index})
+                       for index in range(INPUTS)),
+        'node_templates': templates,
+        'outputs': _outputs(templates, function),
+    }
+    main.update(_scaling_groups(hosts, scaling_groups))
+
+    imported = {}
+    if imports:
+        for index in range(imports):
+            imported['types_{0}.yaml'.format(index)] = {
+                'tosca_definitions_version': DSL_VERSION}
+        for section in ['node_types', 'data_types']:
+            for position, name in enumerate(sorted(types[section])):
+                file_name = 'types_{0}.yaml'.format(position % imports)
+                imported[file_name].setdefault(section, {})[name] = \
+                    types[section][name]
+        types = dict((section, value) for section, value in types.items()
+                     if section not in ['node_types', 'data_types'])
+        main['imports'] = sorted(imported)
+    main.update(types)
+    return main, imported
+
+
+def write_blueprint(directory, **parameters):
+    """Write a generated blueprint and its imports to a directory and
+    return the main blueprint path. Imports are resolved relative to the
+    directory when it is passed as the resources base path."""
+    main, imported = blueprint(**parameters)
+    for file_name, content in imported.items() + [('blueprint.yaml', main)]:
+        with open(os.path.join(directory, file_name), 'w') as f:
+            yaml.safe_dump(content, f)
+    return os.path.join(directory, 'blueprint.yaml')
+
+
+def _types(node_types, inheritance_depth, data_type_depth, function):
+    data_types = {}
+    for level in range(data_type_depth):
+        properties = {
+            'name': {'type': 'string', 'default': 'level_{0}'.format(level)},
+            'count': {'type': 'integer', 'default': level},
+        }
+        if level + 1 < data_type_depth:
+            properties['child'] = {'type': 'data_type_{0}'.format(level + 1),
+                                   'default': {}}
+        data_types['data_type_{0}'.format(level)] = {
+            'properties': properties}
+
+    types = {}
+    for level in range(inheritance_depth):
+        base_type = {
+            'properties': {
+                'property_{0}'.format(level): {'default': level},
+            },
+            'interfaces': {
+                'interface_{0}'.format(level): {
+                    'operation': _operation(function)
+                }
+            }
+        }
+        if level:
+            base_type['derived_from'] = 'base_type_{0}'.format(level - 1)
+        types['base_type_{0}'.format(level)] = base_type
+    for index in range(node_types):
+        node_type = {
+            'properties': {
+                'name': {'type': 'string'},
+                'port': {'type': 'integer', 'default': 8080},
+            },
+            'interfaces': {
+                'cloudify.interfaces.lifecycle': dict(
+                    (operation, _operation(function))
+                    for operation in ['create', 'configure', 'start',
+                                      'stop', 'delete'])
+            }
+        }
+        if data_type_depth:
+            node_type['properties']['config'] = {'type': 'data_type_0',
+                                                 'default': {}}
+        if inheritance_depth:
+            node_type['derived_from'] = 'base_type_{0}'.format(
+                inheritance_depth - 1)
+        types['node_type_{0}'.format(index)] = node_type
+
+    return {
+        'plugins': {'plugin': {'executor': 'central_deployment_agent',
+                               'source': 'plugin'}},
+        'relationships': {
+            'cloudify.relationships.depends_on': {},
+            'cloudify.relationships.contained_in': {
+                'derived_from': 'cloudify.relationships.depends_on'},
+            'cloudify.relationships.connected_to': {
+                'derived_from': 'cloudify.relationships.depends_on',
+                'properties': {'connection_type': {'default': 'all_to_all'}}}
+        },
+        'node_types': types,
+        'data_types': data_types,
+    }
+
+
+def _operation(function):
+    return {
+        'implementation': 'plugin.tasks.operation',
+        'inputs': {
+            'name': {'default': function(
+                {'get_property': ['SELF', 'name']}) or 'name'},
+            'port': {'default': function(
+                {'get_property': ['SELF', 'port']}) or 8080},
+        }
+    }
+
+
+def _node_templates(node_types, node_templates, relationships,
+                    data_type_depth, function):
+    templates = {}
+    for index in range(node_templates):
+        name = 'node_{0}'.format(index)
+        template = {
+            'type': 'node_type_{0}'.format(index % max(node_types, 1)),
+            'properties': {
+                'name': function({'concat': [{'get_input': 'input_{0}'.format(
+                    index % INPUTS)}, '-', name]}) or name,
+                'port': function(
+                    {'get_input': 'input_{0}'.format(index % INPUTS)}) or
+                8000 + index,
+            },
+            'relationships': [],
+        }
+        if data_type_depth:
+            config = current = {}
+            for level in range(data_type_depth - 1):
+                current['count'] = index
+                current['child'] = {}
+                current = current['child']
+            current['name'] = function(
+                {'get_property': ['SELF', 'name']}) or name
+            template['properties']['config'] = config
+        host = index - index % HOST_EVERY
+        if host != index:
+            template['relationships'].append({
+                'type': 'cloudify.relationships.contained_in',
+                'target': 'node_{0}'.format(host)})
+        for target in range(max(host + 1, index - relationships), index):
+            template['relationships'].append({
+                'type': 'cloudify.relationships.connected_to',
+                'target': 'node_{0}'.format(target),
+                'source_interfaces': {
+                    'relationship_interface': {
+                        'operation': {
+                            'implementation': 'plugin.tasks.operation',
+                            'inputs': {
+                                'target_name': function(
+                                    {'get_property': ['TARGET', 'name']}) or
+                                'node_{0}'.format(target)
+                            }
+                        }
+                    }
+                }
+            })
+        templates[name] = template
+    return templates
+
+
+def _outputs(templates, function):
+    outputs = {}
+    for name in sorted(templates):
+        value = function({'concat': [{'get_attribute': [name, 'ip']}, ':',
+                                     {'get_property': [name, 'port']}]})
+        if value:
+            outputs['{0}_endpoint'.format(name)] = {'value': value}
+    return outputs
+
+
+def _scaling_groups(hosts, scaling_groups):
+    groups = {}
+    policies = {}
+    for index in range(min(scaling_groups, len(hosts))):
+        name = 'group_{0}'.format(index)
+        groups[name] = {'members': hosts[index::scaling_groups]}
+        policies['{0}_policy'.format(name)] = {
+            'type': 'cloudify.policies.scaling',
+            'targets': [name]}
+    if not groups:
+        return {}
+    return {'groups': groups, 'policies': policies}
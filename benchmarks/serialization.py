@@ -0,0 +1,132 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+"""Compare the serialization module with json on a deployment plan.
+
+Prepares a deployment plan with many node instances and reports the
+serialized size and the dump and load times of ``json`` and of the
+``dsl_parser.serialization`` binary format, for the parsed plan and for
+the plan reloaded from JSON (with unicode strings only) as the manager
+stores it.
+
+    PYTHONPATH=. python benchmarks/serialization.py --nodes 50 --instances 20
+"""
+
+import argparse
+import io
+import json
+import timeit
+
+import yaml
+
+from dsl_parser import serialization
+from dsl_parser.parser import parse
+from dsl_parser.tasks import prepare_deployment_plan
+
+
+def blueprint(nodes, instances, plugins):
+    plugin_names = ['plugin_{0}'.format(i) for i in range(plugins)]
+    node_templates = {
+        'host': {
+            'type': 'cloudify.nodes.Compute',
+            'instances': {'deploy': instances}
+        }
+    }
+    for index in range(nodes):
+        node_templates['node_{0}'.format(index)] = {
+            'type': 'app_type_{0}'.format(index % 5),
+            'properties': {'port': 8000 + index},
+            'relationships': [{
+                'type': 'cloudify.relationships.contained_in',
+                'target': 'host'
+            }]
+        }
+    node_types = {'cloudify.nodes.Compute': {}}
+    for index in range(5):
+        node_types['app_type_{0}'.format(index)] = {
+            'properties': {'port': {'type': 'integer'}},
+            'interfaces': {
+                'cloudify.interfaces.lifecycle': dict(
+                    (operation, '{0}.tasks.{1}'.format(
+                        plugin_names[(index + i) % plugins], operation))
+                    for i, operation in enumerate(
+                        ['create', 'configure', 'start', 'stop', 'delete']))
+            }
+        }
+    return {
+        'tosca_definitions_version': 'cloudify_dsl_1_3',
+        'plugins': dict((name, {'executor': 'host_agent', 'source': name})
+                        for name in plugin_names),
+        'relationships': {'cloudify.relationships.contained_in': {}},
+        'node_types': node_types,
+        'node_templates': node_templates
+    }
+
+
+def _time(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--nodes', type=int, default=50)
+    parser.add_argument('--instances', type=int, default=20)
+    parser.add_argument('--plugins', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    parsed_plan = prepare_deployment_plan(parse(yaml.safe_dump(
+        blueprint(args.nodes, args.instances, args.plugins))))
+    print('node instances: {0}'.format(len(parsed_plan['node_instances'])))
+    # the manager stores plans as JSON and reloads them with unicode strings
+    reloaded_plan = json.loads(json.dumps(parsed_plan))
+
+    print('{0:24} {1:>10} {2:>8} {3:>8}'.format(
+        'plan / format', 'bytes', 'dump', 'load'))
+    for plan_name, plan in [('parsed', parsed_plan),
+                            ('reloaded', reloaded_plan)]:
+        for name, size, dump_time, load_time in _results(plan, args.repeat):
+            print('{0:24} {1:>10} {2:>7.3f}s {3:>7.3f}s'.format(
+                '{0} / {1}'.format(plan_name, name), size, dump_time,
+                load_time))
+
+
+def _results(plan, repeat):
+    binary = serialization.BINARY
+    json_data = json.dumps(plan)
+    binary_data = serialization.dumps(plan, output_format=binary)
+    return [
+        ('json', len(json_data),
+         _time(lambda: json.dumps(plan), repeat),
+         _time(lambda: json.loads(json_data), repeat)),
+        ('binary', len(binary_data),
+         _time(lambda: serialization.dumps(plan, output_format=binary),
+               repeat),
+         _time(lambda: serialization.loads(binary_data), repeat)),
+        ('binary stream', len(binary_data),
+         _time(lambda: serialization.dump(plan, io.BytesIO(),
+                                          output_format=binary), repeat),
+         _time(lambda: serialization.load(io.BytesIO(binary_data)),
+               repeat)),
+        ('binary shared', len(binary_data),
+         _time(lambda: serialization.dumps(plan, output_format=binary),
+               repeat),
+         _time(lambda: serialization.loads(binary_data, shared=True),
+               repeat)),
+    ]
+
+
+if __name__ == '__main__':
+    main()
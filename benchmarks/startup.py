@@ -0,0 +1,59 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+
+"""Measure the start-up time of importing dsl_parser modules.
+
+Every measurement imports the module in a new interpreter, so nothing is
+imported already, and reports the time the import took in that
+interpreter (the interpreter start-up itself is not included).
+
+    PYTHONPATH=. python benchmarks/startup.py --module dsl_parser.tasks
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+_MEASURE = """
+import time
+start = time.time()
+import {0}
+print(time.time() - start)
+"""
+
+
+def import_time(module):
+    output = subprocess.check_output(
+        [sys.executable, '-c', _MEASURE.format(module)],
+        env=dict(os.environ, PYTHONDONTWRITEBYTECODE='1'))
+    return float(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--module', action='append')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for module in args.module or ['dsl_parser.tasks']:
+        times = sorted(import_time(module) for _ in range(args.repeat))
+        print('{0:30} min {1:.3f}s median {2:.3f}s'.format(
+            module, times[0], times[len(times) // 2]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+
+"""Benchmark the parser entry points on a generated blueprint.
+
+Generates a blueprint with ``benchmarks.generator`` and times parsing it,
+preparing its deployment plan, creating the deployment plan's node
+instances, modifying the deployment (scaling a group, or a node when
+there are no groups) and evaluating its outputs.
+
+Every benchmark runs in its own process, which reports the run times and
+its peak resident memory (the peak while running the benchmark the first
+time and its increase over the peak after the benchmark's setup, in KiB
+on Linux). Results can be written as JSON for regression tracking.
+
+    PYTHONPATH=. python -m benchmarks.suite --node-templates 200 \
+        --json results.json
+"""
+
+import argparse
+import collections
+import json
+import multiprocessing
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import timeit
+import traceback
+
+from benchmarks import generator
+from dsl_parser import functions, multi_instance, parser, tasks
+
+
+class _Entity(dict):
+    """A node or a node instance for the evaluation storage."""
+
+    def __getattr__(self, name):
+        return self.get(name)
+
+
+class _Blueprint(object):
+
+    def __init__(self, path, directory):
+        self.path = path
+        self.directory = directory
+
+    def parse(self):
+        return parser.parse_from_path(self.path,
+                                      resources_base_path=self.directory)
+
+    def deployment_plan(self):
+        return tasks.prepare_deployment_plan(self.parse())
+
+
+def _modified_nodes(plan):
+    if plan['scaling_groups']:
+        return {sorted(plan['scaling_groups'])[0]: {'instances': 2}}
+    return {plan['nodes'][0]['id']: {'instances': 2}}
+
+
+def _modify_deployment(plan):
+    return multi_instance.modify_deployment(
+        nodes=plan['nodes'],
+        previous_nodes=plan['nodes'],
+        previous_node_instances=plan['node_instances'],
+        modified_nodes=_modified_nodes(plan),
+        scaling_groups=plan['scaling_groups'])
+
+
+def _evaluate_outputs(plan):
+    nodes = dict((node['id'], _Entity(node)) for node in plan['nodes'])
+    node_instances = dict(
+        (node_instance['id'], _Entity(
+            node_instance,
+            runtime_properties={'ip': '10.0.0.{0}'.format(index % 256)}))
+        for index, node_instance in enumerate(plan['node_instances']))
+
+    def get_node_instances(node_id=None):
+        return [node_instance for node_instance in node_instances.values()
+                if node_id is None or node_instance.node_id == node_id]
+
+    return functions.evaluate_outputs(
+        plan['outputs'],
+        get_node_instances_method=get_node_instances,
+        get_node_instance_method=node_instances.__getitem__,
+        get_node_method=nodes.__getitem__,
+        get_secret_method=lambda key: key)
+
+
+# name -> (setup(blueprint) returning the run argument, run(argument))
+BENCHMARKS = collections.OrderedDict([
+    ('parse', (lambda blueprint: blueprint,
+               lambda blueprint: blueprint.parse())),
+    ('prepare_deployment_plan', (lambda blueprint: blueprint.parse(),
+                                 tasks.prepare_deployment_plan)),
+    ('create_deployment_plan', (lambda blueprint: blueprint.parse(),
+                                multi_instance.create_deployment_plan)),
+    ('modify_deployment', (lambda blueprint: blueprint.deployment_plan(),
+                           _modify_deployment)),
+    ('evaluate_outputs', (lambda blueprint: blueprint.deployment_plan(),
+                          _evaluate_outputs)),
+])
+
+
+def _peak_memory():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _run(name, blueprint, repeat):
+    setup, run = BENCHMARKS[name]
+    times = []
+    for index in range(repeat):
+        argument = setup(blueprint)
+        if index == 0:
+            memory_after_setup = _peak_memory()
+        start = timeit.default_timer()
+        run(argument)
+        times.append(timeit.default_timer() - start)
+        if index == 0:
+            peak_memory = _peak_memory()
+    return {
+        'name': name,
+        'times': times,
+        'min_seconds': min(times),
+        'median_seconds': sorted(times)[len(times) // 2],
+        'peak_memory_kb': peak_memory,
+        'memory_increase_kb': peak_memory - memory_after_setup,
+    }
+
+
+def _run_in_child(connection, name, blueprint, repeat):
+    try:
+        connection.send((_run(name, blueprint, repeat), None))
+    except Exception:
+        connection.send((None, traceback.format_exc()))
+    finally:
+        connection.close()
+
+
+def run_benchmark(name, blueprint, repeat=3):
+    """Run a benchmark in a new process and return its results."""
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=_run_in_child, args=(sender, name, blueprint, repeat))
+    process.start()
+    result, error = receiver.recv()
+    process.join()
+    if error:
+        raise RuntimeError('Benchmark {0} failed:\n{1}'.format(name, error))
+    return result
+
+
+def run(benchmarks=None, repeat=3, **parameters):
+    """Generate a blueprint with the generator parameters, run the
+    benchmarks on it and return the results."""
+    directory = tempfile.mkdtemp(prefix='dsl-parser-benchmark-')
+    try:
+        blueprint = _Blueprint(
+            generator.write_blueprint(directory, **parameters), directory)
+        results = [run_benchmark(name, blueprint, repeat)
+                   for name in benchmarks or BENCHMARKS]
+    finally:
+        shutil.rmtree(directory)
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': parameters,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--benchmark', action='append',
+                        choices=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', metavar='PATH',
+                        help="write the results as JSON ('-' for stdout)")
+    parser.add_argument('--node-types', type=int, default=10)
+    parser.add_argument('--node-templates', type=int, default=100)
+    parser.add_argument('--inheritance-depth', type=int, default=3)
+    parser.add_argument('--data-type-depth', type=int, default=3)
+    parser.add_argument('--imports', type=int, default=0)
+    parser.add_argument('--relationships', type=int, default=2)
+    parser.add_argument('--scaling-groups', type=int, default=2)
+    parser.add_argument('--function-density', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    report = run(benchmarks=args.benchmark,
+                 repeat=args.repeat,
+                 node_types=args.node_types,
+                 node_templates=args.node_templates,
+                 inheritance_depth=args.inheritance_depth,
+                 data_type_depth=args.data_type_depth,
+                 imports=args.imports,
+                 relationships=args.relationships,
+                 scaling_groups=args.scaling_groups,
+                 function_density=args.function_density,
+                 seed=args.seed)
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        return
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    for result in report['results']:
+        print('{0:25} min {1:.3f}s median {2:.3f}s peak {3} KiB '
+              '(+{4} KiB)'.format(result['name'],
+                                  result['min_seconds'],
+                                  result['median_seconds'],
+                                  result['peak_memory_kb'],
+                                  result['memory_increase_kb']))
+
+
+if __name__ == '__main__':
+    main()
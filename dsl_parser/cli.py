@@ -0,0 +1,81 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+
+"""Validate blueprints from the command line.
+
+Parses blueprints in a pool of processes (see parser.parse_many) and
+writes a JSON line with the result of every blueprint, in the order the
+blueprints were given. The exit code is 1 when some blueprints are
+invalid.
+
+    cloudify-dsl-validate blueprints/*.yaml > results.jsonl
+    find catalog -name blueprint.yaml | cloudify-dsl-validate - --plans
+"""
+
+import argparse
+import json
+import sys
+
+from dsl_parser import parser
+
+
+def _paths(arguments, stdin):
+    for argument in arguments:
+        if argument == '-':
+            for line in stdin:
+                if line.strip():
+                    yield line.strip()
+        else:
+            yield argument
+
+
+def main(argv=None, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr):
+    arg_parser = argparse.ArgumentParser(
+        description=__doc__.split('\n')[0])
+    arg_parser.add_argument(
+        'paths', nargs='+', metavar='PATH',
+        help="blueprint paths, '-' reads paths from the standard input, "
+             "one per line")
+    arg_parser.add_argument(
+        '--processes', type=int,
+        help='the number of worker processes (the number of CPUs by '
+             'default)')
+    arg_parser.add_argument('--resources-base-path')
+    arg_parser.add_argument('--no-validate-version', action='store_true')
+    arg_parser.add_argument('--plans', action='store_true',
+                            help='include the parsed plans in the results')
+    args = arg_parser.parse_args(argv)
+
+    invalid = 0
+    results = parser.parse_many(
+        _paths(args.paths, stdin),
+        resources_base_path=args.resources_base_path,
+        validate_version=not args.no_validate_version,
+        processes=args.processes,
+        include_plans=args.plans)
+    for result in results:
+        if not result['valid']:
+            invalid += 1
+        stdout.write(json.dumps(result) + '\n')
+        stdout.flush()
+    if invalid:
+        stderr.write('{0} invalid blueprints\n'.format(invalid))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -225,6 +225,9 @@ class DataTypes(types.Types):
         if validate_version:
             self.validate_version(version, (1, 2))
 
+    def parse(self, **kwargs):
+        return utils.CompiledDataTypes(self.build_dict_result())
+
 
 # source: element describing data_type name
 # target: data_type
@@ -213,12 +213,8 @@ def _build_ordered_imports(parsed_dsl_holder,
                 imports_graph.add_graph_dependency(import_url,
                                                    location(_current_import))
             else:
-                raw_imported_dsl = resolver.fetch_import(import_url)
-                imported_dsl_holder = utils.load_yaml(
-                    raw_yaml=raw_imported_dsl,
-                    error_message="Failed to parse import '{0}' (via '{1}')"
-                                  .format(another_import, import_url),
-                    filename=another_import)
+                imported_dsl_holder = _load_import(resolver, import_url,
+                                                   another_import)
                 imports_graph.add(import_url, imported_dsl_holder,
                                   location(_current_import))
                 _build_ordered_imports_recursive(imported_dsl_holder,
@@ -227,6 +223,21 @@ def _build_ordered_imports(parsed_dsl_holder,
     return imports_graph.topological_sort()
 
 
+def _load_import(resolver, import_url, another_import):
+    error_message = "Failed to parse import '{0}' (via '{1}')".format(
+        another_import, import_url)
+    # resolvers may keep the imports they loaded (see parser.parse_many),
+    # a resolver's load_import returns a holder the caller may modify
+    load_import = getattr(resolver, 'load_import', None)
+    if load_import is not None:
+        return load_import(import_url,
+                           error_message=error_message,
+                           filename=another_import)
+    return utils.load_yaml(raw_yaml=resolver.fetch_import(import_url),
+                           error_message=error_message,
+                           filename=another_import)
+
+
 def _validate_version(dsl_version,
                       import_url,
                       parsed_imported_dsl_holder):
@@ -13,6 +13,7 @@
 #    * See the License for the specific language governing permissions and
 #    * limitations under the License.
 
+import collections
 import copy
 
 from dsl_parser import (exceptions,
@@ -63,10 +64,17 @@ class NodeTemplateProperties(Element):
     def parse(self, node_types, data_types):
         properties = self.initial_value or {}
         node_type_name = self.sibling(NodeTemplateType).value
-        node_type = node_types[node_type_name]
+        # templates of the same type are validated against a single
+        # compiled schema
+        schemas = self.ancestor(NodeTemplates).properties_schemas
+        schema = schemas.get(node_type_name)
+        if schema is None:
+            schema = utils.PropertiesSchema(
+                node_types[node_type_name]['properties'])
+            schemas[node_type_name] = schema
         return utils.merge_schema_and_instance_properties(
             instance_properties=properties,
-            schema_properties=node_type['properties'],
+            schema_properties=schema,
             data_types=data_types,
             undefined_property_error_message=(
                 "'{0}' node '{1}' property is not part of the derived"
@@ -344,7 +352,7 @@ class NodeTemplate(Element):
         'self': [Value('related_node_templates',
                        predicate=_node_template_related_nodes_predicate,
                        multiple_results=True)],
-        _plugins.Plugins: [Value('plugins')],
+        _plugins.Plugins: [Value('plugins'), 'plugins_prefix_index'],
         _node_types.NodeType: [
             Value('node_type',
                   predicate=_node_template_node_type_predicate)],
@@ -355,6 +363,7 @@ class NodeTemplate(Element):
               node_type,
               host_types,
               plugins,
+              plugins_prefix_index,
               resource_base,
               related_node_templates):
         node = self.build_dict_result()
@@ -364,24 +373,38 @@ class NodeTemplate(Element):
             constants.TYPE_HIERARCHY: node_type[constants.TYPE_HIERARCHY]
         })
 
-        node[constants.INTERFACES] = interfaces_parser.\
-            merge_node_type_and_node_template_interfaces(
-                node_type_interfaces=node_type[constants.INTERFACES],
-                node_template_interfaces=node[constants.INTERFACES])
-
-        node['operations'] = _process_operations(
-            partial_error_message="in node '{0}' of type '{1}'"
-                                  .format(node['id'], node['type']),
-            interfaces=node[constants.INTERFACES],
-            plugins=plugins,
-            error_code=10,
-            resource_base=resource_base)
+        # templates of the same type with the same interfaces (e.g. templates
+        # that don't override any interface) share the merged interfaces and
+        # their processed operations. parsed values are only exposed as
+        # copies, so sharing them between templates is safe.
+        merged_interfaces = self.ancestor(NodeTemplates).merged_interfaces
+        merged_interfaces_key = (node['type'],
+                                 _fingerprint(node[constants.INTERFACES]))
+        if merged_interfaces_key not in merged_interfaces:
+            interfaces = interfaces_parser.\
+                merge_node_type_and_node_template_interfaces(
+                    node_type_interfaces=node_type[constants.INTERFACES],
+                    node_template_interfaces=node[constants.INTERFACES])
+            operations = _process_operations(
+                partial_error_message="in node '{0}' of type '{1}'"
+                                      .format(node['id'], node['type']),
+                interfaces=interfaces,
+                plugins=plugins,
+                plugins_prefix_index=plugins_prefix_index,
+                error_code=10,
+                resource_base=resource_base)
+            merged_interfaces[merged_interfaces_key] = (interfaces,
+                                                        operations)
+        node[constants.INTERFACES], node['operations'] = merged_interfaces[
+            merged_interfaces_key]
 
         node_name_to_node = dict((node['id'], node)
                                  for node in related_node_templates)
         _post_process_node_relationships(processed_node=node,
                                          node_name_to_node=node_name_to_node,
                                          plugins=plugins,
+                                         plugins_prefix_index=(
+                                             plugins_prefix_index),
                                          resource_base=resource_base)
 
         contained_in = self.child(NodeTemplateRelationships).provided[
@@ -397,9 +420,21 @@ class NodeTemplate(Element):
         return node
 
 
+def _fingerprint(value):
+    # a hashable representation of a parsed value, types are included so
+    # that equal values of different types (e.g. 1 and True) differ
+    if isinstance(value, dict):
+        return dict, tuple(sorted((_fingerprint(key), _fingerprint(item))
+                                  for key, item in value.iteritems()))
+    if isinstance(value, list):
+        return list, tuple(_fingerprint(item) for item in value)
+    return type(value), value
+
+
 def _post_process_node_relationships(processed_node,
                                      node_name_to_node,
                                      plugins,
+                                     plugins_prefix_index,
                                      resource_base):
     for relationship in processed_node[constants.RELATIONSHIPS]:
         target_node = node_name_to_node[relationship['target_id']]
@@ -409,6 +444,7 @@ def _post_process_node_relationships(processed_node,
             operations_attribute='source_operations',
             node_for_plugins=processed_node,
             plugins=plugins,
+            plugins_prefix_index=plugins_prefix_index,
             resource_base=resource_base)
         _process_node_relationships_operations(
             relationship=relationship,
@@ -416,12 +452,14 @@ def _post_process_node_relationships(processed_node,
             operations_attribute='target_operations',
             node_for_plugins=target_node,
             plugins=plugins,
+            plugins_prefix_index=plugins_prefix_index,
             resource_base=resource_base)
 
 
 def _process_operations(partial_error_message,
                         interfaces,
                         plugins,
+                        plugins_prefix_index,
                         error_code,
                         resource_base):
     operations = {}
@@ -434,7 +472,8 @@ def _process_operations(partial_error_message,
                 partial_error_message=(
                     "In interface '{0}' {1}".format(interface_name,
                                                     partial_error_message)),
-                resource_bases=resource_base)
+                resource_bases=resource_base,
+                plugins_prefix_index=plugins_prefix_index)
         for operation in interface_operations:
             operation_name = operation.pop('name')
             if operation_name in operations:
@@ -456,6 +495,7 @@ def _process_node_relationships_operations(relationship,
                                            operations_attribute,
                                            node_for_plugins,
                                            plugins,
+                                           plugins_prefix_index,
                                            resource_base):
     partial_error_message = "in relationship of type '{0}' in node '{1}'" \
         .format(relationship['type'],
@@ -465,6 +505,7 @@ def _process_node_relationships_operations(relationship,
         partial_error_message=partial_error_message,
         interfaces=relationship[interfaces_attribute],
         plugins=plugins,
+        plugins_prefix_index=plugins_prefix_index,
         error_code=19,
         resource_base=resource_base)
 
@@ -484,6 +525,14 @@ class NodeTemplates(Element):
         'deployment_plugins_to_install'
     ]
 
+    def __init__(self, *args, **kwargs):
+        super(NodeTemplates, self).__init__(*args, **kwargs)
+        # (node type, node template interfaces fingerprint) -> merged
+        # interfaces and processed operations
+        self.merged_interfaces = {}
+        # node type -> compiled properties schema
+        self.properties_schemas = {}
+
     def parse(self, host_types, plugins):
         processed_nodes = dict((node.name, node.value)
                                for node in self.children())
@@ -521,24 +570,30 @@ def _process_nodes_plugins(processed_nodes,
         for rel in node['relationships']:
             node_operations.append(rel['source_operations'])
             nodes_operations[rel['target_id']].append(rel['target_operations'])
+    # plugin descriptors are shared by all nodes using the same plugin with
+    # the same executor
+    plugin_descriptors = {}
+    nodes_by_host_id = collections.defaultdict(list)
     for node_name, node in processed_nodes.iteritems():
         node[constants.PLUGINS] = _get_plugins_from_operations(
             operations_lists=nodes_operations[node_name],
-            processed_plugins=plugins)
+            processed_plugins=plugins,
+            plugin_descriptors=plugin_descriptors)
+        if 'host_id' in node:
+            nodes_by_host_id[node['host_id']].append(node)
 
     for node in processed_nodes.itervalues():
         # set plugins_to_install property for nodes
         if node['type'] in host_types:
             plugins_to_install = {}
-            for another_node in processed_nodes.itervalues():
-                # going over all other nodes, to accumulate plugins
-                # from different nodes whose host is the current node
-                if another_node.get('host_id') == node['id']:
-                    # ok to override here since we assume it is the same plugin
-                    for plugin in another_node[constants.PLUGINS]:
-                        if plugin[constants.PLUGIN_EXECUTOR_KEY] \
-                                == constants.HOST_AGENT:
-                            plugins_to_install[plugin['name']] = plugin
+            # accumulate plugins from different nodes whose host is the
+            # current node
+            for another_node in nodes_by_host_id.get(node['id'], []):
+                # ok to override here since we assume it is the same plugin
+                for plugin in another_node[constants.PLUGINS]:
+                    if plugin[constants.PLUGIN_EXECUTOR_KEY] \
+                            == constants.HOST_AGENT:
+                        plugins_to_install[plugin['name']] = plugin
             node[constants.PLUGINS_TO_INSTALL] = plugins_to_install.values()
 
         # set deployment_plugins_to_install property for nodes
@@ -554,7 +609,8 @@ def _process_nodes_plugins(processed_nodes,
 
 
 def _get_plugins_from_operations(operations_lists,
-                                 processed_plugins):
+                                 processed_plugins,
+                                 plugin_descriptors):
     plugins = {}
     for operations in operations_lists:
         for operation in operations.values():
@@ -566,9 +622,11 @@ def _get_plugins_from_operations(operations_lists,
             operation_executor = operation['executor']
             plugin_key = (plugin_name, operation_executor)
             if plugin_key not in plugins:
-                plugin = copy.deepcopy(plugin)
-                plugin['executor'] = operation_executor
-                plugins[plugin_key] = plugin
+                if plugin_key not in plugin_descriptors:
+                    plugin = copy.deepcopy(plugin)
+                    plugin['executor'] = operation_executor
+                    plugin_descriptors[plugin_key] = plugin
+                plugins[plugin_key] = plugin_descriptors[plugin_key]
     return plugins.values()
 
 
@@ -19,6 +19,7 @@ from dsl_parser import (constants,
                         exceptions,
                         utils)
 from dsl_parser.elements import (data_types,
+                                 plugins as _plugins,
                                  version as _version)
 from dsl_parser.framework.elements import (DictElement,
                                            Element,
@@ -179,13 +180,17 @@ def process_interface_operations(
         plugins,
         error_code,
         partial_error_message,
-        resource_bases):
+        resource_bases,
+        plugins_prefix_index=None):
+    if plugins_prefix_index is None:
+        plugins_prefix_index = _plugins.PluginsPrefixIndex(plugins)
     return [process_operation(plugins=plugins,
                               operation_name=operation_name,
                               operation_content=operation_content,
                               error_code=error_code,
                               partial_error_message=partial_error_message,
-                              resource_bases=resource_bases)
+                              resource_bases=resource_bases,
+                              plugins_prefix_index=plugins_prefix_index)
             for operation_name, operation_content in interface.items()]
 
 
@@ -196,7 +201,8 @@ def process_operation(
         error_code,
         partial_error_message,
         resource_bases,
-        is_workflows=False):
+        is_workflows=False,
+        plugins_prefix_index=None):
     payload_field_name = 'parameters' if is_workflows else 'inputs'
     mapping_field_name = 'mapping' if is_workflows else 'implementation'
     operation_mapping = operation_content[mapping_field_name]
@@ -214,8 +220,9 @@ def process_operation(
         else:
             return no_op_operation(operation_name=operation_name)
 
-    candidate_plugins = [p for p in plugins.keys()
-                         if operation_mapping.startswith('{0}.'.format(p))]
+    if plugins_prefix_index is None:
+        plugins_prefix_index = _plugins.PluginsPrefixIndex(plugins)
+    candidate_plugins = plugins_prefix_index.candidates(operation_mapping)
     if candidate_plugins:
         if len(candidate_plugins) > 1:
             raise exceptions.DSLParsingLogicException(
@@ -133,3 +133,36 @@ class Plugin(DictElement):
 class Plugins(DictElement):
 
     schema = Dict(type=Plugin)
+    provides = ['plugins_prefix_index']
+
+    def calculate_provided(self):
+        return {
+            'plugins_prefix_index': PluginsPrefixIndex(self.value or {})
+        }
+
+
+class PluginsPrefixIndex(object):
+    """Plugin names indexed by the first dotted segment of their name.
+
+    Used to find the plugins an operation mapping may refer to without
+    matching the mapping against every plugin name. The index is not
+    modified after it is built so copying it returns the index itself.
+    """
+
+    def __init__(self, plugin_names):
+        self._plugin_names = {}
+        for plugin_name in plugin_names:
+            self._plugin_names.setdefault(
+                plugin_name.split('.', 1)[0], []).append(plugin_name)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def candidates(self, operation_mapping):
+        """Names of the plugins that prefix the given operation mapping."""
+        return [plugin_name for plugin_name in self._plugin_names.get(
+                    operation_mapping.split('.', 1)[0], ())
+                if operation_mapping.startswith('{0}.'.format(plugin_name))]
@@ -13,7 +13,7 @@
 #    * See the License for the specific language governing permissions and
 #    * limitations under the License.
 
-import itertools
+import collections
 
 import networkx as nx
 
@@ -400,77 +400,35 @@ class Policies(DictElement):
         # nodes that are not (recursively) contained in node b too unless
         # node b is in that group as well
 
-        # first extract all group members (recursively)
-        group_members = {}
-        for member in member_graph:
+        # two nodes that (recursively) belong to the same group are both
+        # (recursively) contained in some node, unless they are contained
+        # in different root nodes. in that case, each of them has an ancestor
+        # node sharing a group with the other only if both root nodes belong
+        # to the group (root nodes are not contained in any node so they
+        # can share groups with any root node)
+        group_chains = _ancestor_chains(member_graph)
+        node_chains = _ancestor_chains(node_graph)
+
+        # group the node members of each top level group, and all the nodes
+        # pairs in a group share its top level group as well
+        top_level_group_node_members = collections.defaultdict(set)
+        for member, containing_groups in group_chains.items():
             if member in node_graph:
+                top_level_group_node_members[containing_groups[-1]].add(
+                    member)
+
+        for group_name in sorted(top_level_group_node_members):
+            node_members = top_level_group_node_members[group_name]
+            roots = dict((node, node_chains[node][-1])
+                         for node in node_members)
+            if len(set(roots.values())) < 2:
                 continue
-            group_members[member] = nx.ancestors(member_graph, member)
-
-        # next, remove members that are groups themselves
-        group_names = set(group_members.keys())
-        group_node_members = {}
-        for group_name, members in group_members.items():
-            group_node_members[group_name] = members - group_names
-
-        # now, for each group, for each node pair, verify both nodes in pair
-        # are contained (recursively) in some third node or one of them is
-        # contained in some third node that has this property
-        containing_nodes = {}
-
-        def check_pair(pair_key):
-            node_a, node_b = pair_key
-            if node_a == node_b:
-                return True
-            if node_a not in containing_nodes:
-                containing_nodes[node_a] = nx.topological_sort(
-                    node_graph, nbunch=[node_a])
-            if node_b not in containing_nodes:
-                containing_nodes[node_b] = nx.topological_sort(
-                    node_graph, nbunch=[node_b])
-            a_containing_nodes = set(containing_nodes[node_a])
-            a_containing_nodes.remove(node_a)
-            b_containing_nodes = set(containing_nodes[node_b])
-            b_containing_nodes.remove(node_b)
-            if not (a_containing_nodes or b_containing_nodes):
-                return True
-            if node_b in a_containing_nodes:
-                return True
-            if node_a in b_containing_nodes:
-                return True
-            if a_containing_nodes & b_containing_nodes:
-                return True
-            return False
-
-        checked_pairs = set()
-        ok_pairs = set()
-        problematic_pairs = set()
-        for node_members in group_node_members.values():
-            for node_a, node_b in itertools.product(node_members, repeat=2):
-                pair_key = tuple(sorted([node_a, node_b]))
-                if pair_key in checked_pairs:
+            for node_a in sorted(node_members):
+                if roots[node_a] in node_members:
                     continue
-                if check_pair(pair_key):
-                    ok_pairs.add(pair_key)
-                else:
-                    problematic_pairs.add(pair_key)
-                checked_pairs.add(pair_key)
-
-        def check_problematic_pair(node_a, node_b):
-            for node_a_containing_node in containing_nodes[node_a]:
-                pair_key = tuple(sorted([node_b, node_a_containing_node]))
-                if pair_key in ok_pairs:
-                    return True
-            for node_b_containing_node in containing_nodes[node_b]:
-                pair_key = tuple(sorted([node_a, node_b_containing_node]))
-                if pair_key in ok_pairs:
-                    return True
-            return False
-
-        for node_a, node_b in problematic_pairs:
-            if check_problematic_pair(node_a, node_b):
-                ok_pairs.add((node_a, node_b))
-            else:
+                node_b = min(node for node in node_members
+                             if roots[node] != roots[node_a])
+                node_a, node_b = sorted([node_a, node_b])
                 raise exceptions.DSLParsingLogicException(
                     exceptions.ERROR_NON_CONTAINED_GROUP_MEMBERS,
                     "Node '{0}' and '{1}' belong to some shared group but "
@@ -486,30 +444,26 @@ class Policies(DictElement):
         # if the node and its containee are in the same group, remove the
         # containee, otherwise, remove the group closest to the containing
         # node
+        group_chains = _ancestor_chains(member_graph)
+        node_chains = _ancestor_chains(node_graph)
         for member in member_graph:
             if member not in node_graph:
                 continue
-            containing_groups = nx.topological_sort(member_graph,
-                                                    nbunch=[member])
-            containing_nodes = nx.topological_sort(node_graph, nbunch=[member])
-            for node in containing_nodes:
-                if node == member:
-                    continue
+            containing_groups = group_chains[member]
+            for node in node_chains[member][1:]:
                 if node not in member_graph:
                     continue
 
-                containing_node_groups = nx.topological_sort(member_graph,
-                                                             nbunch=[node])
-                containing_node_groups_set = set(containing_node_groups)
+                containing_node_groups_set = set(group_chains[node])
 
-                shared_groups = (set(containing_groups) &
-                                 containing_node_groups_set)
-                if not shared_groups:
+                # groups are ordered from the innermost group
+                minimal_containing_group = next(
+                    (group for group in containing_groups
+                     if group in containing_node_groups_set), None)
+                if minimal_containing_group is None:
                     continue
 
-                minimal_containing_group = nx.topological_sort(
-                    member_graph, nbunch=shared_groups)[0]
-                direct_member_group = member_graph.successors(member)[0]
+                direct_member_group = containing_groups[1]
                 members = scaling_groups[minimal_containing_group]['members']
                 if direct_member_group == minimal_containing_group:
                     removed_member = member
@@ -523,3 +477,27 @@ class Policies(DictElement):
 
                 if removed_member in members:
                     members.remove(removed_member)
+
+
+def _ancestor_chains(graph):
+    """
+    Map each node of a graph in which nodes have at most one successor
+    to the list of the node and its ancestors, ordered from the node up.
+    """
+    chains = {}
+    for node in graph:
+        path = []
+        current = node
+        while current not in chains:
+            path.append(current)
+            successors = graph.successors(current)
+            if not successors:
+                chain = []
+                break
+            current = successors[0]
+        else:
+            chain = chains[current]
+        for path_node in reversed(path):
+            chain = [path_node] + chain
+            chains[path_node] = chain
+    return chains
@@ -34,14 +34,15 @@ class Relationship(types.Type):
     }
     requires = {
         'inputs': [Requirement('resource_base', required=False)],
-        _plugins.Plugins: [Value('plugins')],
+        _plugins.Plugins: [Value('plugins'), 'plugins_prefix_index'],
         'self': [Value('super_type',
                        predicate=types.derived_from_predicate,
                        required=False)],
         _data_types.DataTypes: [Value('data_types')]
     }
 
-    def parse(self, super_type, plugins, resource_base, data_types):
+    def parse(self, super_type, plugins, plugins_prefix_index,
+              resource_base, data_types):
         relationship_type = self.build_dict_result()
         if not relationship_type.get('derived_from'):
             relationship_type.pop('derived_from', None)
@@ -62,6 +63,7 @@ class Relationship(types.Type):
         _validate_relationship_fields(
             rel_obj=relationship_type,
             plugins=plugins,
+            plugins_prefix_index=plugins_prefix_index,
             rel_name=relationship_type_name,
             resource_base=resource_base)
         relationship_type['name'] = relationship_type_name
@@ -76,7 +78,8 @@ class Relationships(types.Types):
     schema = Dict(type=Relationship)
 
 
-def _validate_relationship_fields(rel_obj, plugins, rel_name, resource_base):
+def _validate_relationship_fields(rel_obj, plugins, plugins_prefix_index,
+                                  rel_name, resource_base):
     for interfaces in [constants.SOURCE_INTERFACES,
                        constants.TARGET_INTERFACES]:
         for interface_name, interface in rel_obj[interfaces].items():
@@ -85,4 +88,5 @@ def _validate_relationship_fields(rel_obj, plugins, rel_name, resource_base):
                 plugins=plugins,
                 error_code=19,
                 partial_error_message="Relationship '{0}'".format(rel_name),
-                resource_bases=resource_base)
+                resource_bases=resource_base,
+                plugins_prefix_index=plugins_prefix_index)
@@ -41,10 +41,10 @@ class Workflow(Element):
     ]
     requires = {
         'inputs': [Requirement('resource_base', required=False)],
-        _plugins.Plugins: [Value('plugins')]
+        _plugins.Plugins: [Value('plugins'), 'plugins_prefix_index']
     }
 
-    def parse(self, plugins, resource_base):
+    def parse(self, plugins, plugins_prefix_index, resource_base):
         if isinstance(self.initial_value, str):
             operation_content = {'mapping': self.initial_value,
                                  'parameters': {}}
@@ -57,7 +57,8 @@ class Workflow(Element):
             error_code=21,
             partial_error_message='',
             resource_bases=resource_base,
-            is_workflows=True)
+            is_workflows=True,
+            plugins_prefix_index=plugins_prefix_index)
 
 
 class Workflows(DictElement):
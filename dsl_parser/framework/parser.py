@@ -13,8 +13,6 @@
 #    * See the License for the specific language governing permissions and
 #    * limitations under the License.
 
-import networkx as nx
-
 from dsl_parser import exceptions
 from dsl_parser.framework import elements
 from dsl_parser.framework.requirements import Requirement
@@ -74,6 +72,7 @@ class Context(object):
                  element_cls,
                  element_name,
                  inputs):
+        import networkx as nx
         self.inputs = inputs or {}
         self.element_type_to_elements = {}
         self._root_element = None
@@ -106,6 +105,7 @@ class Context(object):
             yield current_element
 
     def descendants(self, element):
+        import networkx as nx
         return nx.descendants(self._element_tree, element)
 
     def _add_element(self, element, parent=None):
@@ -205,6 +205,7 @@ class Context(object):
                                   parent_element=parent_element)
 
     def _calculate_element_graph(self):
+        import networkx as nx
         self.element_graph = nx.DiGraph(self._element_tree)
         for element_type, _elements in self.element_type_to_elements.items():
             requires = element_type.requires
@@ -242,6 +243,7 @@ class Context(object):
         self.element_graph.reverse(copy=False)
 
     def elements_graph_topological_sort(self):
+        import networkx as nx
         try:
             return nx.topological_sort(self.element_graph)
         except nx.NetworkXUnfeasible:
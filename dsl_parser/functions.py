@@ -13,11 +13,16 @@
 #    * See the License for the specific language governing permissions and
 #    * limitations under the License.
 
-import pkg_resources
 import abc
+import collections
+import copy
+import threading
+import time
 
 from dsl_parser import (constants,
+                        concurrency,
                         exceptions,
+                        instrumentation,
                         scan)
 
 
@@ -25,7 +30,27 @@ SELF = 'SELF'
 SOURCE = 'SOURCE'
 TARGET = 'TARGET'
 
-TEMPLATE_FUNCTIONS = {}
+
+class _TemplateFunctions(dict):
+    """The registered functions by name.
+
+    The functions of the cloudify.tosca.ext.functions entry points are
+    registered the first time a name which is not registered is looked up,
+    as discovering them scans every installed distribution.
+    """
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name) or (
+            _register_entry_point_functions() and
+            dict.__contains__(self, name))
+
+    def __missing__(self, name):
+        if _register_entry_point_functions():
+            return self[name]
+        raise KeyError(name)
+
+
+TEMPLATE_FUNCTIONS = _TemplateFunctions()
 
 
 def register(fn=None, name=None):
@@ -39,14 +64,49 @@ def register(fn=None, name=None):
 
 
 def unregister(name):
+    # so an entry point function isn't registered after it was unregistered
+    _register_entry_point_functions()
     if name in TEMPLATE_FUNCTIONS:
         del TEMPLATE_FUNCTIONS[name]
 
 
+_REGISTERING = 'registering'
+_REGISTERED = 'registered'
+_entry_point_functions_state = None
+_entry_point_functions_lock = threading.RLock()
+
+
 def _register_entry_point_functions():
-    for entry_point in pkg_resources.iter_entry_points(
-            group='cloudify.tosca.ext.functions'):
-        register(fn=entry_point.load(), name=entry_point.name)
+    """Register the functions of the cloudify.tosca.ext.functions entry
+    points, unless they were registered already.
+
+    Functions registered with the same names explicitly (including the
+    built in ones) take precedence. Returns whether the functions were
+    registered by this call. If loading an entry point fails, the error is
+    raised and the registration is retried by the next call.
+    """
+    global _entry_point_functions_state
+    if _entry_point_functions_state == _REGISTERED:
+        return False
+    with _entry_point_functions_lock:
+        # a lookup while loading the entry points returns here as well
+        if _entry_point_functions_state is not None:
+            return False
+        _entry_point_functions_state = _REGISTERING
+        try:
+            import pkg_resources
+            for entry_point in pkg_resources.iter_entry_points(
+                    group='cloudify.tosca.ext.functions'):
+                if not dict.__contains__(TEMPLATE_FUNCTIONS,
+                                         entry_point.name):
+                    register(fn=entry_point.load(), name=entry_point.name)
+        except Exception:
+            # a broken entry point fails every lookup until it loads,
+            # rather than leaving its functions unregistered
+            _entry_point_functions_state = None
+            raise
+        _entry_point_functions_state = _REGISTERED
+    return True
 
 
 def _is_function(value):
@@ -57,7 +117,99 @@ def _is_function(value):
         and list(value.keys())[0] in TEMPLATE_FUNCTIONS
 
 
-_register_entry_point_functions()
+# returned by RuntimeEvaluationCache.get for values not cached
+NOT_CACHED = object()
+
+
+class RuntimeEvaluationCache(object):
+    """A cache of nodes, node instances and secrets shared by evaluations.
+
+    A RuntimeEvaluationStorage only keeps what it fetched for the duration
+    of one evaluation, a cache passed to the evaluation functions keeps the
+    fetched values across evaluations (e.g. repeated outputs evaluation).
+
+    Entries expire ``ttl`` seconds after they were fetched (never if
+    ``ttl`` is None) and the least recently used entries are evicted when
+    there are more than ``max_size`` entries. Callers updating the storage
+    should invalidate the cached values through the invalidate methods.
+    """
+
+    NODE = 'node'
+    NODE_INSTANCE = 'node_instance'
+    NODE_INSTANCES = 'node_instances'
+    SECRET = 'secret'
+
+    def __init__(self, max_size=1000, ttl=None, clock=time.time):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        # (kind, key) -> (value, version, expiry time), least recently
+        # used first
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kind, key):
+        """The cached value, or NOT_CACHED"""
+        with self._lock:
+            entry = self._entries.pop((kind, key), None)
+            if entry is None:
+                return NOT_CACHED
+            value, _, expires = entry
+            if expires is not None and expires <= self._clock():
+                return NOT_CACHED
+            self._entries[(kind, key)] = entry
+            return value
+
+    def put(self, kind, key, value):
+        """Cache a value, versioned by its version attribute if it has one
+        (e.g. node instances)"""
+        expires = None if self.ttl is None else self._clock() + self.ttl
+        with self._lock:
+            self._entries.pop((kind, key), None)
+            self._entries[(kind, key)] = (
+                value, getattr(value, 'version', None), expires)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_node_instance(self, node_instance_id, version=None):
+        """Invalidate a node instance, e.g. when its runtime properties are
+        updated.
+
+        The node instances lists holding the node instance are invalidated
+        as well. When a version is given, a node instance cached with this
+        version or a later one is kept.
+        """
+        with self._lock:
+            entry = self._entries.get((self.NODE_INSTANCE, node_instance_id))
+            if entry is not None:
+                cached_version = entry[1]
+                if version is not None and cached_version is not None \
+                        and cached_version >= version:
+                    return
+                del self._entries[(self.NODE_INSTANCE, node_instance_id)]
+            for key, (value, _, _) in self._entries.items():
+                if key[0] == self.NODE_INSTANCES and any(
+                        node_instance.id == node_instance_id
+                        for node_instance in value):
+                    del self._entries[key]
+
+    def invalidate_node(self, node_id):
+        """Invalidate a node and the list of its node instances, e.g. when
+        the node is scaled"""
+        with self._lock:
+            self._entries.pop((self.NODE, node_id), None)
+            self._entries.pop((self.NODE_INSTANCES, node_id), None)
+
+    def invalidate_secret(self, secret_key):
+        with self._lock:
+            self._entries.pop((self.SECRET, secret_key), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
 
 
 class RuntimeEvaluationStorage(object):
@@ -66,48 +218,214 @@ class RuntimeEvaluationStorage(object):
                  get_node_instances_method,
                  get_node_instance_method,
                  get_node_method,
-                 get_secret_method):
+                 get_secret_method,
+                 get_node_instances_bulk_method=None,
+                 get_nodes_bulk_method=None,
+                 cache=None,
+                 max_workers=None,
+                 scaling_groups_index=None):
         self._get_node_instances_method = get_node_instances_method
         self._get_node_instance_method = get_node_instance_method
         self._get_node_method = get_node_method
         self._get_secret_method = get_secret_method
+        self._get_node_instances_bulk_method = get_node_instances_bulk_method
+        self._get_nodes_bulk_method = get_nodes_bulk_method
+        self._cache = cache
+        self._max_workers = max_workers
+        self.scaling_groups_index = scaling_groups_index
 
         self._node_to_node_instances = {}
         self._node_instances = {}
         self._nodes = {}
         self._secrets = {}
 
+        # when set, the (node instance id, attribute path) pairs the
+        # evaluation depends on are added to dependencies, node instances
+        # used for resolving others with a None attribute path. the ids of
+        # nodes whose node instances were listed are added to
+        # node_dependencies.
+        self.dependencies = None
+        self.node_dependencies = None
+
+    def add_dependency(self, node_instance_id, attribute_path=None):
+        if self.dependencies is not None:
+            self.dependencies.add((node_instance_id, attribute_path))
+
+    def _fetch(self, kind, key, method):
+        if self._cache is None:
+            return method(key)
+        value = self._cache.get(kind, key)
+        if value is NOT_CACHED:
+            value = method(key)
+            self._cache.put(kind, key, value)
+        return value
+
+    def _fetch_all(self, kind, keys, method, results):
+        # fetches the values not in results, concurrently when the storage
+        # is concurrent. results are only updated by the calling thread.
+        keys = [key for key in keys if key not in results]
+        values = concurrency.concurrent_map(
+            lambda key: self._fetch(kind, key, method), keys,
+            self._max_workers)
+        results.update(zip(keys, values))
+
+    def _cached(self, kind, keys):
+        # the keys not found in the cache
+        if self._cache is None:
+            return keys
+        missing = []
+        for key in keys:
+            value = self._cache.get(kind, key)
+            if value is NOT_CACHED:
+                missing.append(key)
+            elif kind == RuntimeEvaluationCache.NODE:
+                self._nodes[key] = value
+            else:
+                self._node_instances[key] = value
+        return missing
+
     def get_node_instances(self, node_id):
         if node_id not in self._node_to_node_instances:
-            node_instances = self._get_node_instances_method(node_id)
+            node_instances = self._fetch(RuntimeEvaluationCache.NODE_INSTANCES,
+                                         node_id,
+                                         self._get_node_instances_method)
             self._node_to_node_instances[node_id] = node_instances
             for node_instance in node_instances:
                 self._node_instances[node_instance.id] = node_instance
+        if self.node_dependencies is not None:
+            self.node_dependencies.add(node_id)
         return self._node_to_node_instances[node_id]
 
     def get_node_instance(self, node_instance_id):
         if node_instance_id not in self._node_instances:
-            node_instance = self._get_node_instance_method(node_instance_id)
+            node_instance = self._fetch(RuntimeEvaluationCache.NODE_INSTANCE,
+                                        node_instance_id,
+                                        self._get_node_instance_method)
             self._node_instances[node_instance_id] = node_instance
+        self.add_dependency(node_instance_id)
         return self._node_instances[node_instance_id]
 
     def get_node(self, node_id):
         if node_id not in self._nodes:
-            node = self._get_node_method(node_id)
+            node = self._fetch(RuntimeEvaluationCache.NODE, node_id,
+                               self._get_node_method)
             self._nodes[node_id] = node
         return self._nodes[node_id]
 
     def get_secret(self, secret_key):
         if secret_key not in self._secrets:
-            secret = self._get_secret_method(secret_key)
+            secret = self._fetch(RuntimeEvaluationCache.SECRET, secret_key,
+                                 self._get_secret_method)
             self._secrets[secret_key] = secret.value
         return self._secrets[secret_key]
 
+    @property
+    def concurrent(self):
+        """Whether the storage fetches independent values concurrently"""
+        return bool(self._max_workers) and self._max_workers > 1
+
+    def prefetch_containment(self, node_instances, node_instance_ids=()):
+        """Fetch the nodes of node instances and the node instances
+        containing them, up to the roots of their containment trees.
+
+        The containment trees are fetched a level at a time, the nodes and
+        node instances of a level concurrently when the storage is
+        concurrent.
+        """
+        node_instance_ids = set(filter(None, node_instance_ids))
+        self._fetch_all(RuntimeEvaluationCache.NODE_INSTANCE,
+                        node_instance_ids,
+                        self._get_node_instance_method,
+                        self._node_instances)
+        level = list(node_instances) + [
+            self._node_instances[node_instance_id]
+            for node_instance_id in node_instance_ids]
+        visited = set()
+        while level:
+            self._fetch_all(RuntimeEvaluationCache.NODE,
+                            set(i.node_id for i in level),
+                            self._get_node_method,
+                            self._nodes)
+            containing_ids = set()
+            for node_instance in level:
+                visited.add(node_instance.id)
+                containing_id = _containing_node_instance_id(
+                    self._nodes[node_instance.node_id], node_instance)
+                if containing_id is not None and \
+                        containing_id not in visited:
+                    containing_ids.add(containing_id)
+            self._fetch_all(RuntimeEvaluationCache.NODE_INSTANCE,
+                            containing_ids,
+                            self._get_node_instance_method,
+                            self._node_instances)
+            level = [self._node_instances[node_instance_id]
+                     for node_instance_id in containing_ids]
+
+    def prefetch(self, node_instance_ids=(), node_ids=()):
+        """Fetch node instances and nodes not fetched yet.
+
+        Node instances are fetched by their ids and by the ids of their
+        nodes, nodes by their ids and the node ids of the fetched node
+        instances. Node instances and nodes are fetched through the bulk
+        methods when given, otherwise concurrently when the storage is
+        concurrent. Nothing is fetched if the storage has no bulk methods
+        and is not concurrent.
+        """
+        if self.concurrent:
+            self._fetch_all(RuntimeEvaluationCache.NODE_INSTANCES,
+                            set(node_ids),
+                            self._get_node_instances_method,
+                            self._node_to_node_instances)
+            for node_instances in self._node_to_node_instances.values():
+                for node_instance in node_instances:
+                    self._node_instances[node_instance.id] = node_instance
+        if self._get_node_instances_bulk_method:
+            missing = self._cached(
+                RuntimeEvaluationCache.NODE_INSTANCE,
+                sorted(set(node_instance_ids) - set(self._node_instances)))
+            if missing:
+                for node_instance in self._get_node_instances_bulk_method(
+                        missing):
+                    self._node_instances[node_instance.id] = node_instance
+                    if self._cache is not None:
+                        self._cache.put(RuntimeEvaluationCache.NODE_INSTANCE,
+                                        node_instance.id, node_instance)
+        elif self.concurrent:
+            self._fetch_all(RuntimeEvaluationCache.NODE_INSTANCE,
+                            set(node_instance_ids),
+                            self._get_node_instance_method,
+                            self._node_instances)
+        instances_node_ids = set(node_instance.node_id for node_instance
+                                 in self._node_instances.itervalues())
+        if self._get_nodes_bulk_method:
+            missing = self._cached(
+                RuntimeEvaluationCache.NODE,
+                sorted((set(node_ids) | instances_node_ids) -
+                       set(self._nodes)))
+            if missing:
+                for node in self._get_nodes_bulk_method(missing):
+                    self._nodes[node.id] = node
+                    if self._cache is not None:
+                        self._cache.put(RuntimeEvaluationCache.NODE,
+                                        node.id, node)
+        elif self.concurrent:
+            # nodes referenced by name may not exist, which is reported by
+            # the evaluation, so only the nodes of node instances are
+            # fetched
+            self._fetch_all(RuntimeEvaluationCache.NODE,
+                            instances_node_ids,
+                            self._get_node_method,
+                            self._nodes)
+
 
 class Function(object):
 
     __metaclass__ = abc.ABCMeta
     name = 'function'
+    # the evaluators ('evaluate', 'evaluate_runtime') whose results only
+    # depend on the function, its scope and the SELF/SOURCE/TARGET of its
+    # context, without side effects, so they are memoized within a pass
+    pure_evaluators = ()
 
     def __init__(self, args, scope=None, context=None, path=None, raw=None):
         self.scope = scope
@@ -136,6 +454,8 @@ class Function(object):
 @register(name='get_input')
 class GetInput(Function):
 
+    pure_evaluators = ('evaluate',)
+
     def __init__(self, args, **kwargs):
         self.input_name = None
         super(GetInput, self).__init__(args, **kwargs)
@@ -165,6 +485,8 @@ class GetInput(Function):
 @register(name='get_property')
 class GetProperty(Function):
 
+    pure_evaluators = ('evaluate',)
+
     def __init__(self, args, **kwargs):
         self.node_name = None
         self.property_path = None
@@ -229,6 +551,11 @@ class GetProperty(Function):
 @register(name='get_attribute')
 class GetAttribute(Function):
 
+    # evaluate marks the operation in its context as having intrinsic
+    # functions, evaluate_runtime records the storage dependencies, which
+    # are the same for repeated evaluations within a pass
+    pure_evaluators = ('evaluate_runtime',)
+
     def __init__(self, args, **kwargs):
         self.node_name = None
         self.attribute_path = None
@@ -292,6 +619,7 @@ class GetAttribute(Function):
         else:
             node_instance = self._resolve_node_instance_by_name(storage)
 
+        storage.add_dependency(node_instance.id, tuple(self.attribute_path))
         value = _get_property_value(node_instance.node_id,
                                     node_instance.runtime_properties,
                                     self.attribute_path,
@@ -363,20 +691,18 @@ class GetAttribute(Function):
             self,
             storage,
             node_instances):
+        index = storage.scaling_groups_index
 
         def _parent_instance(_instance):
-            _node = storage.get_node(_instance.node_id)
-            for relationship in _node.relationships or []:
-                if (constants.CONTAINED_IN_REL_TYPE in
-                        relationship['type_hierarchy']):
-                    target_name = relationship['target_id']
-                    target_id = [
-                        r['target_id'] for r in _instance.relationships
-                        if r['target_name'] == target_name][0]
-                    return storage.get_node_instance(target_id)
-            return None
+            target_id = _containing_node_instance_id(
+                storage.get_node(_instance.node_id), _instance)
+            if target_id is None:
+                return None
+            return storage.get_node_instance(target_id)
 
         def _containing_groups(_instance):
+            if index is not None and _instance.id in index:
+                return index.containing_groups(_instance.id)
             result = [g['name'] for g in _instance.scaling_groups or []]
             parent_instance = _parent_instance(_instance)
             if parent_instance:
@@ -396,6 +722,12 @@ class GetAttribute(Function):
                 raise RuntimeError('Illegal state')
 
         def _group_instance(node_instance, group_name):
+            if index is not None and node_instance.id in index:
+                group_instance_id = index.group_instance(node_instance.id,
+                                                         group_name)
+                if group_instance_id is None:
+                    raise RuntimeError('Illegal state')
+                return group_instance_id
             for scaling_group in (node_instance.scaling_groups or []):
                 if scaling_group['name'] == group_name:
                     return scaling_group['id']
@@ -426,6 +758,10 @@ class GetAttribute(Function):
         self_instance_id = self.context.get('self')
         source_instance_id = self.context.get('source')
         target_instance_id = self.context.get('target')
+        if storage.concurrent and index is None:
+            storage.prefetch_containment(
+                list(node_instances),
+                [self_instance_id or source_instance_id, target_instance_id])
         if self_instance_id:
             return _resolve_node_instance(self_instance_id)
         elif source_instance_id:
@@ -448,8 +784,91 @@ class GetAttribute(Function):
                                        self.attribute_path))
 
 
+def _containing_node_instance_id(node, node_instance):
+    """The id of the node instance containing a node instance of a node"""
+    for relationship in _attribute(node, 'relationships') or []:
+        if constants.CONTAINED_IN_REL_TYPE in relationship['type_hierarchy']:
+            target_name = relationship['target_id']
+            return [r['target_id']
+                    for r in _attribute(node_instance, 'relationships')
+                    if r['target_name'] == target_name][0]
+    return None
+
+
+def _attribute(entity, name):
+    # nodes and node instances are storage objects or plan dicts
+    if type(entity) is dict:
+        return entity.get(name)
+    return getattr(entity, name)
+
+
+class ScalingGroupsIndex(object):
+    """The scaling group instances containing each node instance.
+
+    Resolving a node instance by scaling groups walks the containment
+    trees of node instances for the groups containing them. The index is
+    built once from all the nodes and node instances of a deployment and
+    passed to evaluations (e.g. all the evaluations of a workflow) so the
+    groups of a node instance are a lookup. Node instances not in the index
+    are resolved by walking the containment trees.
+
+    Nodes and node instances are storage objects, or the dicts of a
+    deployment plan.
+    """
+
+    def __init__(self, nodes, node_instances):
+        nodes = dict((_attribute(node, 'id'), node) for node in nodes)
+        node_instances = dict((_attribute(node_instance, 'id'), node_instance)
+                              for node_instance in node_instances)
+        # node instance id -> [(group name, group instance id)], the groups
+        # of the node instance first, then those of its containers
+        self._groups = {}
+        # node instance id -> group name -> group instance id
+        self._group_instances = {}
+
+        def groups(node_instance_id):
+            if node_instance_id in self._groups:
+                return self._groups[node_instance_id]
+            node_instance = node_instances[node_instance_id]
+            result = [(group['name'], group['id']) for group in
+                      _attribute(node_instance, 'scaling_groups') or []]
+            containing_id = _containing_node_instance_id(
+                nodes[_attribute(node_instance, 'node_id')], node_instance)
+            if containing_id in node_instances:
+                result += groups(containing_id)
+            self._groups[node_instance_id] = result
+            group_instances = self._group_instances[node_instance_id] = {}
+            for group_name, group_instance_id in result:
+                group_instances.setdefault(group_name, group_instance_id)
+            return result
+
+        for node_instance_id in node_instances:
+            groups(node_instance_id)
+
+    @classmethod
+    def from_deployment_plan(cls, plan):
+        return cls(plan['nodes'], plan['node_instances'])
+
+    def __contains__(self, node_instance_id):
+        return node_instance_id in self._groups
+
+    def containing_groups(self, node_instance_id):
+        """The names of the groups containing a node instance, innermost
+        first"""
+        return [group_name for group_name, _
+                in self._groups[node_instance_id]]
+
+    def group_instance(self, node_instance_id, group_name):
+        """The id of the instance of a group containing a node instance,
+        None if the group does not contain the node instance"""
+        return self._group_instances[node_instance_id].get(group_name)
+
+
 @register(name='get_secret')
 class GetSecret(Function):
+
+    pure_evaluators = ('evaluate_runtime',)
+
     def __init__(self, args, **kwargs):
         self.secret_id = None
         super(GetSecret, self).__init__(args, **kwargs)
@@ -476,6 +895,8 @@ class GetSecret(Function):
 @register(name='concat')
 class Concat(Function):
 
+    pure_evaluators = ('evaluate', 'evaluate_runtime')
+
     def __init__(self, args, **kwargs):
         self.separator = ''
         self.joined = args
@@ -594,7 +1015,10 @@ def evaluate_functions(payload, context,
                        get_node_instances_method,
                        get_node_instance_method,
                        get_node_method,
-                       get_secret_method):
+                       get_secret_method,
+                       cache=None,
+                       max_workers=None,
+                       scaling_groups_index=None):
     """Evaluate functions in payload.
 
     :param payload: The payload to evaluate.
@@ -603,26 +1027,121 @@ def evaluate_functions(payload, context,
     :param get_node_instance_method: A method for getting a node instance.
     :param get_node_method: A method for getting a node.
     :param get_secret_method: A method for getting a secret.
+    :param cache: A RuntimeEvaluationCache shared with other evaluations.
+    :param max_workers: The number of threads fetching nodes and node
+                        instances concurrently, they are fetched serially by
+                        default.
+    :param scaling_groups_index: A ScalingGroupsIndex of the deployment.
     :return: payload.
     """
-    handler = runtime_evaluation_handler(get_node_instances_method,
-                                         get_node_instance_method,
-                                         get_node_method,
-                                         get_secret_method)
-    scan.scan_properties(payload,
-                         handler,
-                         scope=None,
-                         context=context,
-                         path='payload',
-                         replace=True)
-    return payload
+    return evaluate_functions_batch(
+        [(payload, context)],
+        get_node_instances_method=get_node_instances_method,
+        get_node_instance_method=get_node_instance_method,
+        get_node_method=get_node_method,
+        get_secret_method=get_secret_method,
+        cache=cache,
+        max_workers=max_workers,
+        scaling_groups_index=scaling_groups_index)[0]
+
+
+def evaluate_functions_batch(payloads,
+                             get_node_instances_method,
+                             get_node_instance_method,
+                             get_node_method,
+                             get_secret_method,
+                             get_node_instances_bulk_method=None,
+                             get_nodes_bulk_method=None,
+                             cache=None,
+                             max_workers=None,
+                             scaling_groups_index=None):
+    """Evaluate functions in many payloads.
+
+    All payloads are evaluated with one storage, so every node, node
+    instance and secret is fetched once. When bulk methods are given, the
+    node instances and nodes referenced by get_attribute functions in the
+    payloads are fetched through them before evaluating, with max_workers
+    they are fetched concurrently. The containment trees of node instances
+    of nodes referenced by name are fetched concurrently as well when
+    resolving the node instance by scaling groups.
+
+    :param payloads: A list of (payload, context) pairs to evaluate.
+    :param get_node_instances_method: A method for getting node instances.
+    :param get_node_instance_method: A method for getting a node instance.
+    :param get_node_method: A method for getting a node.
+    :param get_secret_method: A method for getting a secret.
+    :param get_node_instances_bulk_method: A method for getting the node
+                                           instances with the given ids.
+    :param get_nodes_bulk_method: A method for getting the nodes with the
+                                  given ids.
+    :param cache: A RuntimeEvaluationCache shared with other evaluations.
+    :param max_workers: The number of threads fetching nodes and node
+                        instances concurrently.
+    :param scaling_groups_index: A ScalingGroupsIndex of the deployment.
+    :return: The list of payloads.
+    """
+    storage = RuntimeEvaluationStorage(
+        get_node_instances_method=get_node_instances_method,
+        get_node_instance_method=get_node_instance_method,
+        get_node_method=get_node_method,
+        get_secret_method=get_secret_method,
+        get_node_instances_bulk_method=get_node_instances_bulk_method,
+        get_nodes_bulk_method=get_nodes_bulk_method,
+        cache=cache,
+        max_workers=max_workers,
+        scaling_groups_index=scaling_groups_index)
+    if get_node_instances_bulk_method or get_nodes_bulk_method or \
+            storage.concurrent:
+        storage.prefetch(*_get_attribute_references(payloads))
+    handler = _runtime_handler(storage)
+    for payload, context in payloads:
+        scan.scan_properties(payload,
+                             handler,
+                             scope=None,
+                             context=context,
+                             path='payload',
+                             replace=True)
+    handler.memo.report()
+    return [payload for payload, _ in payloads]
+
+
+def _get_attribute_references(payloads):
+    """The node instance ids and node ids get_attribute functions in the
+    payloads refer to."""
+    node_instance_ids = set()
+    node_ids = set()
+
+    def handler(v, scope, context, path):
+        func = parse(v, scope=scope, context=context, path=path)
+        if isinstance(func, GetAttribute):
+            if func.node_name in [SELF, SOURCE, TARGET]:
+                references = [func.node_name.lower()]
+            else:
+                node_ids.add(func.node_name)
+                # used for resolving the node instance of the node
+                references = ['self', 'source', 'target']
+            node_instance_ids.update(context[reference]
+                                     for reference in references
+                                     if context.get(reference))
+        return v
+
+    for payload, context in payloads:
+        scan.scan_properties(payload,
+                             handler,
+                             scope=None,
+                             context=context,
+                             path='payload')
+    return node_instance_ids, node_ids
 
 
 def evaluate_outputs(outputs_def,
                      get_node_instances_method,
                      get_node_instance_method,
                      get_node_method,
-                     get_secret_method):
+                     get_secret_method,
+                     cache=None,
+                     max_workers=None,
+                     scaling_groups_index=None):
     """Evaluates an outputs definition containing intrinsic functions.
 
     :param outputs_def: Outputs definition.
@@ -630,6 +1149,10 @@ def evaluate_outputs(outputs_def,
     :param get_node_instance_method: A method for getting a node instance.
     :param get_node_method: A method for getting a node.
     :param get_secret_method: A method for getting a secret.
+    :param cache: A RuntimeEvaluationCache shared with other evaluations.
+    :param max_workers: The number of threads fetching nodes and node
+                        instances concurrently.
+    :param scaling_groups_index: A ScalingGroupsIndex of the deployment.
     :return: Outputs dict.
     """
     outputs = dict((k, v['value']) for k, v in outputs_def.iteritems())
@@ -639,20 +1162,205 @@ def evaluate_outputs(outputs_def,
         get_node_instances_method=get_node_instances_method,
         get_node_instance_method=get_node_instance_method,
         get_node_method=get_node_method,
-        get_secret_method=get_secret_method)
+        get_secret_method=get_secret_method,
+        cache=cache,
+        max_workers=max_workers,
+        scaling_groups_index=scaling_groups_index)
+
+
+class OutputsEvaluator(object):
+    """Evaluates the outputs of a deployment again and again.
+
+    The evaluator records the (node instance id, attribute path) pairs each
+    output depends on and keeps the evaluated outputs. Evaluating with the
+    ids of the node instances modified since the previous evaluation only
+    re-evaluates the outputs depending on them. Node instances added to or
+    removed from nodes are not known to the outputs depending on the
+    nodes, the ids of such nodes are passed as the modified node ids.
+    """
+
+    def __init__(self,
+                 outputs_def,
+                 get_node_instances_method,
+                 get_node_instance_method,
+                 get_node_method,
+                 get_secret_method,
+                 cache=None,
+                 max_workers=None,
+                 scaling_groups_index=None):
+        self._outputs_def = outputs_def
+        self._storage_kwargs = dict(
+            get_node_instances_method=get_node_instances_method,
+            get_node_instance_method=get_node_instance_method,
+            get_node_method=get_node_method,
+            get_secret_method=get_secret_method,
+            cache=cache,
+            max_workers=max_workers,
+            scaling_groups_index=scaling_groups_index)
+        self._outputs = {}
+        # output name -> set of (node instance id, attribute path)
+        self._dependencies = {}
+        # output name -> ids of the nodes whose node instances were listed
+        self._node_dependencies = {}
+
+    @property
+    def dependencies(self):
+        """Output name -> the (node instance id, attribute path) pairs the
+        output depends on. Node instances used for resolving the node
+        instance of a get_attribute function have a None attribute path.
+        """
+        return dict((name, set(dependencies)) for name, dependencies
+                    in self._dependencies.iteritems())
+
+    def evaluate(self, modified_node_instance_ids=None, modified_node_ids=()):
+        """Evaluate the outputs.
+
+        :param modified_node_instance_ids: The ids of node instances
+               modified since the previous evaluation. When None, all the
+               outputs are evaluated.
+        :param modified_node_ids: The ids of nodes having node instances
+               added or removed since the previous evaluation.
+        :return: Outputs dict.
+        """
+        if modified_node_instance_ids is None:
+            names = list(self._outputs_def)
+        else:
+            modified = set(modified_node_instance_ids)
+            modified_nodes = set(modified_node_ids)
+            names = [
+                name for name in self._outputs_def
+                if name not in self._outputs or
+                any(node_instance_id in modified for node_instance_id, _
+                    in self._dependencies[name]) or
+                self._node_dependencies[name] & modified_nodes]
+        storage = RuntimeEvaluationStorage(**self._storage_kwargs)
+        for name in names:
+            self._outputs.pop(name, None)
+            storage.dependencies = set()
+            storage.node_dependencies = set()
+            # memoized evaluations don't record their dependencies again,
+            # so the memo is kept for one output
+            handler = _runtime_handler(storage)
+            payload = {name: copy.deepcopy(self._outputs_def[name]['value'])}
+            scan.scan_properties(payload,
+                                 handler,
+                                 scope=None,
+                                 context={},
+                                 path='payload',
+                                 replace=True)
+            handler.memo.report()
+            self._outputs[name] = payload[name]
+            self._dependencies[name] = storage.dependencies
+            self._node_dependencies[name] = storage.node_dependencies
+        return copy.deepcopy(self._outputs)
+
+
+# returned by EvaluationMemo.get for evaluations not memoized
+NOT_MEMOIZED = object()
 
 
-def _handler(evaluator, **evaluator_kwargs):
+class EvaluationMemo(object):
+    """The results of the function evaluations of one scan pass.
+
+    Results are keyed by the raw function, its scope and what SELF, SOURCE
+    and TARGET refer to in its context, so identical functions appearing in
+    many places (e.g. in the inputs of every operation of a node) are
+    evaluated once. Evaluations involving functions that are not pure for
+    the evaluator (see Function.pure_evaluators) are not memoized.
+    """
+
+    def __init__(self, evaluator, context_key):
+        self.evaluator = evaluator
+        self._context_key = context_key
+        self._results = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._results)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def key(self, raw_function, scope, context):
+        """The memo key of a function, None if it can't be memoized"""
+        try:
+            key = (_freeze(raw_function), scope,
+                   self._context_key(scope, context))
+            hash(key)
+        except (AttributeError, KeyError, TypeError):
+            return None
+        return key
+
+    def get(self, key):
+        result = self._results.get(key, NOT_MEMOIZED)
+        if result is NOT_MEMOIZED:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def put(self, key, result):
+        self._results[key] = result
+
+    def report(self):
+        """Report the memo counters through the instrumentation module"""
+        instrumentation.report(
+            'functions.{0}.memo'.format(self.evaluator),
+            {'hits': self.hits,
+             'misses': self.misses,
+             'hit_rate': self.hit_rate,
+             'size': len(self)})
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return dict, frozenset((k, _freeze(v)) for k, v in value.iteritems())
+    if isinstance(value, list):
+        return list, tuple(_freeze(item) for item in value)
+    # the type keeps e.g. 1 and 1.0 apart, which concat differently
+    return type(value), value
+
+
+def _plan_context_key(scope, context):
+    if scope == scan.NODE_TEMPLATE_SCOPE:
+        # operation contexts are copies of the node template
+        return context['name']
+    if scope == scan.NODE_TEMPLATE_RELATIONSHIP_SCOPE:
+        return (context['node_template']['name'],
+                context['relationship']['target_id'])
+    # SELF, SOURCE and TARGET can't be used in other scopes
+    return None
+
+
+def _runtime_context_key(scope, context):
+    context = context or {}
+    return context.get('self'), context.get('source'), context.get('target')
+
+
+def _handler(evaluator, context_key=None, **evaluator_kwargs):
+    memo = EvaluationMemo(evaluator, context_key) if context_key else None
+    # the number of evaluations by impure evaluators so far, evaluations
+    # involving such an evaluation are not memoized
+    impure_evaluations = [0]
+
     def handler(v, scope, context, path):
+        func = parse(v, scope=scope, context=context, path=path)
+        if not isinstance(func, Function):
+            return v
+        key = memo.key(v, scope, context) if memo is not None else None
+        if key is not None:
+            result = memo.get(key)
+            if result is not NOT_MEMOIZED:
+                return result
+        impure_evaluations_before = impure_evaluations[0]
         evaluated_value = v
         scanned = False
-        while True:
-            func = parse(evaluated_value,
-                         scope=scope,
-                         context=context,
-                         path=path)
-            if not isinstance(func, Function):
-                break
+        while isinstance(func, Function):
+            if evaluator not in func.pure_evaluators:
+                impure_evaluations[0] += 1
             previous_evaluated_value = evaluated_value
             evaluated_value = getattr(func, evaluator)(**evaluator_kwargs)
             if scanned and previous_evaluated_value == evaluated_value:
@@ -664,24 +1372,49 @@ def _handler(evaluator, **evaluator_kwargs):
                                  path=path,
                                  replace=True)
             scanned = True
+            func = parse(evaluated_value,
+                         scope=scope,
+                         context=context,
+                         path=path)
+        if key is not None and \
+                impure_evaluations[0] == impure_evaluations_before:
+            memo.put(key, evaluated_value)
         return evaluated_value
+
+    handler.memo = memo
     return handler
 
 
 def plan_evaluation_handler(plan):
-    return _handler('evaluate', plan=plan)
+    """A scan handler evaluating functions of a plan.
+
+    The handler memoizes evaluations (see EvaluationMemo), so it should be
+    used for one scan pass. The memo is available as ``handler.memo``.
+    """
+    return _handler('evaluate', context_key=_plan_context_key, plan=plan)
 
 
 def runtime_evaluation_handler(get_node_instances_method,
                                get_node_instance_method,
                                get_node_method,
-                               get_secret_method):
+                               get_secret_method,
+                               cache=None,
+                               max_workers=None,
+                               scaling_groups_index=None):
+    return _runtime_handler(RuntimeEvaluationStorage(
+        get_node_instances_method=get_node_instances_method,
+        get_node_instance_method=get_node_instance_method,
+        get_node_method=get_node_method,
+        get_secret_method=get_secret_method,
+        cache=cache,
+        max_workers=max_workers,
+        scaling_groups_index=scaling_groups_index))
+
+
+def _runtime_handler(storage):
     return _handler('evaluate_runtime',
-                    storage=RuntimeEvaluationStorage(
-                        get_node_instances_method=get_node_instances_method,
-                        get_node_instance_method=get_node_instance_method,
-                        get_node_method=get_node_method,
-                        get_secret_method=get_secret_method))
+                    context_key=_runtime_context_key,
+                    storage=storage)
 
 
 def validate_functions(plan):
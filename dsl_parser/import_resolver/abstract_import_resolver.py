@@ -15,10 +15,6 @@
 
 import abc
 import contextlib
-import urllib2
-
-import requests
-from retrying import retry
 
 from dsl_parser import exceptions
 
@@ -51,7 +47,9 @@ class AbstractImportResolver(object):
 
 def read_import(import_url):
     error_str = 'Import failed: Unable to open import url'
+    # the HTTP stack is only imported when reading an import
     if import_url.startswith('file:'):
+        import urllib2
         try:
             request = urllib2.Request(import_url)
             with contextlib.closing(urllib2.urlopen(request)) as f:
@@ -61,6 +59,8 @@ def read_import(import_url):
                 13, '{0} {1}; {2}'.format(error_str, import_url, ex))
             raise ex
     else:
+        import requests
+        from retrying import retry
         number_of_attempts = MAX_NUMBER_RETRIES + 1
 
         # Defines on which errors we should retry the import.
@@ -0,0 +1,40 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+
+"""Reporting of internal counters for performance analysis.
+
+Components report named counters (e.g. the hits and misses of the function
+evaluation memo of a scan pass) through ``report``, which passes them to
+the reporters added with ``add_reporter``. Reports are dropped when there
+are no reporters.
+"""
+
+_reporters = []
+
+
+def add_reporter(reporter):
+    """Add a callable called with (name, counters dict) for every report."""
+    _reporters.append(reporter)
+
+
+def remove_reporter(reporter):
+    if reporter in _reporters:
+        _reporters.remove(reporter)
+
+
+def report(name, counters):
+    for reporter in list(_reporters):
+        reporter(name, counters)
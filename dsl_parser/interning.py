@@ -0,0 +1,87 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+"""Structural sharing of the repeated parts of a plan.
+
+A parsed plan repeats identical data many times, e.g. operations are
+stored under both their short and their full name, nodes of the same type
+carry equal type hierarchies and plugin dicts. ``intern_plan`` returns an
+equal plan in which equal sub-structures are a single shared object, which
+shrinks the plan in memory and its pickled form (pickle preserves the
+sharing).
+
+``serialization.load`` and ``serialization.loads`` return an interned
+plan when called with ``shared=True``.
+
+A plan with shared sub-structures must be treated as read only, modifying
+a shared value in place modifies it everywhere it appears. Plans handed to
+``tasks.prepare_deployment_plan`` (which evaluates functions in place)
+should not be interned.
+"""
+
+_SCALAR_TYPES = (basestring, bool, int, long, float, type(None))
+
+
+def intern_plan(plan):
+    """Return an equal plan in which equal sub-structures are shared."""
+    return _Interner().intern(plan)
+
+
+class _Interner(object):
+
+    def __init__(self):
+        # structure key -> canonical value. canonical values are kept
+        # alive by the table so keys based on their ids remain unique.
+        self._values = {}
+
+    def intern(self, value):
+        if isinstance(value, dict):
+            items = [(self.intern(k), self.intern(v))
+                     for k, v in value.iteritems()]
+            key = (type(value), frozenset((_key(k), _key(v))
+                                          for k, v in items))
+            canonical = self._values.get(key)
+            if canonical is None:
+                canonical = _new_dict(type(value), items)
+                self._values[key] = canonical
+            return canonical
+        if isinstance(value, (list, tuple)):
+            items = [self.intern(item) for item in value]
+            key = (type(value), tuple(_key(item) for item in items))
+            canonical = self._values.get(key)
+            if canonical is None:
+                canonical = items if isinstance(value, list) else tuple(items)
+                self._values[key] = canonical
+            return canonical
+        if isinstance(value, str):
+            return intern(value)
+        if isinstance(value, _SCALAR_TYPES):
+            return self._values.setdefault(_key(value), value)
+        return value
+
+
+def _key(value):
+    # interned containers are canonical so their identity is their key
+    if isinstance(value, (dict, list, tuple)):
+        return id(value)
+    return type(value), value
+
+
+def _new_dict(dict_type, items):
+    # dict subclasses found in plans (e.g. models.Version) take
+    # constructor arguments of their own, so __init__ is bypassed
+    result = dict_type.__new__(dict_type)
+    dict.update(result, items)
+    return result
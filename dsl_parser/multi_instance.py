@@ -21,17 +21,24 @@ from dsl_parser import (models,
                         constants)
 
 
-def create_deployment_plan(plan):
+def create_deployment_plan(plan, processes=None, copy_plan=True):
     """
     Expand node instances based on number of instances to deploy and
     defined relationships
+
+    :param processes: opt-in number of processes used to expand independent
+                      contained trees of the plan in parallel.
+    :param copy_plan: whether to expand a copy of the plan. Pass False when
+                      the plan is already a private copy, it is then
+                      expanded and returned (as a models.Plan) in place.
     """
-    deployment_plan = copy.deepcopy(plan)
+    deployment_plan = copy.deepcopy(plan) if copy_plan else plan
     plan_node_graph = rel_graph.build_node_graph(
         nodes=deployment_plan['nodes'],
         scaling_groups=deployment_plan['scaling_groups'])
     deployment_node_graph, ctx = rel_graph.build_deployment_node_graph(
-        plan_node_graph)
+        plan_node_graph,
+        processes=processes)
     node_instances = rel_graph.extract_node_instances(
         node_instances_graph=deployment_node_graph,
         ctx=ctx)
@@ -39,6 +46,28 @@ def create_deployment_plan(plan):
     return models.Plan(deployment_plan)
 
 
+def estimate_deployment_plan(plan):
+    """
+    Count the node instances and relationship instances
+    create_deployment_plan would create for a plan, without expanding them.
+
+    :return: a dict holding the total 'node_instances' and
+             'relationship_instances' counts and, under 'nodes', these
+             counts for each node.
+    """
+    plan_node_graph = rel_graph.build_node_graph(
+        nodes=plan['nodes'],
+        scaling_groups=plan['scaling_groups'])
+    nodes = rel_graph.estimate_deployment_node_graph(plan_node_graph)
+    return {
+        'node_instances': sum(node['node_instances']
+                              for node in nodes.values()),
+        'relationship_instances': sum(node['relationship_instances']
+                                      for node in nodes.values()),
+        'nodes': nodes
+    }
+
+
 def modify_deployment(nodes,
                       previous_nodes,
                       previous_node_instances,
@@ -55,6 +84,38 @@ def modify_deployment(nodes,
      Add a line note
     """
 
+    reserved_node_instance_ids = None
+    region = rel_graph.extract_modification_region(
+        nodes=nodes,
+        previous_nodes=previous_nodes,
+        previous_node_instances=previous_node_instances,
+        modified_nodes=modified_nodes,
+        scaling_groups=scaling_groups)
+    if region:
+        # only the part of the deployment that can be affected by the
+        # modification is expanded and compared
+        reserved_node_instance_ids = set(
+            node_instance['id'] for node_instance in previous_node_instances)
+        nodes = region.nodes
+        previous_nodes = region.previous_nodes
+        previous_node_instances = region.previous_node_instances
+        scaling_groups = region.scaling_groups
+
+    return _modify_deployment(
+        nodes=nodes,
+        previous_nodes=previous_nodes,
+        previous_node_instances=previous_node_instances,
+        modified_nodes=modified_nodes,
+        scaling_groups=scaling_groups,
+        reserved_node_instance_ids=reserved_node_instance_ids)
+
+
+def _modify_deployment(nodes,
+                       previous_nodes,
+                       previous_node_instances,
+                       modified_nodes,
+                       scaling_groups,
+                       reserved_node_instance_ids=None):
     plan_node_graph = rel_graph.build_node_graph(
         nodes=nodes,
         scaling_groups=scaling_groups)
@@ -69,44 +130,23 @@ def modify_deployment(nodes,
         plan_node_graph=plan_node_graph,
         previous_deployment_node_graph=previous_deployment_node_graph,
         previous_deployment_contained_graph=previous_deployment_contained_graph,  # noqa
-        modified_nodes=modified_nodes)
-
-    # Any node instances which were added or removed
-    added_and_related = rel_graph.extract_added_node_instances(
-        previous_deployment_node_graph, new_deployment_node_graph,
-        ctx=ctx)
-    removed_and_related = rel_graph.extract_removed_node_instances(
-        previous_deployment_node_graph, new_deployment_node_graph,
-        ctx=ctx)
+        modified_nodes=modified_nodes,
+        reserved_node_instance_ids=reserved_node_instance_ids)
 
-    # Any node instances which had a modification to their relationship.
-    # (newly introduced and removed nodes)
-    extended_and_related = rel_graph.extract_added_relationships(
-        previous_deployment_node_graph, new_deployment_node_graph,
-        ctx=ctx)
-    reduced_and_related = rel_graph.extract_removed_relationships(
-        previous_deployment_node_graph, new_deployment_node_graph,
-        ctx=ctx)
-
-    # The extracted extended and reduced relationships hold the new and old
-    # node instances. These are not required, since the change is on
-    # node instance level (and not the relationship level)
-    extended_and_related = \
-        filter_out_node_instances(added_and_related, extended_and_related)
-    reduced_and_related = \
-        filter_out_node_instances(removed_and_related, reduced_and_related)
-
-    return {
-        'added_and_related': added_and_related,
-        'extended_and_related': extended_and_related,
-        'reduced_and_related': reduced_and_related,
-        'removed_and_related': removed_and_related
-    }
+    # Any node instances which were added or removed, and any node instances
+    # which had a modification to their relationships
+    return rel_graph.DeploymentNodeGraphsDiff(
+        previous_deployment_node_graph,
+        new_deployment_node_graph,
+        ctx=ctx).modification()
 
 
 def filter_out_node_instances(node_instances_to_filter_out,
                               base_node_instances):
-    instance_ids_to_remove = [n['id'] for n in node_instances_to_filter_out
-                              if 'modification' in n]
+    # no longer used by modify_deployment, which leaves the added and
+    # removed node instances out while extracting the extended and reduced
+    # ones, kept for external callers
+    instance_ids_to_remove = set(n['id'] for n in node_instances_to_filter_out
+                                 if 'modification' in n)
     return [n for n in base_node_instances
             if n['id'] not in instance_ids_to_remove]
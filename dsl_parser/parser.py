@@ -13,13 +13,25 @@
 #    * See the License for the specific language governing permissions and
 #    * limitations under the License.
 
+import collections
+import copy
+import time
+
 from dsl_parser import (functions,
                         utils)
 from dsl_parser.framework import parser
 from dsl_parser.elements import blueprint
+from dsl_parser.import_resolver.abstract_import_resolver import \
+    AbstractImportResolver
 from dsl_parser.import_resolver.default_import_resolver import \
     DefaultImportResolver
 
+# the parser of the current parse_many worker process
+_parse_many_worker = None
+
+# the number of parsed imports a parse_many worker keeps
+IMPORT_CACHE_SIZE = 100
+
 
 def parse_from_path(dsl_file_path,
                     resources_base_path=None,
@@ -36,6 +48,157 @@ def parse_from_path(dsl_file_path,
                   additional_resource_sources=additional_resource_sources)
 
 
+def parse_many(dsl_file_paths,
+               resources_base_path=None,
+               resolver=None,
+               validate_version=True,
+               processes=None,
+               include_plans=False):
+    """Parse many blueprints in a pool of processes.
+
+    Returns an iterator of a result dict per blueprint, in the order of the
+    paths: ``path``, ``valid``, ``seconds`` (the parse time), ``error`` (a
+    dict of the error ``type``, ``message`` and DSL ``error_code``, None
+    for valid blueprints) and, with include_plans, ``plan``.
+
+    The parser modules and the entry point functions are loaded, and the
+    first blueprint is parsed, before the workers are forked. The workers
+    therefore start warm, with the imports of the first blueprint (e.g.
+    the types the blueprints share) already parsed. Every worker keeps
+    up to IMPORT_CACHE_SIZE of the most recently used parsed imports for
+    the following blueprints it parses, workers created without fork
+    start with an empty cache. With processes=1 the blueprints are parsed
+    in the calling process.
+
+    :param dsl_file_paths: The paths of the blueprints.
+    :param processes: The number of worker processes, the number of CPUs
+                      by default.
+    :param include_plans: Whether to include the plans in the results.
+    """
+    import multiprocessing
+    dsl_file_paths = list(dsl_file_paths)
+    initargs = (resources_base_path, resolver, validate_version,
+                include_plans)
+    processes = min(processes or multiprocessing.cpu_count(),
+                    len(dsl_file_paths))
+    if processes <= 1:
+        worker = _ParseManyWorker(*initargs)
+        return (worker.parse(path) for path in dsl_file_paths)
+    return _parse_in_pool(dsl_file_paths, processes, initargs)
+
+
+def _parse_in_pool(dsl_file_paths, processes, initargs):
+    global _parse_many_worker
+    import multiprocessing
+    # the lazily imported modules and the entry point functions parsing
+    # needs are loaded once, instead of by every worker
+    import networkx  # NOQA
+    import requests  # NOQA
+    import retrying  # NOQA
+    functions._register_entry_point_functions()
+    # parsing the first blueprint warms the import cache of the worker
+    # the forked workers inherit
+    worker = _ParseManyWorker(*initargs)
+    yield worker.parse(dsl_file_paths[0])
+    _parse_many_worker = worker
+    try:
+        pool = multiprocessing.Pool(processes=processes,
+                                    initializer=_init_parse_many_worker,
+                                    initargs=initargs)
+    finally:
+        _parse_many_worker = None
+    try:
+        for result in pool.imap(_parse_many_task, dsl_file_paths[1:]):
+            yield result
+        pool.close()
+    finally:
+        # terminates the workers when the results aren't all consumed
+        pool.terminate()
+        pool.join()
+
+
+def _init_parse_many_worker(*initargs):
+    global _parse_many_worker
+    # a forked worker keeps the warm worker of its parent
+    if _parse_many_worker is None or \
+            _parse_many_worker.initargs != initargs:
+        _parse_many_worker = _ParseManyWorker(*initargs)
+
+
+def _parse_many_task(dsl_file_path):
+    return _parse_many_worker.parse(dsl_file_path)
+
+
+class _ParseManyWorker(object):
+
+    def __init__(self, resources_base_path, resolver, validate_version,
+                 include_plans):
+        self.initargs = (resources_base_path, resolver, validate_version,
+                         include_plans)
+        self.resources_base_path = resources_base_path
+        self.resolver = _CachingImportResolver(
+            resolver or DefaultImportResolver())
+        self.validate_version = validate_version
+        self.include_plans = include_plans
+
+    def parse(self, dsl_file_path):
+        result = {'path': dsl_file_path, 'valid': True, 'error': None}
+        start = time.time()
+        try:
+            plan = parse_from_path(
+                dsl_file_path,
+                resources_base_path=self.resources_base_path,
+                resolver=self.resolver,
+                validate_version=self.validate_version)
+        except Exception as error:
+            plan = None
+            result['valid'] = False
+            result['error'] = {
+                'type': type(error).__name__,
+                'message': str(error),
+                'error_code': getattr(error, 'err_code', None)
+            }
+        result['seconds'] = time.time() - start
+        if self.include_plans:
+            result['plan'] = plan
+        return result
+
+
+class _CachingImportResolver(AbstractImportResolver):
+    """Keeps the parsed imports loaded through a resolver.
+
+    Up to max_size imports are kept, the least recently used are evicted
+    first.
+    """
+
+    def __init__(self, resolver, max_size=IMPORT_CACHE_SIZE):
+        self._resolver = resolver
+        self.max_size = max_size
+        # (import url, file name) -> parsed holder, least recently used
+        # first
+        self._imports = collections.OrderedDict()
+
+    def resolve(self, import_url):
+        return self._resolver.resolve(import_url)
+
+    def fetch_import(self, import_url):
+        return self._resolver.fetch_import(import_url)
+
+    def load_import(self, import_url, error_message, filename=None):
+        key = (import_url, filename)
+        holder = self._imports.pop(key, None)
+        if holder is None:
+            holder = utils.load_yaml(
+                raw_yaml=self._resolver.fetch_import(import_url),
+                error_message=error_message,
+                filename=filename)
+        self._imports[key] = holder
+        while len(self._imports) > self.max_size:
+            self._imports.popitem(last=False)
+        # merging the imports into the blueprint modifies their holders
+        return copy.deepcopy(holder)
+
+
 def parse(dsl_string,
           resources_base_path=None,
           dsl_location=None,
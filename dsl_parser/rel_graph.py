@@ -15,11 +15,10 @@
 
 import copy
 import collections
+import random
 from random import choice
 from string import ascii_lowercase, digits
 
-import networkx as nx
-
 from dsl_parser import constants
 from dsl_parser import exceptions
 
@@ -35,6 +34,7 @@ ALL_TO_ONE = 'all_to_one'
 
 
 def build_node_graph(nodes, scaling_groups):
+    import networkx as nx
 
     graph = nx.DiGraph()
     groups_graph = nx.DiGraph()
@@ -44,21 +44,9 @@ def build_node_graph(nodes, scaling_groups):
     for node in nodes:
         node_id = node['id']
         node_ids.add(node_id)
-        if 'capabilities' in node:
-            # This code path is used by unit tests
-            scale_properties = node['capabilities']['scalable']['properties']
-        else:
-            # This code path is used by actual code
-            scale_properties = {
-                'current_instances': node['number_of_instances'],
-                'default_instances':
-                    node['deploy_number_of_instances'],
-                'min_instances': node['min_number_of_instances'],
-                'max_instances': node['max_number_of_instances']
-            }
         graph.add_node(node_id,
                        node=node,
-                       scale_properties=scale_properties)
+                       scale_properties=_node_scale_properties(node))
 
     for group_name, group in scaling_groups.items():
         scale_properties = group['properties']
@@ -80,6 +68,7 @@ def build_node_graph(nodes, scaling_groups):
             if member in node_ids:
                 contained_in_group[member] = group_name
 
+    top_level_groups = _top_level_groups(groups_graph)
     for node in nodes:
         node_id = node['id']
         for index, relationship in enumerate(node.get(RELATIONSHIPS, [])):
@@ -92,8 +81,7 @@ def build_node_graph(nodes, scaling_groups):
                 graph.add_edge(node_id, group_name,
                                relationship=relationship,
                                index=index)
-                top_level_group_name = nx.topological_sort(
-                    groups_graph, nbunch=[group_name])[-1]
+                top_level_group_name = top_level_groups[group_name]
                 graph.add_edge(
                     top_level_group_name, target_id,
                     relationship={
@@ -110,8 +98,182 @@ def build_node_graph(nodes, scaling_groups):
     return graph
 
 
+def _top_level_groups(groups_graph):
+    """
+    Map each group (and group member) to the outermost group containing it.
+    """
+    import networkx as nx
+    result = {}
+    for group_name in reversed(nx.topological_sort(groups_graph)):
+        containing_groups = groups_graph.successors(group_name)
+        if containing_groups:
+            result[group_name] = result[containing_groups[0]]
+        else:
+            result[group_name] = group_name
+    return result
+
+
+def _node_scale_properties(node):
+    if 'capabilities' in node:
+        # This code path is used by unit tests
+        return node['capabilities']['scalable']['properties']
+    # This code path is used by actual code
+    return {
+        'current_instances': node['number_of_instances'],
+        'default_instances': node['deploy_number_of_instances'],
+        'min_instances': node['min_number_of_instances'],
+        'max_instances': node['max_number_of_instances']
+    }
+
+
+def extract_modification_region(nodes,
+                                previous_nodes,
+                                previous_node_instances,
+                                modified_nodes,
+                                scaling_groups):
+    """
+    Restrict a deployment modification to the part of the deployment it
+    can actually affect.
+
+    Containment trees (a root node, everything recursively contained in it
+    and the scaling groups its members belong to) are expanded independently
+    of each other. Only trees holding a modified node can gain or lose node
+    instances, and only trees connected to them (by connected_to/depends_on
+    relationships, in either direction) can gain or lose relationship
+    instances. All other trees are left out of the returned region, as are
+    relationships from the region to them.
+
+    :return: a ModificationRegion, or None if the modification cannot be
+             restricted and should be computed over the entire deployment.
+    """
+    if not modified_nodes or not isinstance(modified_nodes, dict):
+        # deployment update passes the entire set of new nodes, in which
+        # case anything in the deployment may change
+        return None
+    previous_nodes_by_id = dict((node['id'], node) for node in previous_nodes)
+    if set(node['id'] for node in nodes) != set(previous_nodes_by_id):
+        return None
+
+    trees = _ContainmentTrees(nodes, scaling_groups)
+    if any(modified_node_id not in trees
+           for modified_node_id in modified_nodes):
+        return None
+
+    dirty_trees = set(trees.find(modified_node_id)
+                      for modified_node_id in modified_nodes)
+    node_ids_with_instances = set(_node_id_from_node_instance(instance)
+                                  for instance in previous_node_instances)
+    for node in nodes:
+        node_id = node['id']
+        previous_node = previous_nodes_by_id[node_id]
+        changed = (previous_node is not node and
+                   _node_modification_key(previous_node) !=
+                   _node_modification_key(node))
+        expanded = (node_id not in node_ids_with_instances and
+                    _node_scale_properties(node)['current_instances'] > 0)
+        if changed or expanded:
+            dirty_trees.add(trees.find(node_id))
+
+    region_trees = set(dirty_trees)
+    for node in nodes:
+        for relationship in node.get(RELATIONSHIPS, []):
+            if CONTAINED_IN_REL_TYPE in relationship['type_hierarchy']:
+                continue
+            source_tree = trees.find(node['id'])
+            target_tree = trees.find(relationship['target_id'])
+            if source_tree in dirty_trees:
+                region_trees.add(target_tree)
+            if target_tree in dirty_trees:
+                region_trees.add(source_tree)
+    if region_trees == trees.roots():
+        return None
+
+    region_ids = set(node_id for node_id in trees
+                     if trees.find(node_id) in region_trees)
+    return ModificationRegion(
+        nodes=[_restrict_relationships(node, region_ids, 'target_id')
+               for node in nodes if node['id'] in region_ids],
+        previous_nodes=[
+            _restrict_relationships(node, region_ids, 'target_id')
+            for node in previous_nodes if node['id'] in region_ids],
+        previous_node_instances=[
+            _restrict_relationships(instance, region_ids, 'target_name')
+            for instance in previous_node_instances
+            if _node_id_from_node_instance(instance) in region_ids],
+        scaling_groups=dict(
+            (group_name, group)
+            for group_name, group in scaling_groups.items()
+            if group_name in region_ids))
+
+
+ModificationRegion = collections.namedtuple('ModificationRegion', [
+    'nodes',
+    'previous_nodes',
+    'previous_node_instances',
+    'scaling_groups'
+])
+
+
+def _node_modification_key(node):
+    relationships = [(r['type'], r['target_id'])
+                     for r in node.get(RELATIONSHIPS, [])]
+    return relationships, _node_scale_properties(node)
+
+
+def _restrict_relationships(node, region_ids, target_key):
+    relationships = node.get(RELATIONSHIPS, [])
+    restricted = [r for r in relationships if r[target_key] in region_ids]
+    if len(restricted) == len(relationships):
+        return node
+    node = node.copy()
+    node[RELATIONSHIPS] = restricted
+    return node
+
+
+class _ContainmentTrees(object):
+    """Union-find over plan node ids and scaling group names, joining
+    nodes to their containers and group members to their groups"""
+
+    def __init__(self, nodes, scaling_groups):
+        self._parents = {}
+        for node in nodes:
+            self._parents.setdefault(node['id'], node['id'])
+        for group_name, group in scaling_groups.items():
+            self._parents.setdefault(group_name, group_name)
+            for member in group['members']:
+                self.union(member, group_name)
+        for node in nodes:
+            for relationship in node.get(RELATIONSHIPS, []):
+                if CONTAINED_IN_REL_TYPE in relationship['type_hierarchy']:
+                    self.union(node['id'], relationship['target_id'])
+
+    def __contains__(self, node_id):
+        return node_id in self._parents
+
+    def __iter__(self):
+        return iter(self._parents)
+
+    def find(self, node_id):
+        parents = self._parents
+        root = node_id
+        while parents[root] != root:
+            root = parents[root]
+        while parents[node_id] != root:
+            parents[node_id], node_id = root, parents[node_id]
+        return root
+
+    def union(self, node_a, node_b):
+        self._parents.setdefault(node_a, node_a)
+        self._parents.setdefault(node_b, node_b)
+        self._parents[self.find(node_a)] = self.find(node_b)
+
+    def roots(self):
+        return set(self.find(node_id) for node_id in self._parents)
+
+
 def build_previous_deployment_node_graph(plan_node_graph,
                                          previous_node_instances):
+    import networkx as nx
     graph = nx.DiGraph()
     contained_graph = nx.DiGraph()
     for node_instance in previous_node_instances:
@@ -196,7 +358,15 @@ def build_previous_deployment_node_graph(plan_node_graph,
 def build_deployment_node_graph(plan_node_graph,
                                 previous_deployment_node_graph=None,
                                 previous_deployment_contained_graph=None,
-                                modified_nodes=None):
+                                modified_nodes=None,
+                                reserved_node_instance_ids=None,
+                                processes=None):
+    """
+    :param processes: when greater than 1, the node instances of independent
+                      contained trees are built using a pool of this many
+                      processes.
+    """
+    import networkx as nx
 
     _verify_no_unsupported_relationships(plan_node_graph)
 
@@ -207,8 +377,12 @@ def build_deployment_node_graph(plan_node_graph,
         previous_deployment_node_graph=previous_deployment_node_graph,
         previous_deployment_contained_graph=previous_deployment_contained_graph,  # noqa
         modified_nodes=modified_nodes)
+    if reserved_node_instance_ids:
+        # ids of node instances outside the graphs being built which new node
+        # instance ids must not collide with
+        ctx.node_instance_ids.update(reserved_node_instance_ids)
 
-    _handle_contained_in(ctx)
+    _handle_contained_in(ctx, processes=processes)
 
     ctx.node_instance_ids.clear()
     ctx.node_ids_to_node_instance_ids.clear()
@@ -225,27 +399,128 @@ def build_deployment_node_graph(plan_node_graph,
     return deployment_node_graph, ctx
 
 
+def estimate_deployment_node_graph(plan_node_graph):
+    """
+    Count the node instances and relationship instances
+    build_deployment_node_graph creates for a plan node graph, without
+    creating them.
+
+    :return: a dict from node ids to dicts holding the 'node_instances' and
+             (outgoing) 'relationship_instances' counts of the node.
+    """
+    _verify_no_unsupported_relationships(plan_node_graph)
+    ctx = Context(plan_node_graph=plan_node_graph,
+                  deployment_node_graph=None)
+    try:
+        instances = {}
+        result = {}
+        for node_id, data in plan_node_graph.nodes_iter(data=True):
+            if data['node'].get('group'):
+                continue
+            result[node_id] = {
+                'node_instances': _estimate_node_instances(ctx, node_id,
+                                                           instances),
+                'relationship_instances': 0
+            }
+        for source_node_id, _, edge_data in plan_node_graph.edges_iter(
+                data=True):
+            if _relationship_type_hierarchy_includes_one_of(
+                    edge_data['relationship'], [CONTAINED_IN_REL_TYPE]):
+                result[source_node_id]['relationship_instances'] += \
+                    result[source_node_id]['node_instances']
+        for source_node_id, target_node_id, edge_data in \
+                ctx.plan_connected_graph.edges_iter(data=True):
+            connection_type = _verify_and_get_connection_type(
+                edge_data['relationship'])
+            source_instances = result[source_node_id]['node_instances']
+            target_instances = result[target_node_id]['node_instances']
+            if not source_instances or not target_instances:
+                continue
+            minimal_containing_group = ctx.minimal_containing_group(
+                node_a=source_node_id,
+                node_b=target_node_id)
+            if connection_type == ALL_TO_ONE:
+                if minimal_containing_group:
+                    raise _unsupported_all_to_one_in_group(
+                        source_node_id=source_node_id,
+                        target_node_id=target_node_id,
+                        group=minimal_containing_group)
+                relationship_instances = source_instances
+            else:
+                relationship_instances = source_instances * target_instances
+                if minimal_containing_group:
+                    # source and target instances are only connected within
+                    # the same instance of their minimal containing group
+                    relationship_instances //= _estimate_node_instances(
+                        ctx, minimal_containing_group, instances)
+            result[source_node_id]['relationship_instances'] += \
+                relationship_instances
+        return result
+    finally:
+        ctx.restore_plan_node_graph()
+
+
+def _estimate_node_instances(ctx, node_id, instances):
+    if node_id not in instances:
+        node_instances = int(ctx.plan_node_graph.node[node_id][
+            'scale_properties']['current_instances'])
+        succ = ctx.plan_contained_graph.succ.get(node_id)
+        if succ:
+            assert len(succ) == 1
+            node_instances *= _estimate_node_instances(ctx, succ.keys()[0],
+                                                       instances)
+        instances[node_id] = node_instances
+    return instances[node_id]
+
+
 def extract_node_instances(node_instances_graph,
                            ctx,
                            copy_instances=False,
                            contained_graph=None):
-    contained_graph = contained_graph or ctx.deployment_contained_graph
+    return _extract_node_instances(
+        graph=node_instances_graph,
+        node_instance_ids=node_instances_graph,
+        successors=node_instances_graph.neighbors_iter,
+        ctx=ctx,
+        contained_graph=contained_graph or ctx.deployment_contained_graph,
+        copy_instances=copy_instances)
+
+
+def _extract_node_instances(graph,
+                            node_instance_ids,
+                            successors,
+                            ctx,
+                            contained_graph,
+                            copy_instances,
+                            marked_node_instance_ids=(),
+                            node_instance_attributes=None,
+                            excluded_node_instance_ids=()):
+    """
+    :param graph: the deployment node graph holding the node instances.
+    :param node_instance_ids: ids of the node instances to extract.
+    :param successors: a function returning the ids of the relationship
+                       targets to extract for a node instance id.
+    :param marked_node_instance_ids: node instances to be updated with
+                                     node_instance_attributes.
+    :param excluded_node_instance_ids: node instances that take part in the
+                                       extraction but are left out of the
+                                       result.
+    """
     added_missing_node_instance_ids = set()
     node_instances = []
-    for node_instance_id, data in node_instances_graph.nodes_iter(data=True):
-        node_instance = data['node']
+    for node_instance_id in node_instance_ids:
+        if node_instance_id in excluded_node_instance_ids:
+            continue
+        node_instance = graph.node[node_instance_id]['node']
         if node_instance.get('group'):
             continue
-        node_instance_attributes = data.get('node_instance_attributes')
         if copy_instances:
-            node_instance = copy.deepcopy(node_instance)
-        if node_instance_attributes:
+            node_instance = _node_instance_deepcopy(node_instance)
+        if node_instance_id in marked_node_instance_ids:
             node_instance.update(node_instance_attributes)
         indexed_relationship_instances = []
-        for target_node_instance_id in node_instances_graph.neighbors_iter(
-                node_instance_id):
-            edge_data = node_instances_graph[node_instance_id][
-                target_node_instance_id]
+        for target_node_instance_id in successors(node_instance_id):
+            edge_data = graph[node_instance_id][target_node_instance_id]
             relationship_instance = edge_data['relationship']
             relationship_index = edge_data['index']
             if copy_instances:
@@ -277,12 +552,13 @@ def extract_node_instances(node_instances_graph,
                     # as a "related" node. Added and removed nodes are marked
                     # as such, so all we need to do is add this node with
                     # no relationships
-                    if (target_id not in node_instances_graph and
-                            target_id not in added_missing_node_instance_ids):
+                    if not (target_id in node_instance_ids or
+                            target_id in added_missing_node_instance_ids or
+                            target_id in excluded_node_instance_ids):
                         target_node_instance = contained_graph.node[target_id][
                             'node']
                         if copy_instances:
-                            target_node_instance = copy.deepcopy(
+                            target_node_instance = _node_instance_deepcopy(
                                 target_node_instance)
                         target_node_instance[RELATIONSHIPS] = []
                         node_instances.append(target_node_instance)
@@ -297,110 +573,272 @@ def extract_node_instances(node_instances_graph,
     return node_instances
 
 
+def _node_instance_deepcopy(node_instance):
+    # relationships are rebuilt from the graph edges during extraction,
+    # there is no point in copying them
+    return dict((key, copy.deepcopy(value))
+                for key, value in node_instance.iteritems()
+                if key != RELATIONSHIPS)
+
+
+class DeploymentNodeGraphsDiff(object):
+    """
+    Differences between a previous and a new deployment node graph.
+
+    Node instances are identified by their ids and relationship instances
+    by their (source id, target id) pairs, so all differences are computed
+    once, with set operations, when the diff is created. Extracted node
+    instances are copied (once per extraction), the graphs themselves are
+    left untouched.
+    """
+
+    def __init__(self,
+                 previous_deployment_node_graph,
+                 new_deployment_node_graph,
+                 ctx):
+        self._previous_graph = previous_deployment_node_graph
+        self._new_graph = new_deployment_node_graph
+        self._ctx = ctx
+        previous_ids = set(previous_deployment_node_graph)
+        new_ids = set(new_deployment_node_graph)
+        previous_edges = set(previous_deployment_node_graph.edges_iter())
+        new_edges = set(new_deployment_node_graph.edges_iter())
+        self.added_ids = new_ids - previous_ids
+        self.removed_ids = previous_ids - new_ids
+        self.added_relationships = set(
+            (source, target) for source, target in new_edges - previous_edges
+            if source in previous_ids)
+        self.removed_relationships = set(
+            (source, target) for source, target in previous_edges - new_edges
+            if source in new_ids)
+
+    def added_node_instances(self):
+        return self._extract_node_instances_and_related(
+            graph=self._new_graph,
+            node_instance_ids=self.added_ids,
+            modification='added',
+            contained_graph=self._ctx.deployment_contained_graph)
+
+    def removed_node_instances(self):
+        return self._extract_node_instances_and_related(
+            graph=self._previous_graph,
+            node_instance_ids=self.removed_ids,
+            modification='removed',
+            contained_graph=self._ctx.previous_deployment_contained_graph)
+
+    def added_relationships_node_instances(self, excluded_ids=()):
+        return self._extract_relationships_node_instances(
+            graph=self._new_graph,
+            relationships=self.added_relationships,
+            modification='extended',
+            contained_graph=self._ctx.deployment_contained_graph,
+            excluded_ids=excluded_ids)
+
+    def removed_relationships_node_instances(self, excluded_ids=()):
+        return self._extract_relationships_node_instances(
+            graph=self._previous_graph,
+            relationships=self.removed_relationships,
+            modification='reduced',
+            contained_graph=self._ctx.previous_deployment_contained_graph,
+            excluded_ids=excluded_ids)
+
+    def modification(self):
+        # node instances which were added or removed have all their
+        # relationships added or removed as well, so they are not included
+        # in the extended and reduced node instances (the change is on the
+        # node instance level and not on the relationship level)
+        return {
+            'added_and_related': self.added_node_instances(),
+            'extended_and_related': self.added_relationships_node_instances(
+                excluded_ids=self.added_ids),
+            'reduced_and_related': self.removed_relationships_node_instances(
+                excluded_ids=self.removed_ids),
+            'removed_and_related': self.removed_node_instances()
+        }
+
+    def _extract_node_instances_and_related(self,
+                                            graph,
+                                            node_instance_ids,
+                                            modification,
+                                            contained_graph):
+        relationships = set()
+        for node_instance_id in node_instance_ids:
+            relationships.update(graph.out_edges_iter(node_instance_id))
+            relationships.update(graph.in_edges_iter(node_instance_id))
+        return self._extract(graph=graph,
+                             marked_ids=node_instance_ids,
+                             relationships=relationships,
+                             modification=modification,
+                             contained_graph=contained_graph)
+
+    def _extract_relationships_node_instances(self,
+                                              graph,
+                                              relationships,
+                                              modification,
+                                              contained_graph,
+                                              excluded_ids):
+        return self._extract(
+            graph=graph,
+            marked_ids=set(source for source, _ in relationships),
+            relationships=relationships,
+            modification=modification,
+            contained_graph=contained_graph,
+            excluded_ids=excluded_ids)
+
+    def _extract(self,
+                 graph,
+                 marked_ids,
+                 relationships,
+                 modification,
+                 contained_graph,
+                 excluded_ids=()):
+        node_instance_ids = set(marked_ids)
+        for source, target in relationships:
+            node_instance_ids.add(source)
+            node_instance_ids.add(target)
+
+        def successors(node_instance_id):
+            return (target for target in graph.neighbors_iter(node_instance_id)
+                    if (node_instance_id, target) in relationships)
+        return _extract_node_instances(
+            graph=graph,
+            node_instance_ids=node_instance_ids,
+            successors=successors,
+            ctx=self._ctx,
+            contained_graph=contained_graph,
+            copy_instances=True,
+            marked_node_instance_ids=marked_ids,
+            node_instance_attributes={'modification': modification},
+            excluded_node_instance_ids=excluded_ids)
+
+
 def extract_added_node_instances(previous_deployment_node_graph,
                                  new_deployment_node_graph,
                                  ctx):
-    added_instances_graph = _graph_diff(
-        new_deployment_node_graph,
+    return DeploymentNodeGraphsDiff(
         previous_deployment_node_graph,
-        node_instance_attributes={'modification': 'added'})
-    return extract_node_instances(
-        added_instances_graph,
-        ctx=ctx,
-        copy_instances=True,
-        contained_graph=ctx.deployment_contained_graph)
+        new_deployment_node_graph,
+        ctx=ctx).added_node_instances()
 
 
 def extract_removed_node_instances(previous_deployment_node_graph,
                                    new_deployment_node_graph,
                                    ctx):
-    removed_instances_graph = _graph_diff(
+    return DeploymentNodeGraphsDiff(
         previous_deployment_node_graph,
         new_deployment_node_graph,
-        node_instance_attributes={'modification': 'removed'})
-    return extract_node_instances(
-        removed_instances_graph,
-        ctx=ctx,
-        copy_instances=True,
-        contained_graph=ctx.previous_deployment_contained_graph)
+        ctx=ctx).removed_node_instances()
 
 
 def extract_added_relationships(previous_deployment_node_graph,
                                 new_deployment_node_graph,
                                 ctx):
-
-    modified_instance_graph = _graph_diff_relationships(
-        new_deployment_node_graph,
+    return DeploymentNodeGraphsDiff(
         previous_deployment_node_graph,
-        node_instance_attributes={'modification': 'extended'})
-    return extract_node_instances(
-        modified_instance_graph,
-        ctx=ctx,
-        copy_instances=True,
-        contained_graph=ctx.deployment_contained_graph)
+        new_deployment_node_graph,
+        ctx=ctx).added_relationships_node_instances()
 
 
 def extract_removed_relationships(previous_deployment_node_graph,
                                   new_deployment_node_graph,
                                   ctx):
-    modified_instance_graph = _graph_diff_relationships(
+    return DeploymentNodeGraphsDiff(
         previous_deployment_node_graph,
         new_deployment_node_graph,
-        node_instance_attributes={'modification': 'reduced'})
-    return extract_node_instances(
-        modified_instance_graph,
-        ctx=ctx,
-        copy_instances=True,
-        contained_graph=ctx.previous_deployment_contained_graph)
+        ctx=ctx).removed_relationships_node_instances()
 
 
-def _graph_diff(G, H, node_instance_attributes):
-    result = nx.DiGraph()
-    for n1, data in G.nodes_iter(data=True):
-        if n1 in H:
-            continue
-        result.add_node(n1, data,
-                        node_instance_attributes=node_instance_attributes)
-        for n2 in G.neighbors_iter(n1):
-            result.add_node(n2, G.node[n2])
-            result.add_edge(n1, n2, G[n1][n2])
-        for n2 in G.predecessors_iter(n1):
-            result.add_node(n2, G.node[n2])
-            result.add_edge(n2, n1, G[n2][n1])
-    return result
+def _handle_contained_in(ctx, processes=None):
+    import networkx as nx
+    # for each 'contained' tree, recursively build new trees based on
+    # scaling groups with generated ids
+    contained_trees = list(nx.weakly_connected_component_subgraphs(
+        ctx.plan_contained_graph.reverse(copy=True)))
+    if processes and processes > 1 and len(contained_trees) > 1:
+        _build_contained_trees_in_parallel(ctx, contained_trees, processes)
+    else:
+        for contained_tree in contained_trees:
+            _build_contained_tree(ctx, contained_tree)
+    ctx.deployment_contained_graph = ctx.deployment_node_graph.copy()
 
 
-def _graph_diff_relationships(G, H, node_instance_attributes):
-    """
-    G represents the base and H represents the changed graph.
-    :param G:
-    :param H:
-    :param node_instance_attributes:
-    :return:
-    """
-    result = nx.DiGraph()
-    for source, dest, data in G.edges_iter(data=True):
-        if source in H and dest not in H[source]:
-            new_node = copy.deepcopy(G.node[source])
-            result.add_node(source, new_node,
-                            node_instance_attributes=node_instance_attributes)
-            result.add_node(dest, G.node[dest])
-            result.add_edge(source, dest, G[source][dest])
-    return result
+def _build_contained_tree(ctx, contained_tree):
+    import networkx as nx
+    # extract tree root node id
+    node_id = nx.topological_sort(contained_tree)[0]
+    _build_multi_instance_node_tree_rec(
+        node_id=node_id,
+        contained_tree=contained_tree,
+        ctx=ctx)
 
 
-def _handle_contained_in(ctx):
-    # for each 'contained' tree, recursively build new trees based on
-    # scaling groups with generated ids
+def _build_contained_trees_in_parallel(ctx, contained_trees, processes):
+    """
+    Build the node instances of independent contained trees in a process
+    pool and merge them, in the original trees order, into the deployment
+    node graph.
+
+    Node instance ids are prefixed by the id of their node, which belongs
+    to a single tree, so ids generated by different workers cannot collide.
+    Each worker only needs to avoid the existing ids of its own nodes.
+    """
+    import multiprocessing
+    tasks = [_contained_tree_task(ctx, contained_tree)
+             for contained_tree in contained_trees]
+    pool = multiprocessing.Pool(processes=processes,
+                                initializer=random.seed)
+    try:
+        tree_graphs = pool.map(_build_contained_tree_task, tasks)
+    finally:
+        pool.close()
+        pool.join()
+    for tree_graph in tree_graphs:
+        ctx.deployment_node_graph.add_nodes_from(
+            tree_graph.nodes_iter(data=True))
+        ctx.deployment_node_graph.add_edges_from(
+            tree_graph.edges_iter(data=True))
+        ctx.node_instance_ids.update(tree_graph)
+
+
+def _contained_tree_task(ctx, contained_tree):
+    node_ids = set(contained_tree)
+    previous_deployment_node_graph = None
+    modified_nodes = None
+    if ctx.is_modification:
+        previous_deployment_node_graph = \
+            ctx.previous_deployment_node_graph.subgraph(
+                node_instance_id for node_id in node_ids
+                for node_instance_id in
+                ctx.node_ids_to_node_instance_ids[node_id])
+        modified_nodes = dict(
+            (node_id, modified_node)
+            for node_id, modified_node in ctx.modified_nodes.items()
+            if node_id in node_ids)
+    reserved_node_instance_ids = set(
+        node_instance_id for node_instance_id in ctx.node_instance_ids
+        if node_instance_id.rsplit('_', 1)[0] in node_ids)
+    return (ctx.plan_node_graph.subgraph(node_ids),
+            previous_deployment_node_graph,
+            modified_nodes,
+            reserved_node_instance_ids)
+
+
+def _build_contained_tree_task(task):
+    import networkx as nx
+    (plan_node_graph,
+     previous_deployment_node_graph,
+     modified_nodes,
+     reserved_node_instance_ids) = task
+    ctx = Context(
+        plan_node_graph=plan_node_graph,
+        deployment_node_graph=nx.DiGraph(),
+        previous_deployment_node_graph=previous_deployment_node_graph,
+        modified_nodes=modified_nodes)
+    ctx.node_instance_ids.update(reserved_node_instance_ids)
     for contained_tree in nx.weakly_connected_component_subgraphs(
             ctx.plan_contained_graph.reverse(copy=True)):
-        # extract tree root node id
-        node_id = nx.topological_sort(contained_tree)[0]
-        _build_multi_instance_node_tree_rec(
-            node_id=node_id,
-            contained_tree=contained_tree,
-            ctx=ctx)
-    ctx.deployment_contained_graph = ctx.deployment_node_graph.copy()
+        _build_contained_tree(ctx, contained_tree)
+    return ctx.deployment_node_graph
 
 
 def _build_multi_instance_node_tree_rec(node_id,
@@ -410,6 +848,7 @@ def _build_multi_instance_node_tree_rec(node_id,
                                         parent_relationship_index=None,
                                         parent_node_instance_id=None,
                                         current_host_instance_id=None):
+    import networkx as nx
     node = contained_tree.node[node_id]['node']
     containers = _build_and_update_node_instances(
         ctx=ctx,
@@ -658,12 +1097,10 @@ def _add_connected_to_and_depends_on_relationships(
 
     if connection_type == ALL_TO_ONE:
         if minimal_containing_group:
-            raise exceptions.UnsupportedAllToOneInGroup(
-                "'{0}' connection type is not supported within groups, "
-                "but the source node '{1}' and target node '{2}' are both in "
-                "group '{3}'"
-                .format(ALL_TO_ONE, source_node_id, target_node_id,
-                        minimal_containing_group))
+            raise _unsupported_all_to_one_in_group(
+                source_node_id=source_node_id,
+                target_node_id=target_node_id,
+                group=minimal_containing_group)
         else:
             target_node_instance_id = _get_all_to_one_relationship_target_id(
                 ctx=ctx,
@@ -697,6 +1134,14 @@ def _add_connected_to_and_depends_on_relationships(
                     index=index)
 
 
+def _unsupported_all_to_one_in_group(source_node_id, target_node_id, group):
+    return exceptions.UnsupportedAllToOneInGroup(
+        "'{0}' connection type is not supported within groups, "
+        "but the source node '{1}' and target node '{2}' are both in "
+        "group '{3}'"
+        .format(ALL_TO_ONE, source_node_id, target_node_id, group))
+
+
 def _partition_source_and_target_instances(
         ctx,
         group,
@@ -829,6 +1274,8 @@ class Context(object):
         self.modified_nodes = modified_nodes
         self.node_ids_to_node_instance_ids = collections.defaultdict(set)
         self.node_instance_ids = set()
+        self._node_containing_groups = {}
+        self._graph_caches = {}
         if self.is_modification:
             for node_instance_id, data in \
                     self.previous_deployment_node_graph.nodes_iter(data=True):
@@ -843,63 +1290,108 @@ class Context(object):
         return self.previous_deployment_node_graph is not None
 
     def minimal_containing_group(self, node_a, node_b):
-        a_groups = self._containing_groups(node_a)
         b_groups = self._containing_groups(node_b)
-        shared_groups = set(a_groups) & set(b_groups)
-        if not shared_groups:
-            return None
-        return nx.topological_sort(self.plan_contained_graph,
-                                   nbunch=shared_groups)[0]
+        for group in self._containing_groups(node_a):
+            # containing groups are ordered from the innermost group
+            if group in b_groups:
+                return group
+        return None
 
     def _containing_groups(self, node_id):
-        graph = self.plan_contained_graph
-        result = []
-        while True:
+        """
+        The groups containing a node, ordered from the innermost group.
+
+        Computed once per node, based on the containing groups of its parent.
+        """
+        containing_groups = self._node_containing_groups.get(node_id)
+        if containing_groups is None:
+            graph = self.plan_contained_graph
             succ = graph.succ[node_id]
             if succ:
                 assert len(succ) == 1
-                node_id = succ.keys()[0]
-                if not graph.node[node_id]['node'].get('group'):
-                    continue
-                result.append(node_id)
+                parent_id = succ.keys()[0]
+                containing_groups = self._containing_groups(parent_id)
+                if graph.node[parent_id]['node'].get('group'):
+                    containing_groups = [parent_id] + containing_groups
             else:
-                break
-        return result
+                containing_groups = []
+            self._node_containing_groups[node_id] = containing_groups
+        return containing_groups
 
     def containing_group_id(self, node_instance_id, group_name):
+        return self._containing_group_ids(node_instance_id).get(group_name)
+
+    def _containing_group_ids(self, node_instance_id):
+        """
+        Map the names of the groups containing a node instance to the ids of
+        the group instances containing it.
+
+        Computed once per node instance, based on the containing group
+        instances of its parent.
+        """
         graph = self.deployment_contained_graph
-        while True:
+        cache = self._graph_cache(graph, 'containing_group_ids')
+        group_ids = cache.get(node_instance_id)
+        if group_ids is None:
             succ = graph.succ[node_instance_id]
             if succ:
                 assert len(succ) == 1
-                node_instance_id = succ.keys()[0]
-                node = graph.node[node_instance_id]['node']
-                if not node.get('group'):
-                    continue
-                if _node_id_from_node_instance(node) == group_name:
-                    return node['id']
+                parent_id = succ.keys()[0]
+                group_ids = self._containing_group_ids(parent_id)
+                parent = graph.node[parent_id]['node']
+                if parent.get('group'):
+                    group_ids = group_ids.copy()
+                    group_ids[_node_id_from_node_instance(parent)] = \
+                        parent_id
             else:
-                return None
+                group_ids = {}
+            cache[node_instance_id] = group_ids
+        return group_ids
 
-    @staticmethod
-    def containing_group_instances(instance_id,
+    def containing_group_instances(self,
+                                   instance_id,
                                    contained_graph):
-        result = []
-        while True:
+        containing_groups, parent = self._containing_group_instances(
+            instance_id, contained_graph)
+        return ([group.copy() for group in containing_groups],
+                parent and parent.copy())
+
+    def _containing_group_instances(self, instance_id, contained_graph):
+        cache = self._graph_cache(contained_graph,
+                                  'containing_group_instances')
+        result = cache.get(instance_id)
+        if result is None:
             succ = contained_graph.succ[instance_id]
             if succ:
                 assert len(succ) == 1
                 node_instance_id = succ.keys()[0]
                 node = contained_graph.node[node_instance_id]['node']
-                instance_id = node['id']
-                result.append({
+                containing_instance = {
                     'name': _node_id_from_node_instance(node),
-                    'id': instance_id
-                })
-                if not node.get('group'):
-                    return result[:-1], result[-1]
+                    'id': node['id']
+                }
+                if node.get('group'):
+                    containing_groups, parent = \
+                        self._containing_group_instances(node['id'],
+                                                         contained_graph)
+                    result = ([containing_instance] + containing_groups,
+                              parent)
+                else:
+                    result = [], containing_instance
             else:
-                return result, None
+                result = [], None
+            cache[instance_id] = result
+        return result
+
+    def _graph_cache(self, graph, name):
+        # deployment graphs are only walked after they are fully built,
+        # so their caches are kept for the lifetime of the context
+        key = (id(graph), name)
+        cache = self._graph_caches.get(key)
+        if cache is None or cache[0] is not graph:
+            cache = (graph, {})
+            self._graph_caches[key] = cache
+        return cache[1]
 
     def restore_plan_node_graph(self):
         for _, data in self.plan_node_graph.nodes_iter(data=True):
@@ -932,6 +1424,7 @@ class Context(object):
     def _build_graph_by_relationship_types(graph,
                                            build_from_types,
                                            exclude_types):
+        import networkx as nx
         relationship_base_graph = nx.DiGraph()
         for source, target, edge_data in graph.edges_iter(data=True):
             include_edge = (
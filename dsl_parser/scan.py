@@ -20,11 +20,6 @@ OUTPUTS_SCOPE = 'outputs'
 POLICIES_SCOPE = 'policies'
 SCALING_GROUPS_SCOPE = 'scaling_groups'
 
-# Searching for secrets in the blueprint only one time of the few times
-# that scan_service_template is called
-collect_secrets = False
-secrets = set()
-
 
 def scan_properties(value,
                     handler,
@@ -32,7 +27,8 @@ def scan_properties(value,
                     context=None,
                     path='',
                     replace=False,
-                    recursive=True):
+                    recursive=True,
+                    secrets=None):
     """
     Scans properties dict recursively and applies the provided handler
     method for each property.
@@ -45,6 +41,8 @@ def scan_properties(value,
     * context - scanner context (i.e. actual node template).
     * path - current property path.
     * replace - replace current dict/list values of scanned properties.
+    * secrets - a set collecting the keys of the get_secret functions
+                returned by the handler, not collected when None.
 
     :param value: The properties container (dict/list).
     :param handler: A method for applying for to each property.
@@ -54,7 +52,7 @@ def scan_properties(value,
         for k, v in value.iteritems():
             current_path = '{0}.{1}'.format(path, k)
             result = handler(v, scope, context, current_path)
-            _collect_secret(result)
+            collect_secret(result, secrets)
             if replace and result != v:
                 value[k] = result
             if recursive:
@@ -62,12 +60,13 @@ def scan_properties(value,
                                 scope=scope,
                                 context=context,
                                 path=current_path,
-                                replace=replace)
+                                replace=replace,
+                                secrets=secrets)
     elif isinstance(value, list):
         for index, item in enumerate(value):
             current_path = '{0}[{1}]'.format(path, index)
             result = handler(item, scope, context, current_path)
-            _collect_secret(result)
+            collect_secret(result, secrets)
             if replace and result != item:
                 value[index] = result
             if recursive:
@@ -76,11 +75,14 @@ def scan_properties(value,
                                 scope=scope,
                                 context=context,
                                 path=path,
-                                replace=replace)
+                                replace=replace,
+                                secrets=secrets)
 
 
-def _collect_secret(value):
-    if collect_secrets and isinstance(value, dict) and 'get_secret' in value:
+def collect_secret(value, secrets):
+    """Add the key of a get_secret function value to the secrets set."""
+    if secrets is not None and isinstance(value, dict) \
+            and 'get_secret' in value:
         secrets.add(value['get_secret'])
 
 
@@ -89,7 +91,8 @@ def _scan_operations(operations,
                      scope=None,
                      context=None,
                      path='',
-                     replace=False):
+                     replace=False,
+                     secrets=None):
     for name, definition in operations.iteritems():
         if isinstance(definition, dict) and 'inputs' in definition:
             context = context.copy() if context else {}
@@ -99,16 +102,19 @@ def _scan_operations(operations,
                             scope=scope,
                             context=context,
                             path='{0}.{1}.inputs'.format(path, name),
-                            replace=replace)
+                            replace=replace,
+                            secrets=secrets)
 
 
-def scan_node_operation_properties(node_template, handler, replace=False):
+def scan_node_operation_properties(node_template, handler, replace=False,
+                                   secrets=None):
     _scan_operations(node_template['operations'],
                      handler,
                      scope=NODE_TEMPLATE_SCOPE,
                      context=node_template,
                      path='{0}.operations'.format(node_template['name']),
-                     replace=replace)
+                     replace=replace,
+                     secrets=secrets)
     for r in node_template.get('relationships', []):
         context = {'node_template': node_template, 'relationship': r}
         _scan_operations(r.get('source_operations', {}),
@@ -117,19 +123,20 @@ def scan_node_operation_properties(node_template, handler, replace=False):
                          context=context,
                          path='{0}.{1}'.format(node_template['name'],
                                                r['type']),
-                         replace=replace)
+                         replace=replace,
+                         secrets=secrets)
         _scan_operations(r.get('target_operations', {}),
                          handler,
                          scope=NODE_TEMPLATE_RELATIONSHIP_SCOPE,
                          context=context,
                          path='{0}.{1}'.format(node_template['name'],
                                                r['type']),
-                         replace=replace)
+                         replace=replace,
+                         secrets=secrets)
 
 
 def scan_service_template(plan, handler, replace=False, search_secrets=False):
-    global collect_secrets
-    collect_secrets = search_secrets
+    secrets = set() if search_secrets else None
 
     for node_template in plan.node_templates:
         scan_properties(node_template['properties'],
@@ -138,7 +145,8 @@ def scan_service_template(plan, handler, replace=False, search_secrets=False):
                         context=node_template,
                         path='{0}.properties'.format(
                             node_template['name']),
-                        replace=replace)
+                        replace=replace,
+                        secrets=secrets)
         for name, capability in node_template.get('capabilities', {}).items():
             scan_properties(capability.get('properties', {}),
                             handler,
@@ -147,22 +155,26 @@ def scan_service_template(plan, handler, replace=False, search_secrets=False):
                             path='{0}.capabilities.{1}'.format(
                                 node_template['name'],
                                 name),
-                            replace=replace)
-        scan_node_operation_properties(node_template, handler, replace=replace)
+                            replace=replace,
+                            secrets=secrets)
+        scan_node_operation_properties(node_template, handler,
+                                       replace=replace, secrets=secrets)
     for output_name, output in plan.outputs.iteritems():
         scan_properties(output,
                         handler,
                         scope=OUTPUTS_SCOPE,
                         context=plan.outputs,
                         path='outputs.{0}'.format(output_name),
-                        replace=replace)
+                        replace=replace,
+                        secrets=secrets)
     for policy_name, policy in plan.get('policies', {}).items():
         scan_properties(policy.get('properties', {}),
                         handler,
                         scope=POLICIES_SCOPE,
                         context=policy,
                         path='policies.{0}.properties'.format(policy_name),
-                        replace=replace)
+                        replace=replace,
+                        secrets=secrets)
     for group_name, scaling_group in plan.get('scaling_groups', {}).items():
         scan_properties(scaling_group.get('properties', {}),
                         handler,
@@ -170,8 +182,8 @@ def scan_service_template(plan, handler, replace=False, search_secrets=False):
                         context=scaling_group,
                         path='scaling_groups.{0}.properties'.format(
                             group_name),
-                        replace=replace)
+                        replace=replace,
+                        secrets=secrets)
 
-    if collect_secrets and len(secrets) > 0:
+    if secrets:
         plan['secrets'] = list(secrets)
-        secrets.clear()
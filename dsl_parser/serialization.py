@@ -0,0 +1,443 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+"""Compact binary serialization of plans and deployment plans.
+
+The binary format starts with a magic header and a format version byte,
+followed by length-prefixed records: a 4 byte big endian payload length
+and the payload, a record with an empty payload ends the data. The
+payloads hold a single serialized value, which may span records.
+
+Every value starts with a one byte tag, lengths and integers are written
+as varints, floats as 8 byte doubles. Strings (both ``str`` and
+``unicode``, the latter UTF-8 encoded) are written in full on their first
+occurrence and added to a string table, later occurrences (e.g. repeated
+keys such as ``type_hierarchy`` and ``operations`` or plugin names) only
+reference their table index. ``dump`` writes a record whenever enough of
+the value is encoded and ``load`` reads one record at a time, so neither
+holds the whole serialized form in memory.
+
+The binary format is smaller than JSON (about a quarter of its size for
+a deployment plan), it is encoded and decoded in Python though, so it
+takes longer to write and read than ``json`` does. ``dumps`` and ``dump``
+therefore write JSON unless called with ``output_format=BINARY``.
+``load`` and ``loads`` read both formats.
+
+Plans are restored as ``models.Plan`` with their ``models.Version``. Other
+dict and list subclasses are written as plain dicts and lists, as JSON
+would write them.
+
+Loading with ``shared=True`` returns a plan in which equal sub-structures
+are shared (see ``interning.intern_plan``), such a plan must be treated
+as read only.
+"""
+
+import json
+import struct
+
+from dsl_parser import interning, models
+
+BINARY = 'binary'
+JSON = 'json'
+
+MAGIC = b'\x89CFYPLAN'
+FORMAT_VERSION = 3
+
+# encoded parts buffered before they are written as a record
+_RECORD_PARTS = 4096
+# the most bytes a tag and a varint length take
+_HEADER_SIZE = 11
+
+_NONE = b'N'
+_TRUE = b'T'
+_FALSE = b'F'
+_INT = b'i'
+_FLOAT = b'f'
+_BYTES = b'b'
+_UNICODE = b'u'
+_STRING_REF = b'r'
+_LIST = b'l'
+_TUPLE = b't'
+_DICT = b'd'
+_PLAN = b'P'
+_VERSION = b'V'
+
+_RECORD_LENGTH = struct.Struct('>I')
+_DOUBLE = struct.Struct('>d')
+
+_SMALL_VARINTS = [chr(i) for i in xrange(0x80)]
+
+
+def dumps(value, output_format=JSON):
+    """Serialize a value to a string in the given format."""
+    if output_format == JSON:
+        return json.dumps(value)
+    parts = []
+    _Encoder(parts.append).dump(value)
+    return b''.join(parts)
+
+
+def dump(value, stream, output_format=JSON):
+    """Serialize a value into a writable binary stream."""
+    if output_format == JSON:
+        json.dump(value, stream)
+        return
+    _Encoder(stream.write).dump(value)
+
+
+def loads(data, shared=False):
+    """Load a value serialized in the binary format or as JSON."""
+    if not data.startswith(MAGIC):
+        value = json.loads(data)
+    else:
+        value = _Decoder(_Records(data=data[len(MAGIC):])).load()
+    return interning.intern_plan(value) if shared else value
+
+
+def load(stream, shared=False):
+    """Load a value from a readable stream, binary format or JSON."""
+    header = _read(stream, len(MAGIC))
+    if header != MAGIC:
+        value = json.loads(header + stream.read())
+    else:
+        value = _Decoder(_Records(stream=stream)).load()
+    return interning.intern_plan(value) if shared else value
+
+
+def _read(stream, size):
+    # reads size bytes, fewer only at the end of the stream
+    chunks = []
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _varint(number):
+    if number < 0x80:
+        return _SMALL_VARINTS[number]
+    result = bytearray()
+    while number >= 0x80:
+        result.append((number & 0x7f) | 0x80)
+        number >>= 7
+    result.append(number)
+    return bytes(result)
+
+
+class _Encoder(object):
+
+    def __init__(self, write):
+        self._write = write
+        self._parts = []
+        # (string type, string) -> encoded string table reference
+        self._strings = {}
+
+    def dump(self, value):
+        self._write(MAGIC + chr(FORMAT_VERSION))
+        self._encoder()(value)
+        self._flush()
+        self._write(_RECORD_LENGTH.pack(0))
+
+    def _flush(self):
+        if self._parts:
+            payload = b''.join(self._parts)
+            del self._parts[:]
+            self._write(_RECORD_LENGTH.pack(len(payload)) + payload)
+
+    def _encoder(self):
+        # the encoding functions are closures over the encoder state, as
+        # they are called for every value
+        parts = self._parts
+        append = parts.append
+        strings = self._strings
+        flush = self._flush
+        small_varints = _SMALL_VARINTS
+        str_type = str
+        unicode_type = unicode
+        dict_type = dict
+        list_type = list
+
+        def dump_string(string_type, value):
+            key = (string_type, value)
+            reference = strings.get(key)
+            if reference is not None:
+                append(reference)
+                return
+            index = len(strings)
+            strings[key] = _STRING_REF + (small_varints[index] if index < 0x80
+                                          else _varint(index))
+            if string_type is unicode_type:
+                value = value.encode('utf-8')
+                tag = _UNICODE
+            else:
+                tag = _BYTES
+            size = len(value)
+            append(tag + (small_varints[size] if size < 0x80
+                          else _varint(size)))
+            append(value)
+
+        def dump_items(tag, items):
+            size = len(items)
+            append(tag + (small_varints[size] if size < 0x80
+                          else _varint(size)))
+            for item in items:
+                item_type = type(item)
+                if item_type is str_type or item_type is unicode_type:
+                    dump_string(item_type, item)
+                else:
+                    dump(item)
+            if len(parts) >= _RECORD_PARTS:
+                flush()
+
+        def dump_dict(tag, value):
+            size = len(value)
+            append(tag + (small_varints[size] if size < 0x80
+                          else _varint(size)))
+            for key, item in value.iteritems():
+                key_type = type(key)
+                if key_type is str_type or key_type is unicode_type:
+                    dump_string(key_type, key)
+                else:
+                    dump(key)
+                item_type = type(item)
+                if item_type is str_type or item_type is unicode_type:
+                    dump_string(item_type, item)
+                else:
+                    dump(item)
+            if len(parts) >= _RECORD_PARTS:
+                flush()
+
+        def dump(value):
+            value_type = type(value)
+            if value_type is str_type or value_type is unicode_type:
+                dump_string(value_type, value)
+            elif value_type is dict_type:
+                dump_dict(_DICT, value)
+            elif value_type is list_type:
+                dump_items(_LIST, value)
+            elif value is None:
+                append(_NONE)
+            elif value is True:
+                append(_TRUE)
+            elif value is False:
+                append(_FALSE)
+            elif value_type is int or value_type is long:
+                # zigzag encoding keeps small negative numbers short
+                append(_INT + _varint(
+                    value << 1 if value >= 0 else ((-value) << 1) - 1))
+            elif value_type is float:
+                append(_FLOAT + _DOUBLE.pack(value))
+            elif value_type is tuple:
+                dump_items(_TUPLE, value)
+            elif isinstance(value, models.Plan):
+                dump_dict(_PLAN, value)
+            elif isinstance(value, models.Version):
+                dump_dict(_VERSION, value)
+            elif isinstance(value, dict):
+                dump_dict(_DICT, value)
+            elif isinstance(value, list):
+                dump_items(_LIST, value)
+            else:
+                raise TypeError('{0!r} is not serializable'.format(value))
+        return dump
+
+
+class _Records(object):
+    """Reads the record payloads of the binary format."""
+
+    def __init__(self, stream=None, data=b''):
+        self._stream = stream
+        self._data = data
+        self._position = 0
+        self.done = False
+
+    def version(self):
+        version = self._read(1)
+        if not version:
+            raise ValueError('Unexpected end of serialized data')
+        return ord(version)
+
+    def next(self):
+        """The payload of the next record, empty after the last one."""
+        if self.done:
+            return b''
+        header = self._read(_RECORD_LENGTH.size)
+        if len(header) < _RECORD_LENGTH.size:
+            raise ValueError('Unexpected end of serialized data')
+        size = _RECORD_LENGTH.unpack(header)[0]
+        payload = self._read(size)
+        if len(payload) < size:
+            raise ValueError('Unexpected end of serialized data')
+        if not size:
+            self.done = True
+        return payload
+
+    def _read(self, size):
+        if self._stream is not None:
+            return _read(self._stream, size)
+        position = self._position
+        self._position += size
+        return self._data[position:self._position]
+
+
+class _Decoder(object):
+
+    def __init__(self, records):
+        self._records = records
+        self._buffer = b''
+        self._position = 0
+
+    def _fill(self, size):
+        # makes size bytes available after the position, fewer only when
+        # the records end
+        chunks = [self._buffer[self._position:]]
+        available = len(chunks[0])
+        while available < size:
+            payload = self._records.next()
+            if not payload:
+                break
+            chunks.append(payload)
+            available += len(payload)
+        self._buffer = b''.join(chunks)
+        self._position = 0
+
+    def load(self):
+        version = self._records.version()
+        if version != FORMAT_VERSION:
+            raise ValueError('Unsupported serialization format version: {0}'
+                             .format(version))
+        try:
+            value = self._load()
+        except IndexError:
+            raise ValueError('Unexpected end of serialized data')
+        # the value ends with the payload of the record before the last
+        if self._position < len(self._buffer) or self._records.next():
+            raise ValueError('Unexpected data after the serialized value')
+        return value
+
+    def _load(self):
+        # decodes iteratively, stack holds the containers being loaded as
+        # [tag, container, remaining items, key or _NO_KEY]
+        strings = []
+        stack = []
+        buf = self._buffer
+        pos = self._position
+        end = len(buf)
+        while True:
+            if end - pos < _HEADER_SIZE:
+                self._buffer, self._position = buf, pos
+                self._fill(_HEADER_SIZE)
+                buf, pos = self._buffer, 0
+                end = len(buf)
+            tag = buf[pos]
+            pos += 1
+            if tag == _STRING_REF or tag == _BYTES or tag == _UNICODE or \
+                    tag == _DICT or tag == _LIST or tag == _INT or \
+                    tag == _TUPLE or tag == _PLAN or tag == _VERSION:
+                number = ord(buf[pos])
+                pos += 1
+                if number >= 0x80:
+                    number &= 0x7f
+                    shift = 7
+                    while True:
+                        byte = ord(buf[pos])
+                        pos += 1
+                        number |= (byte & 0x7f) << shift
+                        if byte < 0x80:
+                            break
+                        shift += 7
+            if tag == _STRING_REF:
+                value = strings[number]
+            elif tag == _BYTES or tag == _UNICODE:
+                if end - pos < number:
+                    self._buffer, self._position = buf, pos
+                    self._fill(number)
+                    buf, pos = self._buffer, 0
+                    end = len(buf)
+                    if end < number:
+                        raise IndexError()
+                value = buf[pos:pos + number]
+                pos += number
+                if tag == _UNICODE:
+                    value = value.decode('utf-8')
+                strings.append(value)
+            elif tag == _DICT or tag == _PLAN or tag == _VERSION:
+                if number:
+                    stack.append([tag, {}, number, _NO_KEY])
+                    continue
+                value = _new_dict(tag, {})
+            elif tag == _LIST or tag == _TUPLE:
+                if number:
+                    stack.append([tag, [], number, None])
+                    continue
+                value = [] if tag == _LIST else ()
+            elif tag == _INT:
+                value = -((number + 1) >> 1) if number & 1 else number >> 1
+            elif tag == _NONE:
+                value = None
+            elif tag == _TRUE:
+                value = True
+            elif tag == _FALSE:
+                value = False
+            elif tag == _FLOAT:
+                if end - pos < _DOUBLE.size:
+                    raise IndexError()
+                value = _DOUBLE.unpack(buf[pos:pos + _DOUBLE.size])[0]
+                pos += _DOUBLE.size
+            else:
+                raise ValueError('Unknown serialized value tag: {0!r}'
+                                 .format(tag))
+
+            # adds the value to the containers being loaded, completing
+            # the containers holding all their items
+            while stack:
+                frame = stack[-1]
+                container = frame[1]
+                if frame[0] == _LIST or frame[0] == _TUPLE:
+                    container.append(value)
+                elif frame[3] is _NO_KEY:
+                    frame[3] = value
+                    break
+                else:
+                    container[frame[3]] = value
+                    frame[3] = _NO_KEY
+                frame[2] -= 1
+                if frame[2]:
+                    break
+                stack.pop()
+                if frame[0] == _LIST:
+                    value = container
+                elif frame[0] == _TUPLE:
+                    value = tuple(container)
+                else:
+                    value = _new_dict(frame[0], container)
+            else:
+                self._buffer, self._position = buf, pos
+                return value
+
+
+# marks a dict being loaded which waits for the key of its next item
+_NO_KEY = object()
+
+
+def _new_dict(tag, value):
+    if tag == _PLAN:
+        return models.Plan(value)
+    if tag == _VERSION:
+        return models.Version(value)
+    return value
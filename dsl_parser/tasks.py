@@ -14,21 +14,45 @@
 #    * limitations under the License.
 
 import copy
+import importlib
 import json
+import sys
 
 from dsl_parser import (functions,
+                        concurrency,
                         exceptions,
                         scan,
                         models,
-                        parser,
                         multi_instance)
 from dsl_parser.multi_instance import modify_deployment
 
 
 __all__ = [
-    'modify_deployment'
+    'modify_deployment',
+    'compile_deployment_template'
 ]
 
+# maximum number of secrets validated concurrently
+SECRETS_VALIDATION_WORKERS = 10
+
+
+class _LazyModule(object):
+    """A module imported on the first access to one of its attributes."""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, name):
+        return getattr(importlib.import_module(self._name), name)
+
+    def __repr__(self):
+        return '<lazy module {0!r}>'.format(self._name)
+
+
+# the parser (YAML, the import resolvers HTTP stack and the elements) is
+# only imported when parsing, deployment plan callers don't need it
+parser = _LazyModule('dsl_parser.parser')
+
 
 def parse_dsl(dsl_location,
               resources_base_path,
@@ -83,28 +107,36 @@ def _process_functions(plan):
     handler = functions.plan_evaluation_handler(plan)
     scan.scan_service_template(
         plan, handler, replace=True, search_secrets=True)
+    handler.memo.report()
 
 
-def _validate_secrets(plan, get_secret_method):
+def _validate_secrets(plan, get_secret_method, get_secrets_bulk_method=None,
+                      max_workers=SECRETS_VALIDATION_WORKERS):
     if 'secrets' not in plan:
         return
 
     # Mainly for local workflow that doesn't support secrets
-    if get_secret_method is None:
+    if get_secret_method is None and get_secrets_bulk_method is None:
         raise exceptions.UnsupportedGetSecretError(
             "The get_secret intrinsic function is not supported"
         )
 
-    invalid_secrets = []
-    for secret_key in plan['secrets']:
-        try:
-            get_secret_method(secret_key)
-        except Exception as exception:
+    secret_keys = plan.pop('secrets')
+    if get_secrets_bulk_method is not None:
+        found = get_secrets_bulk_method(secret_keys)
+        invalid_secrets = [secret_key for secret_key in secret_keys
+                           if not found.get(secret_key)]
+    else:
+        invalid_secrets = []
+        for secret_key, exc_info in _get_secrets(
+                secret_keys, get_secret_method, max_workers):
+            if exc_info is None:
+                continue
+            exception = exc_info[1]
             if hasattr(exception, 'http_code') and exception.http_code == 404:
                 invalid_secrets.append(secret_key)
             else:
-                raise
-    plan.pop('secrets')
+                raise exc_info[0], exc_info[1], exc_info[2]
 
     if invalid_secrets:
         raise exceptions.UnknownSecretError(
@@ -113,13 +145,216 @@ def _validate_secrets(plan, get_secret_method):
         )
 
 
+def _get_secrets(secret_keys, get_secret_method, max_workers):
+    """Get the secrets using up to max_workers threads, returning
+    (key, exc_info) pairs in order.
+
+    exc_info is None for secrets retrieved successfully.
+    """
+    def get_secret(secret_key):
+        try:
+            get_secret_method(secret_key)
+        except Exception:
+            return secret_key, sys.exc_info()
+        return secret_key, None
+
+    return concurrency.concurrent_map(get_secret, secret_keys, max_workers)
+
+
 def prepare_deployment_plan(
-        plan, get_secret_method=None, inputs=None, **kwargs):
+        plan, get_secret_method=None, inputs=None,
+        get_secrets_bulk_method=None,
+        max_workers=SECRETS_VALIDATION_WORKERS, **kwargs):
     """
     Prepare a plan for deployment
+
+    Secrets are validated with get_secrets_bulk_method when given, a method
+    getting a list of secret keys and returning a dict mapping each key to
+    whether the secret exists. Otherwise get_secret_method is called for
+    every secret key, from up to max_workers threads. Pass max_workers=1
+    to call get_secret_method serially from the calling thread, e.g. when
+    it relies on thread local state such as a request or a DB session.
     """
     plan = models.Plan(copy.deepcopy(plan))
     _set_plan_inputs(plan, inputs)
     _process_functions(plan)
-    _validate_secrets(plan, get_secret_method)
-    return multi_instance.create_deployment_plan(plan)
+    _validate_secrets(plan, get_secret_method, get_secrets_bulk_method,
+                      max_workers)
+    return multi_instance.create_deployment_plan(plan, copy_plan=False)
+
+
+def compile_deployment_template(plan):
+    """
+    Compile a plan into a template for preparing many deployment plans
+    """
+    return DeploymentTemplate(plan)
+
+
+class DeploymentTemplate(object):
+    """A plan compiled for preparing many deployment plans.
+
+    Compiling records every place in the plan holding an intrinsic function
+    (e.g. get_input, get_secret or get_property), the rest of the plan does
+    not depend on the deployment inputs. Preparing a deployment plan
+    evaluates only the functions found at these places instead of scanning
+    the whole plan. The template is still copied once for every deployment
+    plan (as prepare_deployment_plan copies the plan), so deployment plans
+    never share values with the template or with each other.
+
+    The result is the same as calling prepare_deployment_plan with the plan.
+    """
+
+    def __init__(self, plan):
+        self._plan = models.Plan(copy.deepcopy(plan))
+        slots = []
+        # secrets collected from values that are not functions
+        self._secrets = set()
+
+        def handler(v, scope, context, path):
+            if isinstance(functions.parse(v), functions.Function):
+                slot = _FunctionSlot(copy.deepcopy(v), scope, context, path)
+                slots.append(slot)
+                return slot
+            if isinstance(v, dict) and 'get_secret' in v:
+                self._secrets.add(v['get_secret'])
+            return v
+        scan.scan_service_template(self._plan, handler, replace=True)
+
+        # containers of the compiled plan -> their location in it
+        locations = {}
+        # ids of the containers holding function slots
+        self._dynamic = set()
+        found = set()
+
+        def walk(value, location):
+            if isinstance(value, _FunctionSlot):
+                found.add(value)
+                value.location = location
+                return True
+            if isinstance(value, dict):
+                items = value.iteritems()
+            elif isinstance(value, list):
+                items = enumerate(value)
+            else:
+                return False
+            if id(value) in locations:
+                # the plan shares containers between several places (e.g.
+                # an operation is both in operations and in interfaces)
+                return id(value) in self._dynamic
+            locations[id(value)] = location
+            dynamic = False
+            for key, item in items:
+                dynamic = walk(item, location + (key,)) or dynamic
+            if dynamic:
+                self._dynamic.add(id(value))
+            return dynamic
+        walk(self._plan, ())
+
+        # nested slots replaced within the arguments of other functions
+        # are not part of the compiled plan, they are evaluated as part of
+        # their enclosing function.
+        self._slots = [slot for slot in slots if slot in found]
+        for slot in self._slots:
+            slot.context = _context_spec(slot.context, locations)
+
+    @property
+    def function_paths(self):
+        """Paths of the input dependent values of the plan"""
+        return [slot.path for slot in self._slots]
+
+    def prepare_deployment_plan(self, get_secret_method=None, inputs=None,
+                                get_secrets_bulk_method=None,
+                                max_workers=SECRETS_VALIDATION_WORKERS,
+                                **kwargs):
+        """
+        Prepare a plan for deployment
+        """
+        plan = models.Plan(self._copy(self._plan, {}))
+        _set_plan_inputs(plan, inputs)
+        self._process_functions(plan)
+        _validate_secrets(plan, get_secret_method, get_secrets_bulk_method,
+                          max_workers)
+        return multi_instance.create_deployment_plan(plan, copy_plan=False)
+
+    def _copy(self, value, memo):
+        # copies the plan, replacing the function slots with their raw
+        # values. containers shared by several places of the plan are
+        # copied once (memo is shared with copy.deepcopy).
+        if isinstance(value, _FunctionSlot):
+            return copy.deepcopy(value.raw)
+        if id(value) not in self._dynamic:
+            return copy.deepcopy(value, memo)
+        result = memo.get(id(value))
+        if result is not None:
+            return result
+        if isinstance(value, dict):
+            result = memo[id(value)] = copy.copy(value)
+            for key, item in value.iteritems():
+                result[key] = self._copy(item, memo)
+        else:
+            result = memo[id(value)] = list(value)
+            for index, item in enumerate(value):
+                result[index] = self._copy(item, memo)
+        return result
+
+    def _process_functions(self, plan):
+        # the equivalent of tasks._process_functions, scanning only the
+        # values holding functions, in the order they are scanned by it
+        handler = functions.plan_evaluation_handler(plan)
+        secrets = set(self._secrets)
+        for slot in self._slots:
+            container = _resolve(plan, slot.location[:-1])
+            key = slot.location[-1]
+            value = container[key]
+            context = _resolve_context(plan, slot.context)
+            result = handler(value, slot.scope, context, slot.path)
+            scan.collect_secret(result, secrets)
+            if result != value:
+                container[key] = result
+            scan.scan_properties(value, handler,
+                                 scope=slot.scope,
+                                 context=context,
+                                 path=slot.path,
+                                 replace=True,
+                                 secrets=secrets)
+        if secrets:
+            plan['secrets'] = list(secrets)
+        handler.memo.report()
+
+
+class _FunctionSlot(object):
+
+    def __init__(self, raw, scope, context, path):
+        self.raw = raw
+        self.scope = scope
+        self.context = context
+        self.path = path
+        self.location = None
+
+
+def _context_spec(context, locations):
+    # scan contexts are containers of the plan or dicts built around them
+    # (e.g. an operation context is a copy of its node template holding
+    # the operation as well)
+    if id(context) in locations:
+        return 'location', locations[id(context)]
+    if isinstance(context, dict):
+        return 'dict', [(key, _context_spec(value, locations))
+                        for key, value in context.iteritems()]
+    return 'value', context
+
+
+def _resolve_context(plan, spec):
+    kind, value = spec
+    if kind == 'location':
+        return _resolve(plan, value)
+    if kind == 'dict':
+        return dict((key, _resolve_context(plan, item_spec))
+                    for key, item_spec in value)
+    return value
+
+
+def _resolve(value, location):
+    for key in location:
+        value = value[key]
+    return value
@@ -19,6 +19,7 @@ import networkx as nx
 import yaml
 
 from dsl_parser import constants
+from dsl_parser import multi_instance
 from dsl_parser import rel_graph
 from dsl_parser.tests import scaling
 
@@ -2437,6 +2438,58 @@ class TestMultiInstanceGroups(scaling.BaseTestMultiInstance):
                 }
             })
 
+    def test_context_group_ancestry(self):
+        plan = self._parse_multi(
+            groups={
+                'group1': {'members': ['group2', 'host2']},
+                'group2': {'members': ['host1']},
+                'group3': {'members': ['db', 'db_c']}
+            },
+            nodes={
+                'host1': {'type': 'Compute', 'instances': 2},
+                'host2': {'type': 'Compute'},
+                'db': {'type': 'Root', 'contained_in': 'host1'},
+                'db_c': {'type': 'Root',
+                         'contained_in': 'host1',
+                         'connected_to': ['db']},
+            })
+        plan_node_graph = rel_graph.build_node_graph(
+            nodes=plan['nodes'],
+            scaling_groups=plan['scaling_groups'])
+        # group3 is the top level group db is contained in host1 through
+        self.assertEqual(
+            'host1', plan_node_graph['group3']['host1']['relationship'][
+                'target_id'])
+        _, ctx = rel_graph.build_deployment_node_graph(plan_node_graph)
+
+        self.assertEqual('group3', ctx.minimal_containing_group('db', 'db_c'))
+        self.assertEqual('group2', ctx.minimal_containing_group('db',
+                                                                'host1'))
+        self.assertEqual('group1', ctx.minimal_containing_group('db_c',
+                                                                'host2'))
+        self.assertIsNone(ctx.minimal_containing_group('group1', 'host2'))
+
+        contained_graph = ctx.deployment_contained_graph
+        for instance_id, data in contained_graph.nodes_iter(data=True):
+            if data['node']['name'] != 'db':
+                continue
+            groups, host = ctx.containing_group_instances(
+                instance_id=instance_id,
+                contained_graph=contained_graph)
+            self.assertEqual(['group3'], [g['name'] for g in groups])
+            self.assertEqual('host1', host['name'])
+            self.assertEqual(groups[0]['id'],
+                             ctx.containing_group_id(instance_id, 'group3'))
+            self.assertEqual(
+                contained_graph.successors(host['id']),
+                [ctx.containing_group_id(instance_id, 'group2')])
+            self.assertIsNone(ctx.containing_group_id(host['id'], 'group3'))
+            # lookups return copies of the cached entries
+            groups[0]['id'] = None
+            self.assertIsNotNone(ctx.containing_group_instances(
+                instance_id=instance_id,
+                contained_graph=contained_graph)[0][0]['id'])
+
     def _test(
             self,
             groups,
@@ -2566,6 +2619,8 @@ class TestMultiInstanceGroups(scaling.BaseTestMultiInstance):
             expected_relationships=expected_relationships,
             group_components=group_components)
 
+        self._assert_estimate(plan)
+
         # Used by modification tests as the result of the base tests
         # (``self._test_modify``)
         return {'plan': plan, 'initial_group_components': group_components}
@@ -2718,6 +2773,20 @@ class TestMultiInstanceGroups(scaling.BaseTestMultiInstance):
             expected_added_relationships=expected_added_relationships,
             expected_removed_relationships=expected_removed_relationships)
 
+    def _assert_estimate(self, plan):
+        """Assert the plan estimate matches the created plan exactly"""
+        estimate = multi_instance.estimate_deployment_plan(plan)
+        for node_id, node_estimate in estimate['nodes'].items():
+            node_instances = [i for i in plan['node_instances']
+                              if i['node_id'] == node_id]
+            self.assertEqual(len(node_instances),
+                             node_estimate['node_instances'])
+            self.assertEqual(sum(len(i['relationships'])
+                                 for i in node_instances),
+                             node_estimate['relationship_instances'])
+        self.assertEqual(len(plan['node_instances']),
+                         estimate['node_instances'])
+
     def _assert_instances_count(
             self,
             node_instances,
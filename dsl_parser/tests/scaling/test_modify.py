@@ -13,6 +13,10 @@
 #    * See the License for the specific language governing permissions and
 #    * limitations under the License.
 
+import copy
+
+from dsl_parser import (multi_instance,
+                        rel_graph)
 from dsl_parser.tests import scaling
 
 
@@ -734,3 +738,253 @@ class TestMultiInstanceModify(scaling.BaseTestMultiInstance):
               }}]
         modified_nodes = [with_rel]
         self.modify_multi(plan, modified_nodes=modified_nodes)
+
+    def _test_independent_trees_blueprint(self):
+        return self.BASE_BLUEPRINT + """
+    host:
+        type: cloudify.nodes.Compute
+        capabilities:
+            scalable:
+                properties:
+                    default_instances: 2
+    db:
+        type: db
+        relationships:
+            -   type: cloudify.relationships.contained_in
+                target: host
+    webserver_host:
+        type: cloudify.nodes.Compute
+    webserver:
+        type: webserver
+        relationships:
+            -   type: cloudify.relationships.contained_in
+                target: webserver_host
+            -   type: cloudify.relationships.connected_to
+                target: db
+    unrelated_host:
+        type: cloudify.nodes.Compute
+        capabilities:
+            scalable:
+                properties:
+                    default_instances: 3
+    unrelated:
+        type: type
+        relationships:
+            -   type: cloudify.relationships.contained_in
+                target: unrelated_host
+            -   type: cloudify.relationships.connected_to
+                target: webserver
+    network:
+        type: network
+groups:
+    group1:
+        members: [network, unrelated_host]
+policies:
+    policy:
+        type: cloudify.policies.scaling
+        targets: [group1]
+"""
+
+    def test_modification_region(self):
+        plan = self.parse_multi(self._test_independent_trees_blueprint())
+        region = rel_graph.extract_modification_region(
+            nodes=plan['nodes'],
+            previous_nodes=plan['nodes'],
+            previous_node_instances=plan['node_instances'],
+            modified_nodes={'host': {'instances': 3}},
+            scaling_groups=plan['scaling_groups'])
+        self.assertEqual(set(['host', 'db', 'webserver_host', 'webserver']),
+                         set(n['id'] for n in region.nodes))
+        self.assertEqual(6, len(region.previous_node_instances))
+        self.assertEqual({}, region.scaling_groups)
+        webserver = [n for n in region.nodes if n['id'] == 'webserver'][0]
+        self.assertEqual(['webserver_host', 'db'],
+                         [r['target_id'] for r in webserver['relationships']])
+
+        region = rel_graph.extract_modification_region(
+            nodes=plan['nodes'],
+            previous_nodes=plan['nodes'],
+            previous_node_instances=plan['node_instances'],
+            modified_nodes={'group1': {'instances': 2}},
+            scaling_groups=plan['scaling_groups'])
+        self.assertEqual(
+            set(['network', 'unrelated_host', 'unrelated', 'webserver_host',
+                 'webserver']),
+            set(n['id'] for n in region.nodes))
+        self.assertEqual(['group1'], region.scaling_groups.keys())
+        webserver = [n for n in region.nodes if n['id'] == 'webserver'][0]
+        self.assertEqual(['webserver_host'],
+                         [r['target_id'] for r in webserver['relationships']])
+
+    def test_modification_region_not_restricted(self):
+        plan = self.parse_multi(self._test_independent_trees_blueprint())
+
+        def region(modified_nodes, nodes=plan['nodes']):
+            return rel_graph.extract_modification_region(
+                nodes=nodes,
+                previous_nodes=plan['nodes'],
+                previous_node_instances=plan['node_instances'],
+                modified_nodes=modified_nodes,
+                scaling_groups=plan['scaling_groups'])
+
+        # the modified tree is related to all other trees
+        self.assertIsNone(region({'webserver': {'instances': 2}}))
+        # deployment update
+        self.assertIsNone(region(plan['nodes']))
+        self.assertIsNone(region({'missing': {'instances': 2}}))
+        self.assertIsNone(region({'host': {'instances': 3}},
+                                 nodes=plan['nodes'][1:]))
+
+    def test_modification_region_changed_nodes(self):
+        plan = self.parse_multi(self._test_independent_trees_blueprint())
+        nodes = copy.deepcopy(plan['nodes'])
+        unrelated_host = [n for n in nodes if n['id'] == 'unrelated_host'][0]
+        unrelated_host['capabilities']['scalable']['properties'][
+            'current_instances'] = 4
+        region = rel_graph.extract_modification_region(
+            nodes=nodes,
+            previous_nodes=plan['nodes'],
+            previous_node_instances=plan['node_instances'],
+            modified_nodes={'host': {'instances': 3}},
+            scaling_groups=plan['scaling_groups'])
+        self.assertIsNone(region)
+
+    def test_restricted_modification_matches_entire_deployment(self):
+        plan = self.parse_multi(self._test_independent_trees_blueprint())
+        previous_ids = set(i['id'] for i in plan['node_instances'])
+        # the removed host is chosen explicitly, the instances removed
+        # otherwise depend on the order of the previous node instances
+        removed_host_id = sorted(i['id'] for i in plan['node_instances']
+                                 if i['node_id'] == 'host')[0]
+
+        def canonical(modification):
+            result = {}
+            for key, instances in modification.items():
+                result[key] = sorted(
+                    (i['name'],
+                     i['id'] if i['id'] in previous_ids else None,
+                     i.get('modification'),
+                     sorted((r['target_name'],
+                             r['target_id'] if r['target_id'] in
+                             previous_ids else None)
+                            for r in i['relationships']))
+                    for i in instances)
+            return result
+
+        for modified_nodes in [{'host': {'instances': 3}},
+                               {'host': {'instances': 1,
+                                         'removed_ids_include_hint': [
+                                             removed_host_id]}},
+                               {'db': {'instances': 2}},
+                               {'unrelated': {'instances': 2}},
+                               {'group1': {'instances': 2}}]:
+            entire_deployment = multi_instance._modify_deployment(
+                nodes=copy.deepcopy(plan['nodes']),
+                previous_nodes=copy.deepcopy(plan['nodes']),
+                previous_node_instances=copy.deepcopy(plan['node_instances']),
+                modified_nodes=modified_nodes,
+                scaling_groups=copy.deepcopy(plan['scaling_groups']))
+            restricted = self.modify_multi(copy.deepcopy(plan),
+                                           modified_nodes=modified_nodes)
+            self.assertEqual(canonical(entire_deployment),
+                             canonical(restricted))
+            for instance in restricted['added_and_related']:
+                if instance.get('modification') == 'added':
+                    self.assertNotIn(instance['id'], previous_ids)
+
+    def _deployment_node_graphs_diff(self, plan, modified_nodes,
+                                     processes=None):
+        plan_node_graph = rel_graph.build_node_graph(
+            nodes=plan['nodes'],
+            scaling_groups=plan['scaling_groups'])
+        previous_graph, previous_contained_graph = \
+            rel_graph.build_previous_deployment_node_graph(
+                plan_node_graph=plan_node_graph,
+                previous_node_instances=plan['node_instances'])
+        new_graph, ctx = rel_graph.build_deployment_node_graph(
+            plan_node_graph=plan_node_graph,
+            previous_deployment_node_graph=previous_graph,
+            previous_deployment_contained_graph=previous_contained_graph,
+            modified_nodes=modified_nodes,
+            processes=processes)
+        diff = rel_graph.DeploymentNodeGraphsDiff(previous_graph,
+                                                  new_graph,
+                                                  ctx=ctx)
+        return diff, previous_graph, new_graph
+
+    def test_deployment_node_graphs_diff(self):
+        plan = self.parse_multi(self._test_independent_trees_blueprint())
+        instance_ids = dict((i['id'], i['node_id'])
+                            for i in plan['node_instances'])
+        diff, previous_graph, new_graph = self._deployment_node_graphs_diff(
+            plan, modified_nodes={'db': {'instances': 3}})
+        # db is scaled out under each of the two host instances
+        self.assertEqual(4, len(diff.added_ids))
+        self.assertEqual(set(), diff.removed_ids)
+        self.assertEqual(set(), diff.removed_relationships)
+        self.assertEqual(diff.added_ids,
+                         set(target for _, target in diff.added_relationships))
+        self.assertEqual(set(['webserver']),
+                         set(instance_ids[source]
+                             for source, _ in diff.added_relationships))
+
+        modification = diff.modification()
+        self.assertEqual([], modification['reduced_and_related'])
+        self.assertEqual([], modification['removed_and_related'])
+        extended = [i for i in modification['extended_and_related']
+                    if i.get('modification') == 'extended']
+        self.assertEqual(1, len(extended))
+        self.assertEqual('webserver', extended[0]['name'])
+        self.assertEqual(
+            diff.added_ids,
+            set(r['target_id'] for r in extended[0]['relationships']
+                if r['target_name'] == 'db') & diff.added_ids)
+        # extraction works on copies, the graphs are left untouched
+        for graph in [previous_graph, new_graph]:
+            for _, data in graph.nodes_iter(data=True):
+                self.assertNotIn('modification', data['node'])
+
+    def test_deployment_node_graphs_diff_excludes_added_and_removed(self):
+        plan = self.parse_multi(self._test_independent_trees_blueprint())
+        for modified_nodes in [{'host': {'instances': 3}},
+                               {'host': {'instances': 1}}]:
+            diff, _, _ = self._deployment_node_graphs_diff(
+                copy.deepcopy(plan), modified_nodes=modified_nodes)
+            modification = diff.modification()
+            changed_ids = diff.added_ids | diff.removed_ids
+            self.assertTrue(changed_ids)
+            for key in ['extended_and_related', 'reduced_and_related']:
+                self.assertFalse(
+                    changed_ids & set(i['id'] for i in modification[key]))
+            unfiltered = (diff.added_relationships_node_instances() +
+                          diff.removed_relationships_node_instances())
+            self.assertTrue(
+                changed_ids & set(i['id'] for i in unfiltered))
+
+    def test_parallel_contained_trees_modification(self):
+        plan = self.parse_multi(self._test_independent_trees_blueprint())
+        names = dict((i['id'], i['name']) for i in plan['node_instances'])
+
+        def canonical(instances):
+            return sorted(
+                (i['name'],
+                 i['modification'],
+                 i['id'] in names,
+                 sorted(r['target_name'] for r in i['relationships']))
+                for i in instances if 'modification' in i)
+
+        for modified_nodes in [{'host': {'instances': 3}},
+                               {'db': {'instances': 2},
+                                'group1': {'instances': 2}}]:
+            sequential, _, _ = self._deployment_node_graphs_diff(
+                copy.deepcopy(plan), modified_nodes=modified_nodes)
+            parallel, _, new_graph = self._deployment_node_graphs_diff(
+                copy.deepcopy(plan), modified_nodes=modified_nodes,
+                processes=2)
+            self.assertTrue(set(names) - parallel.removed_ids <=
+                            set(new_graph))
+            sequential = sequential.modification()
+            parallel = parallel.modification()
+            for key in sequential:
+                self.assertEqual(canonical(sequential[key]),
+                                 canonical(parallel[key]))
@@ -13,12 +13,16 @@
 #    * See the License for the specific language governing permissions and
 #    * limitations under the License.
 
+import copy
 import itertools
 import random
 
 from mock import patch
 
 from dsl_parser import exceptions
+from dsl_parser.multi_instance import (create_deployment_plan,
+                                       estimate_deployment_plan,
+                                       filter_out_node_instances)
 from dsl_parser.tests import scaling
 
 
@@ -549,3 +553,172 @@ policies:
 """
         self.assertRaises(exceptions.UnsupportedAllToOneInGroup,
                           self.parse_multi, blueprint)
+
+    def test_parallel_contained_trees(self):
+        blueprint = self.BASE_BLUEPRINT + """
+    host1:
+        type: cloudify.nodes.Compute
+        capabilities:
+            scalable:
+                properties:
+                    default_instances: 3
+    db:
+        type: db
+        capabilities:
+            scalable:
+                properties:
+                    default_instances: 2
+        relationships:
+            -   type: cloudify.relationships.contained_in
+                target: host1
+    host2:
+        type: cloudify.nodes.Compute
+    webserver:
+        type: webserver
+        relationships:
+            -   type: cloudify.relationships.contained_in
+                target: host2
+            -   type: cloudify.relationships.connected_to
+                target: db
+    host3:
+        type: cloudify.nodes.Compute
+    network:
+        type: network
+groups:
+    group:
+        members: [host3, network]
+policies:
+    policy:
+        type: cloudify.policies.scaling
+        properties:
+            default_instances: 4
+        targets: [group]
+"""
+        plan = self.parse_1_3(blueprint)
+
+        def canonical(deployment_plan):
+            instances = deployment_plan['node_instances']
+            names = dict((i['id'], i['name']) for i in instances)
+            self.assertEqual(len(instances), len(names))
+            return sorted(
+                (i['name'],
+                 names[i['host_id']] if 'host_id' in i else None,
+                 sorted(names[r['target_id']] for r in i['relationships']),
+                 sorted(g['name'] for g in i.get('scaling_groups', [])))
+                for i in instances)
+
+        sequential = create_deployment_plan(plan)
+        parallel = create_deployment_plan(plan, processes=2)
+        self.assertEqual(19, len(parallel['node_instances']))
+        self.assertEqual(canonical(sequential), canonical(parallel))
+
+        nodes = copy.deepcopy(plan['nodes'])
+        in_place = create_deployment_plan(plan, copy_plan=False)
+        self.assertIs(plan['nodes'], in_place['nodes'])
+        self.assertEqual(nodes, in_place['nodes'])
+        self.assertEqual(canonical(sequential), canonical(in_place))
+
+    def test_estimate_deployment_plan(self):
+        blueprint = self.BASE_BLUEPRINT + """
+    host:
+        type: cloudify.nodes.Compute
+        capabilities:
+            scalable:
+                properties:
+                    default_instances: 3
+    db:
+        type: db
+        capabilities:
+            scalable:
+                properties:
+                    default_instances: 2
+        relationships:
+            -   type: cloudify.relationships.contained_in
+                target: host
+    webserver:
+        type: webserver
+        capabilities:
+            scalable:
+                properties:
+                    default_instances: 2
+        relationships:
+            -   type: cloudify.relationships.connected_to
+                target: db
+            -   type: cloudify.relationships.depends_on
+                target: network
+                properties:
+                    connection_type: all_to_one
+    network:
+        type: network
+        capabilities:
+            scalable:
+                properties:
+                    default_instances: 2
+    db_dependent:
+        type: db_dependent
+        capabilities:
+            scalable:
+                properties:
+                    default_instances: 0
+        relationships:
+            -   type: cloudify.relationships.connected_to
+                target: db
+groups:
+    group:
+        members: [host, network]
+policies:
+    policy:
+        type: cloudify.policies.scaling
+        properties:
+            default_instances: 2
+        targets: [group]
+"""
+        plan = self.parse_1_3(blueprint)
+        nodes = copy.deepcopy(plan['nodes'])
+        estimate = estimate_deployment_plan(plan)
+        self.assertEqual(nodes, plan['nodes'])
+        self.assertEqual({
+            'host': {'node_instances': 6, 'relationship_instances': 0},
+            'db': {'node_instances': 12, 'relationship_instances': 12},
+            'webserver': {'node_instances': 2, 'relationship_instances': 26},
+            'network': {'node_instances': 4, 'relationship_instances': 0},
+            'db_dependent': {'node_instances': 0,
+                             'relationship_instances': 0}
+        }, estimate['nodes'])
+        self.assertEqual(24, estimate['node_instances'])
+        self.assertEqual(38, estimate['relationship_instances'])
+
+        node_instances = create_deployment_plan(plan)['node_instances']
+        self.assertEqual(estimate['node_instances'], len(node_instances))
+        self.assertEqual(estimate['relationship_instances'],
+                         sum(len(i['relationships']) for i in node_instances))
+
+    def test_estimate_all_to_one_in_group(self):
+        blueprint = self.BASE_BLUEPRINT + """
+    node1:
+        type: type
+    node2:
+        type: type
+        relationships:
+        - target: node1
+          type: cloudify.relationships.connected_to
+          properties:
+            connection_type: all_to_one
+groups:
+    group:
+        members: [node1, node2]
+policies:
+    policy:
+        type: cloudify.policies.scaling
+        targets: [group]
+"""
+        self.assertRaises(exceptions.UnsupportedAllToOneInGroup,
+                          estimate_deployment_plan,
+                          self.parse_1_3(blueprint))
+
+    def test_filter_out_node_instances(self):
+        base = [{'id': 'a'}, {'id': 'b'}, {'id': 'c'}]
+        self.assertEqual(
+            [{'id': 'a'}, {'id': 'c'}],
+            filter_out_node_instances(
+                [{'id': 'b', 'modification': 'added'}, {'id': 'c'}], base))
@@ -347,6 +347,22 @@ class TestRemovedContainedInMember(AbstractTestParser):
         }
         self.assert_removal(groups, nodes, expected)
 
+    def test_removed_contained_in_member9(self):
+        groups = {
+            'group': ['node1', 'node2', 'node3', 'node4', 'node5']
+        }
+        nodes = {
+            'node1': None,
+            'node2': 'node1',
+            'node3': None,
+            'node4': 'node3',
+            'node5': 'node4'
+        }
+        expected = {
+            'group': ['node1', 'node3']
+        }
+        self.assert_removal(groups, nodes, expected)
+
     def assert_removal(self, groups, nodes, expected):
         blueprint = base_blueprint(groups=groups, nodes=nodes)
         plan = self.parse(blueprint)
@@ -0,0 +1,58 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import threading
+import time
+
+import testtools
+
+from dsl_parser.concurrency import concurrent_map
+
+
+class TestConcurrentMap(testtools.TestCase):
+
+    def test_results_in_order(self):
+        self.assertEqual([], concurrent_map(str, [], 4))
+        for max_workers in [None, 1, 4, 100]:
+            self.assertEqual([i * 2 for i in range(20)],
+                             concurrent_map(lambda i: i * 2, range(20),
+                                            max_workers))
+
+    def test_concurrent_calls(self):
+        threads = set()
+
+        def func(item):
+            threads.add(threading.current_thread())
+            time.sleep(0.01)
+            return item
+
+        concurrent_map(func, range(8), 4)
+        self.assertGreater(len(threads), 1)
+        self.assertLessEqual(len(threads), 4)
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_first_exception_raised(self):
+        called = []
+
+        def func(item):
+            called.append(item)
+            if item in (3, 5):
+                raise ValueError(item)
+            return item
+
+        error = self.assertRaises(ValueError, concurrent_map, func,
+                                  range(8), 4)
+        self.assertEqual(3, error.args[0])
+        self.assertEqual(range(8), sorted(called))
@@ -13,8 +13,11 @@
 #    * See the License for the specific language governing permissions and
 #    * limitations under the License.
 
+import copy
+
 from dsl_parser.tests.abstract_test_parser import AbstractTestParser
 from dsl_parser import exceptions
+from dsl_parser import utils
 from dsl_parser.exceptions import DSLParsingLogicException
 
 
@@ -705,3 +708,85 @@ node_templates:
         properties = self.parse_1_2(yaml)['nodes'][0]['properties']
         self.assertEqual(properties['prop1']['prop1'], 'value1')
         self.assertEqual(properties['prop2']['prop2'], 'value2')
+
+    def test_compiled_data_types_shared_defaults(self):
+        yaml = """
+data_types:
+    inner:
+        properties:
+            values:
+                default: [1, 2]
+    outer:
+        properties:
+            inner:
+                type: inner
+                default: {}
+            extra:
+                default:
+                    key: value
+node_types:
+    type:
+        properties:
+            prop1:
+                type: outer
+            prop2:
+                type: outer
+node_templates:
+    node1:
+        type: type
+        properties:
+            prop1:
+                inner:
+                    values: [3]
+    node2:
+        type: type
+"""
+        nodes = dict((node['id'], node['properties'])
+                     for node in self.parse_1_2(yaml)['nodes'])
+        self.assertEqual([3], nodes['node1']['prop1']['inner']['values'])
+        self.assertEqual([1, 2], nodes['node1']['prop2']['inner']['values'])
+        self.assertEqual([1, 2], nodes['node2']['prop1']['inner']['values'])
+        self.assertEqual({'key': 'value'}, nodes['node2']['prop2']['extra'])
+
+    def test_compiled_data_types(self):
+        data_types = utils.CompiledDataTypes({
+            'pair': {
+                'properties': {
+                    'first': {'type': 'integer'},
+                    'second': {'type': 'integer', 'default': 2},
+                    'third': {'required': False, 'default': [3]}
+                }
+            }
+        })
+        self.assertIs(data_types, copy.deepcopy(data_types))
+        schema = data_types.schema('pair')
+        self.assertIs(schema, data_types.schema('pair'))
+        self.assertEqual({'second': 2, 'third': [3]}, schema.defaults)
+
+        def parse(value):
+            return utils.parse_value(
+                value=value,
+                type_name='pair',
+                data_types=data_types,
+                undefined_property_error_message='{0} {1}',
+                missing_property_error_message='{0} {1}',
+                node_name='node',
+                path=['prop'])
+        parsed = parse({'first': 1})
+        self.assertEqual({'first': 1, 'second': 2, 'third': [3]}, parsed)
+        self.assertIsNot(schema.defaults['third'], parsed['third'])
+        self.assertEqual({'first': 1, 'second': 3, 'third': [3]},
+                         parse({'first': 1, 'second': 3}))
+        ex = self.assertRaises(DSLParsingLogicException, parse,
+                               {'second': 3})
+        self.assertEqual(107, ex.err_code)
+        self.assertEqual('first', ex.property)
+        self.assertEqual('node prop.first', ex.message)
+        ex = self.assertRaises(DSLParsingLogicException, parse,
+                               {'first': 1, 'fourth': 4})
+        self.assertEqual(106, ex.err_code)
+        self.assertEqual('node prop.fourth', ex.message)
+        ex = self.assertRaises(DSLParsingLogicException, parse,
+                               {'first': 'one'})
+        self.assertEqual(exceptions.ERROR_VALUE_DOES_NOT_MATCH_TYPE,
+                         ex.err_code)
@@ -0,0 +1,189 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import copy
+import threading
+
+from mock import MagicMock
+
+from dsl_parser import exceptions
+from dsl_parser.tasks import (prepare_deployment_plan,
+                              compile_deployment_template)
+from dsl_parser.tests.abstract_test_parser import AbstractTestParser
+
+
+class TestDeploymentTemplate(AbstractTestParser):
+
+    yaml = AbstractTestParser.BASIC_PLUGIN + """
+inputs:
+    port:
+        default: 8080
+    name: {}
+node_types:
+    cloudify.nodes.Compute:
+        properties:
+            ip:
+                default: ''
+    webserver_type:
+        properties:
+            port: {}
+            name: {}
+            static: {}
+        interfaces:
+            test_interface:
+                start:
+                    implementation: test_plugin.start
+                    inputs:
+                        port:
+                            default: { get_property: [SELF, port] }
+                        static:
+                            default: value
+node_templates:
+    host:
+        type: cloudify.nodes.Compute
+        properties:
+            ip: { get_secret: ip }
+    webserver:
+        type: webserver_type
+        properties:
+            port: { get_input: port }
+            name: { concat: [{ get_input: name }, '-', { get_input: port }] }
+            static: [1, 2]
+        relationships:
+            - type: cloudify.relationships.contained_in
+              target: host
+              source_interfaces:
+                  test_interface:
+                      op:
+                          implementation: test_plugin.op
+                          inputs:
+                              ip: { get_property: [TARGET, ip] }
+relationships:
+    cloudify.relationships.contained_in: {}
+outputs:
+    endpoint:
+        value: { concat: [{ get_property: [webserver, name] }, ':'] }
+"""
+
+    def _strip(self, plan):
+        plan = copy.deepcopy(dict(plan))
+        for node_instance in plan.pop('node_instances'):
+            self.assertEqual(1, len(node_instance['relationships']) +
+                             (node_instance['node_id'] == 'host'))
+        return plan
+
+    def test_same_as_prepare_deployment_plan(self):
+        plan = self.parse_1_3(self.yaml)
+        template = compile_deployment_template(plan)
+        for inputs in [{'name': 'a'}, {'name': 'b', 'port': 9090}]:
+            get_secret = MagicMock(return_value='secret')
+            result = template.prepare_deployment_plan(
+                get_secret_method=get_secret, inputs=inputs)
+            expected = prepare_deployment_plan(
+                copy.deepcopy(plan), get_secret_method=get_secret,
+                inputs=inputs)
+            self.assertEqual(self._strip(expected), self._strip(result))
+            self.assertEqual(len(expected['node_instances']),
+                             len(result['node_instances']))
+
+    def test_deployments_are_independent(self):
+        template = compile_deployment_template(self.parse_1_3(self.yaml))
+        get_secret = MagicMock(return_value='secret')
+        first = template.prepare_deployment_plan(
+            get_secret_method=get_secret, inputs={'name': 'a'})
+        second = template.prepare_deployment_plan(
+            get_secret_method=get_secret, inputs={'name': 'b', 'port': 9090})
+        nodes = dict((node['id'], node) for node in first['nodes'])
+        self.assertEqual('a-8080', nodes['webserver']['properties']['name'])
+        self.assertEqual({'get_secret': 'ip'},
+                         nodes['host']['properties']['ip'])
+        operations = nodes['webserver']['operations']
+        self.assertIs(operations['start'],
+                      operations['test_interface.start'])
+        self.assertEqual({'port': 8080, 'static': 'value'},
+                         operations['start']['inputs'])
+        self.assertEqual('a-8080:', first['outputs']['endpoint']['value'])
+        nodes = dict((node['id'], node) for node in second['nodes'])
+        self.assertEqual('b-9090', nodes['webserver']['properties']['name'])
+        self.assertEqual(
+            9090, nodes['webserver']['operations']['start']['inputs']['port'])
+        self.assertEqual('b-9090:', second['outputs']['endpoint']['value'])
+        get_secret.assert_called_with('ip')
+        self.assertEqual(2, get_secret.call_count)
+
+    def test_template_is_not_modified(self):
+        template = compile_deployment_template(self.parse_1_3(self.yaml))
+        first = template.prepare_deployment_plan(
+            get_secret_method=MagicMock(), inputs={'name': 'a'})
+        nodes = dict((node['id'], node) for node in first['nodes'])
+        nodes['webserver']['properties']['static'].append(3)
+        self.assertRaises(exceptions.MissingRequiredInputError,
+                          template.prepare_deployment_plan,
+                          get_secret_method=MagicMock())
+        second = template.prepare_deployment_plan(
+            get_secret_method=MagicMock(), inputs={'name': 'a'})
+        nodes = dict((node['id'], node) for node in second['nodes'])
+        self.assertEqual([1, 2], nodes['webserver']['properties']['static'])
+        self.assertEqual('a-8080', nodes['webserver']['properties']['name'])
+
+    def test_function_paths(self):
+        template = compile_deployment_template(self.parse_1_3(self.yaml))
+        self.assertEqual(sorted([
+            'host.properties.ip',
+            'webserver.properties.port',
+            'webserver.properties.name',
+            'webserver.operations.start.inputs.port',
+            'webserver.cloudify.relationships.contained_in.'
+            'test_interface.op.inputs.ip',
+            'outputs.endpoint.value']),
+            sorted(template.function_paths))
+
+    def test_validate_secrets(self):
+        template = compile_deployment_template(self.parse_1_3(self.yaml))
+        not_found = Exception('not found')
+        not_found.http_code = 404
+        get_secret = MagicMock(side_effect=not_found)
+        self.assertRaises(exceptions.UnknownSecretError,
+                          template.prepare_deployment_plan,
+                          get_secret_method=get_secret,
+                          inputs={'name': 'a'})
+        self.assertRaises(exceptions.UnsupportedGetSecretError,
+                          template.prepare_deployment_plan,
+                          inputs={'name': 'a'})
+
+    def test_concurrent_templates_collect_their_own_secrets(self):
+        with_secrets = compile_deployment_template(self.parse_1_3(self.yaml))
+        without_secrets = compile_deployment_template(self.parse_1_3(
+            self.yaml.replace('{ get_secret: ip }', "''")))
+        errors = []
+
+        def render(template, get_secret_method):
+            try:
+                for _ in range(20):
+                    template.prepare_deployment_plan(
+                        get_secret_method=get_secret_method,
+                        inputs={'name': 'a'})
+            except Exception as e:
+                errors.append(e)
+
+        threads = [
+            threading.Thread(target=render, args=(
+                with_secrets, MagicMock(return_value='secret'))),
+            threading.Thread(target=render, args=(without_secrets, None))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
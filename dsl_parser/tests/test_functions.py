@@ -15,7 +15,7 @@
 
 from testtools import ExpectedException
 
-from dsl_parser import exceptions
+from dsl_parser import exceptions, instrumentation
 from dsl_parser.tasks import prepare_deployment_plan
 from dsl_parser.tests.abstract_test_parser import AbstractTestParser
 from dsl_parser.tests.abstract_test_parser import timeout
@@ -1233,3 +1233,117 @@ outputs:
                          ['one', 'value', {'get_attribute': ['node',
                                                              'attribute']}]},
                          outputs['output3']['value'])
+
+
+class TestEvaluationMemo(AbstractTestParser):
+
+    yaml = """
+plugins:
+    p:
+        executor: central_deployment_agent
+        install: false
+node_types:
+    type:
+        properties:
+            property: {}
+        interfaces:
+            interface:
+                op1:
+                    implementation: p.task
+                    inputs:
+                        self: { default: { get_property: [SELF, property] } }
+                        named: { default: { get_property: [node2, property] } }
+                        joined:
+                            default: { concat: [{ get_input: input }, '-',
+                                                { get_property: [SELF,
+                                                                 property] }] }
+                op2:
+                    implementation: p.task
+                    inputs:
+                        self: { default: { get_property: [SELF, property] } }
+                        named: { default: { get_property: [node2, property] } }
+                        secret: { default: { get_secret: secret } }
+inputs:
+    input: {}
+relationships:
+    cloudify.relationships.connected_to:
+        properties:
+            connection_type: { default: all_to_all }
+node_templates:
+    node1:
+        type: type
+        properties:
+            property: value1
+        relationships:
+            -   type: cloudify.relationships.connected_to
+                target: node2
+                source_interfaces:
+                    interface:
+                        op:
+                            implementation: p.task
+                            inputs:
+                                source: { get_property: [SOURCE, property] }
+                                target: { get_property: [TARGET, property] }
+            -   type: cloudify.relationships.connected_to
+                target: node3
+                source_interfaces:
+                    interface:
+                        op:
+                            implementation: p.task
+                            inputs:
+                                source: { get_property: [SOURCE, property] }
+                                target: { get_property: [TARGET, property] }
+    node2:
+        type: type
+        properties:
+            property: value2
+    node3:
+        type: type
+        properties:
+            property: { get_input: input }
+"""
+
+    def setUp(self):
+        super(TestEvaluationMemo, self).setUp()
+        self.reports = []
+        instrumentation.add_reporter(self._report)
+        self.addCleanup(instrumentation.remove_reporter, self._report)
+
+    def _report(self, name, counters):
+        self.reports.append((name, counters))
+
+    def test_memoized_evaluation(self):
+        parsed = prepare_deployment_plan(self.parse_1_1(self.yaml),
+                                         get_secret_method=lambda key: key,
+                                         inputs={'input': 'input'})
+        for name, value in [('node1', 'value1'), ('node2', 'value2'),
+                            ('node3', 'input')]:
+            operations = self.get_node_by_name(parsed, name)['operations']
+            self.assertEqual({'self': value,
+                              'named': 'value2',
+                              'joined': 'input-{0}'.format(value)},
+                             operations['op1']['inputs'])
+            self.assertFalse(operations['op1']['has_intrinsic_functions'])
+            self.assertEqual({'self': value,
+                              'named': 'value2',
+                              'secret': {'get_secret': 'secret'}},
+                             operations['op2']['inputs'])
+            self.assertTrue(operations['op2']['has_intrinsic_functions'])
+        relationships = self.get_node_by_name(parsed, 'node1')[
+            'relationships']
+        self.assertEqual(
+            [{'source': 'value1', 'target': 'value2'},
+             {'source': 'value1', 'target': 'input'}],
+            [relationship['source_operations']['interface.op']['inputs']
+             for relationship in relationships])
+
+        self.assertEqual(1, len(self.reports))
+        name, counters = self.reports[0]
+        self.assertEqual('functions.evaluate.memo', name)
+        self.assertGreater(counters['hits'], 0)
+        # get_secret evaluations mark their operation, so they aren't
+        # memoized
+        self.assertLess(counters['size'], counters['misses'])
+        self.assertEqual(
+            float(counters['hits']) / (counters['hits'] + counters['misses']),
+            counters['hit_rate'])
@@ -14,6 +14,7 @@
 #    * limitations under the License.
 
 import collections
+import threading
 
 import testtools.testcase
 
@@ -238,8 +239,32 @@ class TestEvaluateFunctions(AbstractTestParser):
             self._test_process_attribute_scaling_group_ambiguity_resolution(
                 context, index)
 
+    def test_process_attribute_scaling_group_ambiguity_resolution_concurrent(self):  # noqa
+        for index in [1, 2]:
+            for context in [{'self': 'node3_{0}'.format(index)},
+                            {'source': 'node3_{0}'.format(index),
+                             'target': 'stub'},
+                            {'target': 'node3_{0}'.format(index),
+                             'source': 'stub'}]:
+                fetching_threads = \
+                    self._test_process_attribute_scaling_group_ambiguity_resolution(  # noqa
+                        context, index, max_workers=4)
+                self.assertTrue(any(
+                    thread is not threading.current_thread()
+                    for thread in fetching_threads))
+
+    def test_process_attribute_scaling_group_ambiguity_resolution_index(self):  # noqa
+        for index in [1, 2]:
+            for context in [{'self': 'node3_{0}'.format(index)},
+                            {'source': 'node3_{0}'.format(index),
+                             'target': 'stub'},
+                            {'target': 'node3_{0}'.format(index),
+                             'source': 'stub'}]:
+                self._test_process_attribute_scaling_group_ambiguity_resolution(  # noqa
+                    context, index, use_index=True)
+
     def _test_process_attribute_scaling_group_ambiguity_resolution(
-            self, context, index):
+            self, context, index, max_workers=None, use_index=False):
 
         node_instances = {
             'node1_1': {
@@ -346,19 +371,31 @@ class TestEvaluateFunctions(AbstractTestParser):
         nodes = {}
         for node_instance in node_instances.values():
             nodes[node_instance.node_id] = Node({
+                'id': node_instance.node_id,
                 'relationships': [
                     {'target_id': r['target_name'],
                      'type_hierarchy': [constants.CONTAINED_IN_REL_TYPE]}
                     for r in node_instance.get('relationships', [])],
             })
 
+        fetching_threads = set()
+        fetched = []
+        scaling_groups_index = None
+        if use_index:
+            scaling_groups_index = functions.ScalingGroupsIndex(
+                nodes.values(), node_instances.values())
+
         def get_node_instances(node_id):
             return node_to_node_instances[node_id]
 
         def get_node_instance(node_instance_id):
+            fetching_threads.add(threading.current_thread())
+            fetched.append(node_instance_id)
             return node_instances[node_instance_id]
 
         def get_node(node_id):
+            fetching_threads.add(threading.current_thread())
+            fetched.append(node_id)
             return nodes[node_id]
 
         payload = {'a': {'get_attribute': ['node6', 'key']}}
@@ -367,9 +404,15 @@ class TestEvaluateFunctions(AbstractTestParser):
                                      get_node_instances,
                                      get_node_instance,
                                      get_node,
-                                     None)
+                                     None,
+                                     max_workers=max_workers,
+                                     scaling_groups_index=scaling_groups_index)
 
         self.assertEqual(payload['a'], 'value6_{0}'.format(index))
+        if use_index:
+            # only the context node instances are fetched
+            self.assertLessEqual(set(fetched), set(context.values()))
+        return fetching_threads
 
     def test_process_attributes_properties_fallback(self):
 
@@ -500,6 +543,266 @@ class TestEvaluateFunctions(AbstractTestParser):
                                          None)
 
 
+class TestScalingGroupsIndex(AbstractTestParser):
+
+    def test_scaling_groups_index_from_deployment_plan(self):
+        yaml = self.BASIC_VERSION_SECTION_DSL_1_3 + """
+node_types:
+    cloudify.nodes.Compute: {}
+    app: {}
+relationships:
+    cloudify.relationships.contained_in: {}
+node_templates:
+    host:
+        type: cloudify.nodes.Compute
+    app:
+        type: app
+        relationships:
+            -   type: cloudify.relationships.contained_in
+                target: host
+groups:
+    host_group:
+        members: [host]
+    app_group:
+        members: [app]
+policies:
+    host_policy:
+        type: cloudify.policies.scaling
+        properties:
+            default_instances: 2
+        targets: [host_group]
+    app_policy:
+        type: cloudify.policies.scaling
+        properties:
+            default_instances: 3
+        targets: [app_group]
+"""
+        plan = prepare_deployment_plan(self.parse(yaml))
+        index = functions.ScalingGroupsIndex.from_deployment_plan(plan)
+        instances = dict((i['id'], i) for i in plan['node_instances'])
+        apps = [i for i in instances.values() if i['node_id'] == 'app']
+        self.assertEqual(6, len(apps))
+        for app in apps:
+            self.assertIn(app['id'], index)
+            self.assertEqual(['app_group', 'host_group'],
+                             index.containing_groups(app['id']))
+            host = instances[app['relationships'][0]['target_id']]
+            self.assertEqual(['host_group'],
+                             index.containing_groups(host['id']))
+            self.assertEqual(host['scaling_groups'][0]['id'],
+                             index.group_instance(app['id'], 'host_group'))
+            self.assertEqual(app['scaling_groups'][0]['id'],
+                             index.group_instance(app['id'], 'app_group'))
+            self.assertIsNone(index.group_instance(host['id'], 'app_group'))
+        self.assertNotIn('missing', index)
+
+
+class TestEvaluateFunctionsBatch(AbstractTestParser):
+
+    def setUp(self):
+        super(TestEvaluateFunctionsBatch, self).setUp()
+        self.node_instances = dict((node_instance['id'], node_instance)
+                                   for node_instance in [
+            NodeInstance({'id': 'vm_1', 'node_id': 'vm',
+                          'runtime_properties': {'ip': '10.0.0.1'}}),
+            NodeInstance({'id': 'app_1', 'node_id': 'app',
+                          'runtime_properties': {},
+                          'relationships': [{'target_name': 'vm',
+                                             'target_id': 'vm_1'}]}),
+            NodeInstance({'id': 'app_2', 'node_id': 'app',
+                          'runtime_properties': {'port': 8081},
+                          'relationships': [{'target_name': 'vm',
+                                             'target_id': 'vm_1'}]})
+        ])
+        self.nodes = {
+            'vm': Node({'id': 'vm', 'properties': {}}),
+            'app': Node({'id': 'app', 'properties': {'port': 8080}})
+        }
+        self.calls = collections.defaultdict(list)
+
+    def _method(self, name, func):
+        def method(arg):
+            self.calls[name].append(arg)
+            return func(arg)
+        return method
+
+    def _evaluate_batch(self, payloads, bulk=True, max_workers=None):
+        get_node_instances = self._method(
+            'get_node_instances',
+            lambda node_id: [i for i in self.node_instances.values()
+                             if i.node_id == node_id])
+        get_node_instances_bulk = self._method(
+            'get_node_instances_bulk',
+            lambda ids: [self.node_instances[i] for i in ids])
+        get_nodes_bulk = self._method(
+            'get_nodes_bulk', lambda ids: [self.nodes[i] for i in ids])
+        return functions.evaluate_functions_batch(
+            payloads,
+            get_node_instances_method=get_node_instances,
+            get_node_instance_method=self._method(
+                'get_node_instance', self.node_instances.get),
+            get_node_method=self._method('get_node', self.nodes.get),
+            get_secret_method=None,
+            get_node_instances_bulk_method=(
+                get_node_instances_bulk if bulk else None),
+            get_nodes_bulk_method=get_nodes_bulk if bulk else None,
+            max_workers=max_workers)
+
+    def _payloads(self):
+        payloads = []
+        for app_id in ['app_1', 'app_2']:
+            for _ in range(3):
+                payloads.append((
+                    {'port': {'get_attribute': ['SELF', 'port']},
+                     'url': {'concat': [
+                         {'get_attribute': ['vm', 'ip']}, ':',
+                         {'get_attribute': ['SELF', 'port']}]}},
+                    {'self': app_id}))
+        payloads.append(({'ip': {'get_attribute': ['TARGET', 'ip']}},
+                         {'source': 'app_1', 'target': 'vm_1'}))
+        return payloads
+
+    def _assert_evaluated(self, result):
+        expected = (
+            3 * [{'port': 8080, 'url': '10.0.0.1:8080'}] +
+            3 * [{'port': 8081, 'url': '10.0.0.1:8081'}] +
+            [{'ip': '10.0.0.1'}])
+        self.assertEqual(expected, result)
+
+    def test_evaluate_functions_batch(self):
+        payloads = self._payloads()
+        result = self._evaluate_batch(payloads, bulk=False)
+        self._assert_evaluated(result)
+        self.assertIs(payloads[0][0], result[0])
+        self.assertEqual(['vm'], self.calls['get_node_instances'])
+        self.assertEqual(['app'], self.calls['get_node'])
+        # vm_1 is known from the node instances of vm
+        self.assertEqual(['app_1', 'app_2'],
+                         sorted(self.calls['get_node_instance']))
+
+    def test_evaluate_functions_batch_bulk_prefetch(self):
+        result = self._evaluate_batch(self._payloads())
+        self._assert_evaluated(result)
+        self.assertEqual([['app_1', 'app_2', 'vm_1']],
+                         self.calls['get_node_instances_bulk'])
+        self.assertEqual([['app', 'vm']], self.calls['get_nodes_bulk'])
+        self.assertEqual(['vm'], self.calls['get_node_instances'])
+        self.assertEqual([], self.calls['get_node_instance'])
+        self.assertEqual([], self.calls['get_node'])
+
+    def test_evaluate_functions_batch_concurrent_prefetch(self):
+        result = self._evaluate_batch(self._payloads(), bulk=False,
+                                      max_workers=4)
+        self._assert_evaluated(result)
+        self.assertEqual(['vm'], self.calls['get_node_instances'])
+        self.assertEqual(['app_1', 'app_2'],
+                         sorted(self.calls['get_node_instance']))
+        self.assertEqual(['app', 'vm'], sorted(self.calls['get_node']))
+
+    def test_evaluate_functions_batch_without_references(self):
+        result = self._evaluate_batch([({'a': 1}, {}),
+                                       ({'b': {'concat': ['x', 'y']}}, {})])
+        self.assertEqual([{'a': 1}, {'b': 'xy'}], result)
+        self.assertEqual({}, dict(self.calls))
+
+
+class TestRuntimeEvaluationCache(AbstractTestParser):
+
+    def setUp(self):
+        super(TestRuntimeEvaluationCache, self).setUp()
+        self.node_instances = {
+            'vm_1': NodeInstance({'id': 'vm_1', 'node_id': 'vm',
+                                  'version': 1,
+                                  'runtime_properties': {'ip': '10.0.0.1'}})
+        }
+        self.calls = []
+        self.now = 0
+
+    def _evaluate(self, cache):
+        def get_node_instances(node_id):
+            self.calls.append(('get_node_instances', node_id))
+            return [i for i in self.node_instances.values()
+                    if i.node_id == node_id]
+
+        def get_node_instance(node_instance_id):
+            self.calls.append(('get_node_instance', node_instance_id))
+            return self.node_instances[node_instance_id]
+
+        def get_node(node_id):
+            self.calls.append(('get_node', node_id))
+            return Node({'id': node_id, 'properties': {'port': 80}})
+
+        payload = {'ip': {'get_attribute': ['vm', 'ip']},
+                   'self_ip': {'get_attribute': ['SELF', 'ip']},
+                   'port': {'get_attribute': ['SELF', 'port']}}
+        functions.evaluate_functions(payload, {'self': 'vm_1'},
+                                     get_node_instances, get_node_instance,
+                                     get_node, None, cache=cache)
+        return payload
+
+    def _update(self, ip, version):
+        self.node_instances['vm_1'] = NodeInstance(
+            dict(self.node_instances['vm_1'], version=version,
+                 runtime_properties={'ip': ip}))
+
+    def test_cache_shared_by_evaluations(self):
+        cache = functions.RuntimeEvaluationCache()
+        expected = {'ip': '10.0.0.1', 'self_ip': '10.0.0.1', 'port': 80}
+        self.assertEqual(expected, self._evaluate(cache))
+        self.assertEqual(expected, self._evaluate(cache))
+        self.assertEqual([('get_node_instances', 'vm'), ('get_node', 'vm')],
+                         self.calls)
+        self.assertEqual(2, len(cache))
+
+        self._update('10.0.0.2', version=2)
+        cache.invalidate_node_instance('vm_1')
+        self.assertEqual('10.0.0.2', self._evaluate(cache)['ip'])
+        self.assertEqual(('get_node_instances', 'vm'), self.calls[-1])
+
+        del self.calls[:]
+        cache.invalidate_node('vm')
+        self.assertEqual(80, self._evaluate(cache)['port'])
+        self.assertEqual([('get_node_instances', 'vm'), ('get_node', 'vm')],
+                         self.calls)
+
+    def test_cache_versioned_invalidation(self):
+        cache = functions.RuntimeEvaluationCache()
+        cache.put(cache.NODE_INSTANCE, 'vm_1', self.node_instances['vm_1'])
+        cache.invalidate_node_instance('vm_1', version=1)
+        self.assertIs(self.node_instances['vm_1'],
+                      cache.get(cache.NODE_INSTANCE, 'vm_1'))
+        cache.invalidate_node_instance('vm_1', version=2)
+        self.assertIs(functions.NOT_CACHED,
+                      cache.get(cache.NODE_INSTANCE, 'vm_1'))
+
+    def test_cache_ttl(self):
+        cache = functions.RuntimeEvaluationCache(ttl=10,
+                                                 clock=lambda: self.now)
+        self._evaluate(cache)
+        self.now = 9
+        self._update('10.0.0.2', version=2)
+        self.assertEqual('10.0.0.1', self._evaluate(cache)['ip'])
+        self.assertEqual(2, len(self.calls))
+        self.now = 10
+        self.assertEqual('10.0.0.2', self._evaluate(cache)['ip'])
+        self.assertEqual(4, len(self.calls))
+
+    def test_cache_lru_eviction(self):
+        cache = functions.RuntimeEvaluationCache(max_size=2)
+        cache.put(cache.NODE, 'a', 'a')
+        cache.put(cache.NODE, 'b', 'b')
+        self.assertEqual('a', cache.get(cache.NODE, 'a'))
+        cache.put(cache.SECRET, 'c', 'c')
+        self.assertEqual(2, len(cache))
+        self.assertIs(functions.NOT_CACHED, cache.get(cache.NODE, 'b'))
+        self.assertEqual('a', cache.get(cache.NODE, 'a'))
+        self.assertEqual('c', cache.get(cache.SECRET, 'c'))
+        cache.invalidate_secret('c')
+        self.assertIs(functions.NOT_CACHED, cache.get(cache.SECRET, 'c'))
+        cache.clear()
+        self.assertEqual(0, len(cache))
+
+
 class NodeInstance(dict):
 
     def __init__(self, values):
@@ -525,6 +828,10 @@ class NodeInstance(dict):
     def scaling_groups(self):
         return self.get('scaling_groups')
 
+    @property
+    def version(self):
+        return self.get('version')
+
 
 class Node(dict):
 
@@ -13,10 +13,14 @@
 #    * See the License for the specific language governing permissions and
 #    * limitations under the License.
 
+import threading
+import time
+
 from dsl_parser import functions
 from mock import MagicMock
 from dsl_parser import exceptions
-from dsl_parser.tasks import prepare_deployment_plan
+from dsl_parser.tasks import (prepare_deployment_plan,
+                              compile_deployment_template)
 from dsl_parser.tests.abstract_test_parser import AbstractTestParser
 
 
@@ -194,15 +198,75 @@ node_templates:
         expected_message = "Required secrets \['ip', 'source_op_secret_id'\]" \
                            " don't exist in this tenant"
 
-        get_secret_not_found = MagicMock()
-        get_secret_not_found.side_effect = [None, None, TestNotFoundException,
-                                            None, None, None,
-                                            TestNotFoundException]
+        # secrets are validated concurrently, so the secret store is
+        # keyed by secret rather than by call order
+        secret_store = _SecretStore(['target_op_secret_id',
+                                     'node_template_secret_id', 'agent_key',
+                                     'user', 'webserver_port'])
         self.assertRaisesRegexp(exceptions.UnknownSecretError,
                                 expected_message,
                                 prepare_deployment_plan,
                                 self.parse_1_3(self.secrets_yaml),
-                                get_secret_not_found)
+                                secret_store.get)
+
+    def test_validate_secrets_concurrently(self):
+        secret_store = _SecretStore(['target_op_secret_id',
+                                     'node_template_secret_id', 'ip',
+                                     'agent_key', 'user', 'webserver_port',
+                                     'source_op_secret_id'],
+                                    latency=0.05)
+        prepare_deployment_plan(self.parse_1_3(self.secrets_yaml),
+                                secret_store.get)
+        self.assertEqual(7, len(secret_store.requested))
+        self.assertGreater(secret_store.max_concurrent_requests, 1)
+
+        secret_store = _SecretStore(['ip', 'user'], latency=0.05)
+        self.assertRaisesRegexp(exceptions.UnknownSecretError,
+                                "Required secrets \['target_op_secret_id', "
+                                "'node_template_secret_id', 'agent_key', "
+                                "'webserver_port', 'source_op_secret_id'\] "
+                                "don't exist in this tenant",
+                                prepare_deployment_plan,
+                                self.parse_1_3(self.secrets_yaml),
+                                secret_store.get)
+
+    def test_validate_secrets_serially(self):
+        calling_thread = threading.current_thread()
+        threads = set()
+
+        def get_secret(secret_key):
+            threads.add(threading.current_thread())
+            return 'secret_value'
+        prepare_deployment_plan(self.parse_1_3(self.secrets_yaml),
+                                get_secret, max_workers=1)
+        self.assertEqual(set([calling_thread]), threads)
+
+        template = compile_deployment_template(
+            self.parse_1_3(self.secrets_yaml))
+        threads.clear()
+        template.prepare_deployment_plan(get_secret, max_workers=1)
+        self.assertEqual(set([calling_thread]), threads)
+
+    def test_validate_secrets_bulk(self):
+        secret_store = _SecretStore(['target_op_secret_id',
+                                     'node_template_secret_id', 'agent_key',
+                                     'user', 'webserver_port'])
+        get_secret_mock = MagicMock()
+        expected_message = "Required secrets \['ip', 'source_op_secret_id'\]" \
+                           " don't exist in this tenant"
+        self.assertRaisesRegexp(exceptions.UnknownSecretError,
+                                expected_message,
+                                prepare_deployment_plan,
+                                self.parse_1_3(self.secrets_yaml),
+                                get_secret_mock,
+                                get_secrets_bulk_method=secret_store.exist)
+        self.assertFalse(get_secret_mock.called)
+        self.assertEqual(1, secret_store.bulk_requests)
+        self.assertEqual(7, len(secret_store.requested))
+
+        secret_store.secrets.update(['ip', 'source_op_secret_id'])
+        prepare_deployment_plan(self.parse_1_3(self.secrets_yaml),
+                                get_secrets_bulk_method=secret_store.exist)
 
     def test_validate_secrets_without_secrets(self):
         no_secrets_yaml = """
@@ -252,6 +316,40 @@ class TestNotFoundException(Exception):
     http_code = 404
 
 
+class _SecretStore(object):
+    """An in memory secret store answering requests after a latency."""
+
+    def __init__(self, secrets, latency=0):
+        self.secrets = set(secrets)
+        self.latency = latency
+        self.requested = []
+        self.bulk_requests = 0
+        self.max_concurrent_requests = 0
+        self._concurrent_requests = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            self.requested.append(key)
+            self._concurrent_requests += 1
+            self.max_concurrent_requests = max(self.max_concurrent_requests,
+                                               self._concurrent_requests)
+        try:
+            time.sleep(self.latency)
+            if key not in self.secrets:
+                raise TestNotFoundException(key)
+            return 'secret_value'
+        finally:
+            with self._lock:
+                self._concurrent_requests -= 1
+
+    def exist(self, keys):
+        self.bulk_requests += 1
+        self.requested.extend(keys)
+        time.sleep(self.latency)
+        return dict((key, key in self.secrets) for key in keys)
+
+
 class TestEvaluateFunctions(AbstractTestParser):
 
     def test_evaluate_functions(self):
@@ -0,0 +1,77 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import pickle
+
+from dsl_parser import interning, models
+from dsl_parser.tests.abstract_test_parser import AbstractTestParser
+
+
+class TestInterning(AbstractTestParser):
+
+    def _plan(self):
+        yaml = self.BASIC_PLUGIN + """
+node_types:
+    test_type:
+        properties:
+            port:
+                default: 80
+            ports:
+                default: [1, 2]
+        interfaces:
+            test_interface:
+                start:
+                    implementation: test_plugin.start
+                    inputs:
+                        key:
+                            default: value
+node_templates:
+"""
+        for i in range(20):
+            yaml += """
+    node{0}:
+        type: test_type
+        properties:
+            port: {0}
+""".format(i)
+        return self.parse_1_3(yaml)
+
+    def test_intern_plan(self):
+        plan = self._plan()
+        interned = interning.intern_plan(plan)
+        self.assertEqual(plan, interned)
+        self.assertIsInstance(interned, models.Plan)
+        self.assertIsInstance(interned['version'], models.Version)
+        nodes = interned['nodes']
+        first, second = nodes[0], nodes[1]
+        self.assertIs(first['operations']['start'],
+                      first['operations']['test_interface.start'])
+        self.assertIs(first['operations'], second['operations'])
+        self.assertIs(first['type_hierarchy'], second['type_hierarchy'])
+        self.assertIs(first['properties']['ports'],
+                      second['properties']['ports'])
+        self.assertIsNot(first['properties'], second['properties'])
+        self.assertLess(len(pickle.dumps(interned, 2)),
+                        len(pickle.dumps(plan, 2)))
+
+    def test_intern_distinguishes_types(self):
+        interned = interning.intern_plan(
+            {'a': [1, True, 1.0, '1'], 'b': {}, 'c': [], 'd': {1: True}})
+        self.assertEqual([1, True, 1.0, '1'], interned['a'])
+        self.assertEqual([int, bool, float, str],
+                         [type(v) for v in interned['a']])
+        self.assertEqual({}, interned['b'])
+        self.assertEqual([], interned['c'])
+        self.assertIs(True, interned['d'][1])
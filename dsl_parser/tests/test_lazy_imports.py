@@ -0,0 +1,60 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+
+import json
+import subprocess
+import sys
+
+import testtools
+
+_IMPORTED_MODULES = """
+import json
+import sys
+import {0}
+print(json.dumps([name for name, module in sys.modules.items() if module]))
+"""
+
+HEAVY_MODULES = ['networkx', 'requests', 'retrying', 'yaml', 'pkg_resources',
+                 'urllib2', 'multiprocessing']
+
+
+class TestLazyImports(testtools.TestCase):
+
+    def _imported_modules(self, module):
+        # imported in a new interpreter, the tests import everything
+        output = subprocess.check_output(
+            [sys.executable, '-c', _IMPORTED_MODULES.format(module)])
+        return set(json.loads(output))
+
+    def test_runtime_entry_points(self):
+        for module in ['dsl_parser.tasks',
+                       'dsl_parser.functions',
+                       'dsl_parser.multi_instance']:
+            imported = self._imported_modules(module)
+            self.assertEqual([], [name for name in HEAVY_MODULES
+                                  if name in imported], module)
+            self.assertNotIn('dsl_parser.parser', imported)
+            self.assertEqual([], [name for name in imported
+                                  if name.startswith('dsl_parser.elements')])
+
+    def test_tasks_parser_attribute(self):
+        from dsl_parser import parser, tasks
+        self.assertIs(parser.parse_from_path, tasks.parser.parse_from_path)
+
+    def test_parser_imports_yaml(self):
+        imported = self._imported_modules('dsl_parser.parser')
+        self.assertIn('yaml', imported)
+        self.assertNotIn('requests', imported)
@@ -348,6 +348,87 @@ outputs:
         self.assertEqual('http', outputs['protocol'])
         self.assertIsNone(outputs['none'])
 
+    def test_outputs_evaluator(self):
+        yaml = """
+node_types:
+    type: {}
+node_templates:
+    vm:
+        type: type
+    app:
+        type: type
+outputs:
+    ip:
+        value: { get_attribute: [ vm, ip ] }
+    url:
+        value:
+            concat:
+                - { get_attribute: [ vm, ip ] }
+                - ':'
+                - { get_attribute: [ app, endpoint, port ] }
+    static:
+        value: [1, 2]
+"""
+        parsed = self.parse_1_1(yaml)
+        node_instances = {
+            'vm_1': NodeInstance({'id': 'vm_1', 'node_id': 'vm',
+                                  'runtime_properties': {'ip': '10.0.0.1'}}),
+            'app_1': NodeInstance({'id': 'app_1', 'node_id': 'app',
+                                   'runtime_properties': {
+                                       'endpoint': {'port': 8080}}})
+        }
+        listed = []
+
+        def get_node_instances(node_id):
+            listed.append(node_id)
+            return [i for i in node_instances.values()
+                    if i.node_id == node_id]
+
+        def get_node_instance(node_instance_id):
+            return node_instances[node_instance_id]
+
+        def get_node(node_id):
+            return Node({'id': node_id})
+
+        evaluator = functions.OutputsEvaluator(parsed['outputs'],
+                                               get_node_instances,
+                                               get_node_instance,
+                                               get_node,
+                                               None)
+        expected = {'ip': '10.0.0.1', 'url': '10.0.0.1:8080',
+                    'static': [1, 2]}
+        self.assertEqual(expected, evaluator.evaluate())
+        self.assertEqual({
+            'ip': set([('vm_1', ('ip',))]),
+            'url': set([('vm_1', ('ip',)), ('app_1', ('endpoint', 'port'))]),
+            'static': set()}, evaluator.dependencies)
+        self.assertEqual({'get_attribute': ['vm', 'ip']},
+                         parsed['outputs']['ip']['value'])
+
+        node_instances['app_1']['runtime_properties'] = {
+            'endpoint': {'port': 9090}}
+        node_instances['vm_1']['runtime_properties'] = {'ip': '10.0.0.2'}
+        del listed[:]
+        self.assertEqual({'ip': '10.0.0.1', 'url': '10.0.0.2:9090',
+                          'static': [1, 2]},
+                         evaluator.evaluate(['app_1']))
+        self.assertEqual(['vm', 'app'], listed)
+
+        del listed[:]
+        evaluator.evaluate([])
+        self.assertEqual([], listed)
+        self.assertEqual('10.0.0.2', evaluator.evaluate(['vm_1'])['ip'])
+
+        node_instances['vm_2'] = NodeInstance({'id': 'vm_2',
+                                               'node_id': 'vm'})
+        self.assertRaises(exceptions.FunctionEvaluationError,
+                          evaluator.evaluate, ['vm_2'], ['vm'])
+        del node_instances['vm_2']
+        self.assertEqual(expected.keys(), evaluator.evaluate(['vm_1']).keys())
+        outputs = evaluator.evaluate()
+        outputs['static'].append(3)
+        self.assertEqual([1, 2], evaluator.evaluate()['static'])
+
 
 class NodeInstance(dict):
     @property
@@ -0,0 +1,144 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+
+import json
+import os
+from StringIO import StringIO
+
+import mock
+
+from dsl_parser import cli, parser, utils
+from dsl_parser.import_resolver.default_import_resolver import \
+    DefaultImportResolver
+from dsl_parser.parser import parse_many, _CachingImportResolver
+from dsl_parser.tests.abstract_test_parser import AbstractTestParser
+
+
+class _CountingResolver(DefaultImportResolver):
+
+    def __init__(self):
+        super(_CountingResolver, self).__init__()
+        self.fetched = []
+
+    def fetch_import(self, import_url):
+        self.fetched.append(import_url)
+        return super(_CountingResolver, self).fetch_import(import_url)
+
+
+class _ParentOnlyResolver(DefaultImportResolver):
+    """Fails fetching imports in any process but the one creating it."""
+
+    def __init__(self):
+        super(_ParentOnlyResolver, self).__init__()
+        self.pid = os.getpid()
+
+    def fetch_import(self, import_url):
+        if os.getpid() != self.pid:
+            raise RuntimeError('fetched by a worker')
+        return super(_ParentOnlyResolver, self).fetch_import(import_url)
+
+
+class TestParseMany(AbstractTestParser):
+
+    def setUp(self):
+        super(TestParseMany, self).setUp()
+        types = self.make_yaml_file(self.BASIC_VERSION_SECTION_DSL_1_3 + """
+node_types:
+    test_type:
+        properties:
+            key:
+                default: 'default'
+""")
+        self.valid = [
+            self.make_yaml_file(
+                'imports: [{0}]\n'.format(types) +
+                self.BASIC_VERSION_SECTION_DSL_1_3 +
+                self.BASIC_NODE_TEMPLATES_SECTION)
+            for _ in range(3)]
+        self.invalid = self.make_yaml_file(
+            self.BASIC_VERSION_SECTION_DSL_1_3 +
+            self.BASIC_NODE_TEMPLATES_SECTION)
+        self.missing = os.path.join(self._temp_dir, 'missing.yaml')
+        self.paths = self.valid[:2] + [self.invalid, self.missing] + \
+            self.valid[2:]
+
+    def _assert_results(self, results):
+        self.assertEqual(self.paths, [result['path'] for result in results])
+        self.assertEqual([True, True, False, False, True],
+                         [result['valid'] for result in results])
+        self.assertIsNone(results[0]['error'])
+        self.assertEqual('DSLParsingLogicException',
+                         results[2]['error']['type'])
+        self.assertEqual(7, results[2]['error']['error_code'])
+        self.assertIn('test_type', results[2]['error']['message'])
+        self.assertEqual('IOError', results[3]['error']['type'])
+        self.assertIsNone(results[3]['error']['error_code'])
+
+    def test_parse_in_processes(self):
+        results = list(parse_many(self.paths, processes=2))
+        self._assert_results(results)
+        self.assertNotIn('plan', results[0])
+
+    def test_parse_in_process(self):
+        resolver = _CountingResolver()
+        results = list(parse_many(self.paths, processes=1,
+                                  resolver=resolver, include_plans=True))
+        self._assert_results(results)
+        self.assertEqual('test_node', results[0]['plan']['nodes'][0]['id'])
+        self.assertIsNone(results[2]['plan'])
+        # the types are fetched once for all the blueprints
+        self.assertEqual(1, len(resolver.fetched))
+
+    def test_workers_share_the_warm_import_cache(self):
+        results = list(parse_many(self.valid, processes=2,
+                                  resolver=_ParentOnlyResolver()))
+        self.assertEqual([True] * 3, [result['valid'] for result in results])
+        self.assertIsNone(parser._parse_many_worker)
+
+    def test_caching_import_resolver(self):
+        resolver = _CachingImportResolver(_CountingResolver(), max_size=2)
+        urls = ['file:{0}'.format(path) for path in self.valid]
+        with mock.patch.object(utils, 'load_yaml',
+                               wraps=utils.load_yaml) as load_yaml:
+            first = resolver.load_import(urls[0], 'error')
+            second = resolver.load_import(urls[0], 'error')
+            self.assertEqual(1, load_yaml.call_count)
+        # the holders handed out are independent copies
+        self.assertIsNot(first, second)
+        self.assertEqual(first.restore(), second.restore())
+        resolver.load_import(urls[1], 'error')
+        resolver.load_import(urls[2], 'error')
+        resolver.load_import(urls[0], 'error')
+        self.assertEqual(urls + [urls[0]], resolver._resolver.fetched)
+
+    def test_cli(self):
+        stdout = StringIO()
+        stderr = StringIO()
+        stdin = StringIO('\n'.join(self.paths[1:]) + '\n')
+        exit_code = cli.main([self.paths[0], '-', '--processes', '2'],
+                             stdin=stdin, stdout=stdout, stderr=stderr)
+        self.assertEqual(1, exit_code)
+        self._assert_results(
+            [json.loads(line) for line in stdout.getvalue().splitlines()])
+        self.assertEqual('2 invalid blueprints\n', stderr.getvalue())
+
+        stdout = StringIO()
+        self.assertEqual(0, cli.main(self.valid + ['--plans'],
+                                     stdout=stdout, stderr=stderr))
+        results = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(['test_node'] * 3,
+                         [result['plan']['nodes'][0]['id']
+                          for result in results])
@@ -1905,6 +1905,93 @@ plugins:
         self.assertEquals('test_plugin', plugin['name'])
         self.assertEquals(1, len(result['nodes'][0]['plugins_to_install']))
 
+    def test_node_templates_sharing_type_interfaces(self):
+        yaml = self.BASIC_PLUGIN + """
+node_types:
+    test_type:
+        interfaces:
+            test_interface:
+                start:
+                    implementation: test_plugin.start
+                    inputs:
+                        port:
+                            default: 80
+node_templates:
+    node1:
+        type: test_type
+    node2:
+        type: test_type
+    node3:
+        type: test_type
+        interfaces:
+            test_interface:
+                start:
+                    inputs:
+                        port: 8080
+"""
+        result = self.parse(yaml)
+        nodes = dict((node['id'], node) for node in result['nodes'])
+        for node_id, port in [('node1', 80), ('node2', 80), ('node3', 8080)]:
+            self.assertEqual(
+                op_struct('test_plugin', 'start', inputs={'port': port},
+                          executor='central_deployment_agent'),
+                nodes[node_id]['operations']['test_interface.start'])
+        # parsed nodes do not share their operations
+        nodes['node1']['operations']['start']['inputs']['port'] = 0
+        self.assertEqual(
+            80, nodes['node2']['operations']['start']['inputs']['port'])
+        self.assertEqual(
+            80, nodes['node2']['interfaces']['test_interface']['start'][
+                'inputs']['port'])
+
+    def test_node_templates_sharing_type_properties(self):
+        yaml = """
+node_types:
+    test_type:
+        properties:
+            key:
+                default: value
+            list:
+                default: [1]
+            required: {}
+node_templates:
+    node1:
+        type: test_type
+        properties:
+            required: 1
+    node2:
+        type: test_type
+        properties:
+            required: 2
+            key: other
+    node3:
+        type: test_type
+        properties:
+            required: 3
+"""
+        result = self.parse(yaml)
+        nodes = dict((node['id'], node['properties'])
+                     for node in result['nodes'])
+        self.assertEqual({'key': 'value', 'list': [1], 'required': 1},
+                         nodes['node1'])
+        self.assertEqual({'key': 'other', 'list': [1], 'required': 2},
+                         nodes['node2'])
+        self.assertEqual({'key': 'value', 'list': [1], 'required': 3},
+                         nodes['node3'])
+        nodes['node1']['list'].append(2)
+        self.assertEqual([1], nodes['node3']['list'])
+
+        for node_id, properties, error_code in [
+                ('node2', 'list: []', 107),
+                ('node3', 'required: 3\n            undefined: 3', 106)]:
+            invalid_yaml = yaml.replace(
+                'required: {0}'.format(node_id[-1]), properties)
+            ex = self._assert_dsl_parsing_exception_error_code(
+                invalid_yaml, error_code, exceptions.DSLParsingLogicException)
+            # the error is reported on the offending template
+            self.assertIn(node_id, ex.message)
+            self.assertEqual(node_id, ex.element.parent().name)
+
     def test_executor_override_plugin_declaration(self):
         yaml = """
 node_templates:
@@ -279,6 +279,47 @@ plugins:
         self._assert_dsl_parsing_exception_error_code(
             yaml, 91, DSLParsingLogicException)
 
+    def test_ambiguous_plugin_relationship_and_workflow_mapping(self):
+        plugins = """
+plugins:
+    one:
+        executor: central_deployment_agent
+        source: dummy
+    one.two:
+        executor: central_deployment_agent
+        source: dummy
+    other:
+        executor: central_deployment_agent
+        source: dummy
+"""
+        relationship_yaml = self.BASIC_NODE_TEMPLATES_SECTION + plugins + """
+node_types:
+    test_type:
+        properties:
+            key: {}
+relationships:
+    test_relationship:
+        source_interfaces:
+            test_interface:
+                op: one.two.three
+"""
+        workflow_yaml = self.BASIC_NODE_TEMPLATES_SECTION + plugins + """
+node_types:
+    test_type:
+        properties:
+            key: {}
+workflows:
+    install: one.two.three
+"""
+        for yaml in [relationship_yaml, workflow_yaml]:
+            ex = self._assert_dsl_parsing_exception_error_code(
+                yaml, 91, DSLParsingLogicException)
+            self.assertIn("'one.two'", str(ex))
+            self.assertIn("'one'", str(ex))
+            self.assertNotIn("'other'", str(ex))
+        self.parse(workflow_yaml.replace('one.two.three', 'one.three'))
+        self.parse(relationship_yaml.replace('one.two.three', 'other.op'))
+
     def test_node_set_non_existing_property(self):
         yaml = self.BASIC_NODE_TEMPLATES_SECTION + self.BASIC_PLUGIN + """
 node_types:
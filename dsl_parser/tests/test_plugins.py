@@ -19,11 +19,23 @@ from yaml import safe_dump as yaml_dump
 
 from dsl_parser.exceptions import DSLParsingLogicException
 from dsl_parser import constants
+from dsl_parser.elements.plugins import PluginsPrefixIndex
 from dsl_parser.tests.abstract_test_parser import AbstractTestParser
 
 
 class PluginsTest(AbstractTestParser):
 
+    def test_plugins_prefix_index(self):
+        index = PluginsPrefixIndex(['one', 'one.two', 'onetwo', 'two.one'])
+        self.assertEqual(['one', 'one.two'],
+                         index.candidates('one.two.three'))
+        self.assertEqual(['one'], index.candidates('one.three'))
+        self.assertEqual(['onetwo'], index.candidates('onetwo.three'))
+        self.assertEqual(['two.one'], index.candidates('two.one.three'))
+        self.assertEqual([], index.candidates('two.three'))
+        self.assertEqual([], index.candidates('one'))
+        self.assertEqual([], index.candidates('scripts/one.sh'))
+
     def test_plugin_with_install_true_existing_source(self):
         self._test(install=True,
                    source='dummy')
@@ -480,3 +480,66 @@ plugins:
         deployment_plugins_to_install_for_plan = \
             result[constants.DEPLOYMENT_PLUGINS_TO_INSTALL]
         self.assertEquals(1, len(deployment_plugins_to_install_for_plan))
+
+    def test_plugins_to_install_multiple_hosts(self):
+        yaml = """
+node_templates:
+    host1:
+        type: cloudify.nodes.Compute
+    host2:
+        type: cloudify.nodes.Compute
+    app1:
+        type: test_type
+        relationships:
+            -   type: cloudify.relationships.contained_in
+                target: host1
+    app2:
+        type: test_type
+        relationships:
+            -   type: cloudify.relationships.contained_in
+                target: host2
+    app3:
+        type: test_type2
+        relationships:
+            -   type: cloudify.relationships.contained_in
+                target: host2
+node_types:
+    cloudify.nodes.Compute: {}
+    test_type:
+        interfaces:
+            test_interface:
+                start: test_plugin.start
+                create:
+                    implementation: test_plugin.create
+                    executor: central_deployment_agent
+    test_type2:
+        interfaces:
+            test_interface2:
+                install: test_plugin2.install
+relationships:
+    cloudify.relationships.contained_in: {}
+plugins:
+    test_plugin:
+        executor: host_agent
+        source: dummy
+    test_plugin2:
+        executor: host_agent
+        source: dummy
+"""
+        result = self.parse(yaml)
+        nodes = dict((node['name'], node) for node in result['nodes'])
+        self.assertEqual(
+            ['test_plugin'],
+            [p['name'] for p in nodes['host1']['plugins_to_install']])
+        self.assertEqual(
+            ['test_plugin', 'test_plugin2'],
+            sorted(p['name'] for p in nodes['host2']['plugins_to_install']))
+        app1_plugins = dict((p['executor'], p)
+                            for p in nodes['app1']['plugins'])
+        self.assertEqual(['central_deployment_agent', 'host_agent'],
+                         sorted(app1_plugins))
+        self.assertEqual(
+            [app1_plugins['central_deployment_agent']],
+            nodes['app2'][constants.DEPLOYMENT_PLUGINS_TO_INSTALL])
+        self.assertEqual(
+            1, len(result[constants.DEPLOYMENT_PLUGINS_TO_INSTALL]))
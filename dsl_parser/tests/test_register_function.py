@@ -13,6 +13,8 @@
 #    * See the License for the specific language governing permissions and
 #    * limitations under the License.
 
+import mock
+
 from dsl_parser import functions
 from dsl_parser.tasks import prepare_deployment_plan
 from dsl_parser.tests.abstract_test_parser import AbstractTestParser
@@ -105,6 +107,54 @@ outputs:
         self.assertEqual('ATTRIBUTE_VALUE', o['output3'])
         self.assertEqual('SECRET_VALUE', o['output4'])
 
+    def test_entry_point_registration_is_deferred(self):
+        to_upper = mock.Mock()
+        get_input = mock.Mock()
+        entry_points = []
+        for name, fn in [('to_upper', to_upper), ('get_input', get_input)]:
+            entry_point = mock.Mock(load=mock.Mock(return_value=fn))
+            entry_point.name = name
+            entry_points.append(entry_point)
+        # the registered entry point functions are removed when done
+        self.addCleanup(functions.unregister, 'to_upper')
+        with mock.patch.dict(functions.TEMPLATE_FUNCTIONS), \
+                mock.patch.object(functions, '_entry_point_functions_state',
+                                  None), \
+                mock.patch('pkg_resources.iter_entry_points',
+                           return_value=entry_points) as iter_entry_points:
+            self.assertTrue(functions._is_function({'get_input': 'input'}))
+            self.assertFalse(iter_entry_points.called)
+            self.assertTrue(functions._is_function({'to_upper': 'value'}))
+            self.assertFalse(functions._is_function({'unknown': 'value'}))
+            iter_entry_points.assert_called_once_with(
+                group='cloudify.tosca.ext.functions')
+            self.assertIs(to_upper,
+                          functions.TEMPLATE_FUNCTIONS['to_upper'])
+            # built in functions are not replaced
+            self.assertIs(functions.GetInput,
+                          functions.TEMPLATE_FUNCTIONS['get_input'])
+        self.assertNotIn('to_upper', dict(functions.TEMPLATE_FUNCTIONS))
+
+    def test_entry_point_registration_retried_after_error(self):
+        to_upper = mock.Mock()
+        entry_point = mock.Mock(load=mock.Mock(
+            side_effect=[ImportError('broken'), to_upper]))
+        entry_point.name = 'to_upper'
+        self.addCleanup(functions.unregister, 'to_upper')
+        with mock.patch.dict(functions.TEMPLATE_FUNCTIONS), \
+                mock.patch.object(functions, '_entry_point_functions_state',
+                                  None), \
+                mock.patch('pkg_resources.iter_entry_points',
+                           return_value=[entry_point]) as iter_entry_points:
+            self.assertRaises(ImportError, functions._is_function,
+                              {'to_upper': 'value'})
+            self.assertIsNone(functions._entry_point_functions_state)
+            self.assertTrue(functions._is_function({'to_upper': 'value'}))
+            self.assertEqual(2, iter_entry_points.call_count)
+            self.assertIs(to_upper,
+                          functions.TEMPLATE_FUNCTIONS['to_upper'])
+        self.assertNotIn('to_upper', dict(functions.TEMPLATE_FUNCTIONS))
+
 
 class NodeInstance(dict):
     @property
@@ -0,0 +1,233 @@
+########
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import collections
+import io
+import json
+import struct
+
+from dsl_parser import models, serialization
+from dsl_parser.tasks import prepare_deployment_plan
+from dsl_parser.tests.abstract_test_parser import AbstractTestParser
+
+
+class _TrickleStream(io.BytesIO):
+    """A stream returning at most a few bytes per read."""
+
+    def read(self, size=-1):
+        if size < 0:
+            return super(_TrickleStream, self).read()
+        return super(_TrickleStream, self).read(min(size, 3))
+
+
+class TestSerialization(AbstractTestParser):
+
+    def _plan(self):
+        yaml = self.BASIC_PLUGIN + """
+inputs:
+    port:
+        default: 8080
+node_types:
+    cloudify.nodes.Compute: {}
+    test_type:
+        properties:
+            port: {}
+        interfaces:
+            test_interface:
+                start: test_plugin.start
+node_templates:
+    host:
+        type: cloudify.nodes.Compute
+        instances:
+            deploy: 2
+    node1:
+        type: test_type
+        properties:
+            port: { get_input: port }
+        relationships:
+            - type: cloudify.relationships.contained_in
+              target: host
+    node2:
+        type: test_type
+        properties:
+            port: 8081
+        relationships:
+            - type: cloudify.relationships.contained_in
+              target: host
+relationships:
+    cloudify.relationships.contained_in: {}
+"""
+        return self.parse_1_3(yaml)
+
+    def _dumps(self, value):
+        return serialization.dumps(value,
+                                   output_format=serialization.BINARY)
+
+    def _records(self, data):
+        # the payload sizes of the records of binary data
+        self.assertTrue(data.startswith(serialization.MAGIC))
+        position = len(serialization.MAGIC) + 1
+        sizes = []
+        while position < len(data):
+            size = struct.unpack('>I', data[position:position + 4])[0]
+            sizes.append(size)
+            position += 4 + size
+        self.assertEqual(len(data), position)
+        return sizes
+
+    def _assert_round_trip(self, value):
+        data = self._dumps(value)
+        self.assertEqual(0, self._records(data)[-1])
+        loaded = serialization.loads(data)
+        self.assertEqual(value, loaded)
+        self.assertEqual(type(value), type(loaded))
+        stream = io.BytesIO()
+        serialization.dump(value, stream, output_format=serialization.BINARY)
+        self.assertEqual(data, stream.getvalue())
+        self.assertEqual(
+            value, serialization.load(_TrickleStream(stream.getvalue())))
+        return loaded
+
+    def test_plan_round_trip(self):
+        plan = self._plan()
+        loaded = self._assert_round_trip(plan)
+        self.assertIsInstance(loaded, models.Plan)
+        self.assertIsInstance(loaded['version'], models.Version)
+        self.assertIsInstance(loaded['version']['definitions_version'],
+                              tuple)
+        self.assertLess(len(self._dumps(plan)), len(json.dumps(plan)))
+
+    def test_deployment_plan_round_trip(self):
+        deployment_plan = prepare_deployment_plan(self._plan())
+        self.assertEqual(6, len(deployment_plan['node_instances']))
+        loaded = self._assert_round_trip(deployment_plan)
+        self.assertIsInstance(loaded, models.Plan)
+
+    def test_json_reloaded_plan(self):
+        # plans stored as JSON are reloaded with unicode strings only
+        plan = json.loads(json.dumps(prepare_deployment_plan(self._plan())))
+        data = self._dumps(plan)
+        self.assertEqual(plan, serialization.loads(data))
+        self.assertLess(len(data) * 2, len(json.dumps(plan)))
+        # repeated unicode strings are written once
+        self.assertEqual(1, data.count(b'type_hierarchy'))
+
+    def test_values_round_trip(self):
+        loaded = self._assert_round_trip({
+            'str': 'value',
+            u'unicode': u'\u05e9\u05dc\u05d5\u05dd',
+            'same': ['value', u'value', 'value'],
+            'ints': [0, 1, -1, 63, -64, 127, 128, -129, 2 ** 70, -2 ** 70],
+            'floats': [0.0, -1.5, 1e300],
+            'constants': [None, True, False, 1, 0],
+            'empty': [{}, [], (), '', u''],
+            'tuple': (1, ('a', [2])),
+            (1, 'key'): 'tuple key',
+            1: {2: {None: 'nested'}},
+            'long_string': 'x' * 100000,
+        })
+        self.assertEqual([str, unicode, str],
+                         [type(item) for item in loaded['same']])
+        for value in [None, 'value', 0, 1.5, [], {}, [[[]]], ({},)]:
+            self._assert_round_trip(value)
+
+    def test_written_in_records(self):
+        value = [{'key': i, 'name': 'name_{0}'.format(i)}
+                 for i in range(10000)]
+        data = self._dumps(value)
+        records = self._records(data)
+        self.assertGreater(len(records), 2)
+        self.assertEqual(0, records[-1])
+        self.assertNotIn(0, records[:-1])
+        writes = []
+        stream = io.BytesIO()
+        stream.write = lambda chunk: writes.append(chunk)
+        serialization.dump(value, stream, output_format=serialization.BINARY)
+        self.assertEqual(data, b''.join(writes))
+        self.assertEqual(len(records) + 1, len(writes))
+
+        class _CountingStream(io.BytesIO):
+            read_sizes = []
+
+            def read(self, size=-1):
+                self.read_sizes.append(size)
+                return super(_CountingStream, self).read(size)
+        stream = _CountingStream(data)
+        self.assertEqual(value, serialization.load(stream))
+        self.assertNotIn(-1, stream.read_sizes)
+        self.assertLessEqual(max(stream.read_sizes), max(records))
+
+    def test_json_by_default(self):
+        plan = self._plan()
+        data = serialization.dumps(plan)
+        self.assertEqual(json.dumps(plan), data)
+        self.assertEqual(json.loads(data), serialization.loads(data))
+        stream = io.BytesIO()
+        serialization.dump(plan, stream)
+        self.assertEqual(json.loads(data),
+                         serialization.load(_TrickleStream(stream.getvalue())))
+        self.assertEqual([1], serialization.load(io.BytesIO(b'[1]')))
+
+    def test_invalid_data(self):
+        data = self._dumps({'key': ['value', 1.5]})
+        for truncated in [data[:-1], data[:-4], data[:-5], data[:-13],
+                          data[:len(serialization.MAGIC) + 3],
+                          data[:len(serialization.MAGIC)]]:
+            self.assertRaises(ValueError, serialization.loads, truncated)
+            self.assertRaises(ValueError, serialization.load,
+                              io.BytesIO(truncated))
+
+        def record(payload):
+            return struct.pack('>I', len(payload)) + payload
+        header = serialization.MAGIC + chr(serialization.FORMAT_VERSION)
+        end = record(b'')
+        self.assertEqual(None, serialization.loads(header + record(b'N') +
+                                                   end))
+        self.assertRaises(ValueError, serialization.loads,
+                          serialization.MAGIC + b'\x02' + record(b'N') + end)
+        self.assertRaises(ValueError, serialization.loads,
+                          header + record(b'?') + end)
+        self.assertRaises(ValueError, serialization.loads,
+                          header + record(b'NN') + end)
+        self.assertRaises(ValueError, serialization.loads,
+                          header + record(b'N') + record(b'N') + end)
+        self.assertRaises(ValueError, serialization.loads,
+                          header + record(b'l\x02N') + end)
+        self.assertRaises(TypeError, self._dumps, object())
+        self.assertRaises(TypeError, self._dumps,
+                          {'key': collections.OrderedDict(a=object())})
+
+    def test_subclasses_written_as_plain_values(self):
+        value = {'ordered': collections.OrderedDict([('a', 1), ('b', [2])])}
+        loaded = serialization.loads(self._dumps(value))
+        self.assertEqual(value, loaded)
+        self.assertIs(dict, type(loaded['ordered']))
+
+    def test_shared_load(self):
+        plan = prepare_deployment_plan(self._plan())
+        data = self._dumps(plan)
+        for shared in [False, True]:
+            loaded = serialization.loads(data, shared=shared)
+            self.assertEqual(plan, loaded)
+            self.assertIsInstance(loaded, models.Plan)
+            self.assertIsInstance(loaded['version'], models.Version)
+            first, second = [node for node in loaded['nodes']
+                             if node['type'] == 'test_type']
+            if shared:
+                self.assertIs(first['operations'], second['operations'])
+            else:
+                self.assertIsNot(first['operations'], second['operations'])
+        self.assertEqual(plan, serialization.load(io.BytesIO(data),
+                                                  shared=True))
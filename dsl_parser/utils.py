@@ -16,7 +16,6 @@
 import copy
 import contextlib
 import importlib
-import urllib2
 import sys
 
 import yaml.parser
@@ -85,11 +84,63 @@ def _property_description(path, name=None):
     if not path:
         return name
     if name is not None:
-        path = copy.copy(path)
-        path.append(name)
+        path = list(path) + [name]
     return '.'.join(path)
 
 
+class PropertiesSchema(object):
+    """A properties schema compiled for repeated validation.
+
+    Holds the flattened schema defaults and the per property type and
+    required flag so that validating many instances against the same
+    schema does not walk the schema definition over and over. Default
+    values are parsed once per schema.
+    """
+
+    def __init__(self, schema_properties):
+        self.properties = schema_properties
+        self.defaults = flatten_schema(schema_properties)
+        self.items = [(key, prop.get('type'), prop.get('required', True))
+                      for key, prop in schema_properties.iteritems()]
+        self.keys = frozenset(schema_properties)
+        # (property name, raise_on_missing_property) -> parsed default
+        self.parsed_defaults = {}
+
+
+class CompiledDataTypes(dict):
+    """Parsed data types along with their compiled properties schemas.
+
+    A data type schema is compiled the first time a value of that type is
+    validated and reused afterwards. Instances are never modified after
+    parsing so copying one returns the instance itself, which keeps the
+    compiled schemas shared between all the elements requiring the data
+    types of a blueprint.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CompiledDataTypes, self).__init__(*args, **kwargs)
+        self._schemas = {}
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def schema(self, type_name):
+        schema = self._schemas.get(type_name)
+        if schema is None:
+            schema = PropertiesSchema(self[type_name]['properties'])
+            self._schemas[type_name] = schema
+        return schema
+
+
+def _data_type_schema(data_types, type_name):
+    if isinstance(data_types, CompiledDataTypes):
+        return data_types.schema(type_name)
+    return PropertiesSchema(data_types[type_name]['properties'])
+
+
 def merge_schema_and_instance_properties(
         instance_properties,
         schema_properties,
@@ -99,17 +150,19 @@ def merge_schema_and_instance_properties(
         node_name,
         path=None,
         raise_on_missing_property=True):
-    flattened_schema_props = flatten_schema(schema_properties)
+    if not isinstance(schema_properties, PropertiesSchema):
+        schema_properties = PropertiesSchema(schema_properties)
     return _merge_flattened_schema_and_instance_properties(
         instance_properties=instance_properties,
         schema_properties=schema_properties,
-        flattened_schema_properties=flattened_schema_props,
+        flattened_schema_properties=schema_properties.defaults,
         data_types=data_types,
         undefined_property_error_message=undefined_property_error_message,
         missing_property_error_message=missing_property_error_message,
         node_name=node_name,
         path=path,
-        raise_on_missing_property=raise_on_missing_property)
+        raise_on_missing_property=raise_on_missing_property,
+        parsed_defaults=schema_properties.parsed_defaults)
 
 
 def _merge_flattened_schema_and_instance_properties(
@@ -121,14 +174,16 @@ def _merge_flattened_schema_and_instance_properties(
         missing_property_error_message,
         node_name,
         path,
-        raise_on_missing_property):
+        raise_on_missing_property,
+        parsed_defaults=None):
     path = path or []
 
     # validate instance properties don't
     # contain properties that are not defined
     # in the schema.
+    schema_keys = schema_properties.keys
     for key in instance_properties.iterkeys():
-        if key not in schema_properties:
+        if key not in schema_keys:
             ex = DSLParsingLogicException(
                 106,
                 undefined_property_error_message.format(
@@ -137,33 +192,57 @@ def _merge_flattened_schema_and_instance_properties(
             ex.property = key
             raise ex
 
-    merged_properties = dict(flattened_schema_properties.items() +
-                             instance_properties.items())
     result = {}
-    for key, property_schema in schema_properties.iteritems():
-        if key not in merged_properties:
-            required = property_schema.get('required', True)
-            if required and raise_on_missing_property:
-                ex = DSLParsingLogicException(
-                    107,
-                    missing_property_error_message.format(
-                        node_name,
-                        _property_description(path, key)))
-                ex.property = key
-                raise ex
-            else:
+    for key, type_name, required in schema_properties.items:
+        if key in instance_properties:
+            value = instance_properties[key]
+        elif key in flattened_schema_properties:
+            value = flattened_schema_properties[key]
+            if parsed_defaults is not None:
+                default_key = (key, raise_on_missing_property)
+                if default_key not in parsed_defaults:
+                    parsed_defaults[default_key] = parse_value(
+                        value=value,
+                        derived_value=value,
+                        type_name=type_name,
+                        data_types=data_types,
+                        undefined_property_error_message=(
+                            undefined_property_error_message),
+                        missing_property_error_message=(
+                            missing_property_error_message),
+                        node_name=node_name,
+                        path=path + [key],
+                        raise_on_missing_property=raise_on_missing_property)
+                value = parsed_defaults[default_key]
+                if isinstance(value, (dict, list)):
+                    # parsed defaults are shared between all the validated
+                    # instances.
+                    value = copy.deepcopy(value)
+                result[key] = value
                 continue
-        prop_path = copy.copy(path)
-        prop_path.append(key)
+            if isinstance(value, (dict, list)):
+                # schema defaults are shared between all the validated
+                # instances.
+                value = copy.deepcopy(value)
+        elif required and raise_on_missing_property:
+            ex = DSLParsingLogicException(
+                107,
+                missing_property_error_message.format(
+                    node_name,
+                    _property_description(path, key)))
+            ex.property = key
+            raise ex
+        else:
+            continue
         result[key] = parse_value(
-            value=merged_properties.get(key),
+            value=value,
             derived_value=flattened_schema_properties.get(key),
-            type_name=property_schema.get('type'),
+            type_name=type_name,
             data_types=data_types,
             undefined_property_error_message=undefined_property_error_message,
             missing_property_error_message=missing_property_error_message,
             node_name=node_name,
-            path=prop_path,
+            path=path + [key],
             raise_on_missing_property=raise_on_missing_property)
     return result
 
@@ -198,10 +277,13 @@ def parse_value(
         return value
     elif type_name in data_types:
         if isinstance(value, dict):
-            data_schema = data_types[type_name]['properties']
-            flattened_data_schema = flatten_schema(data_schema)
+            data_schema = _data_type_schema(data_types, type_name)
+            flattened_data_schema = data_schema.defaults
+            parsed_defaults = data_schema.parsed_defaults
             if isinstance(derived_value, dict):
+                flattened_data_schema = dict(flattened_data_schema)
                 flattened_data_schema.update(derived_value)
+                parsed_defaults = None
             undef_msg = undefined_property_error_message
             return _merge_flattened_schema_and_instance_properties(
                 instance_properties=value,
@@ -212,7 +294,8 @@ def parse_value(
                 missing_property_error_message=missing_property_error_message,
                 node_name=node_name,
                 path=path,
-                raise_on_missing_property=raise_on_missing_property)
+                raise_on_missing_property=raise_on_missing_property,
+                parsed_defaults=parsed_defaults)
     else:
         raise RuntimeError(
             "Unexpected type defined in property schema for property '{0}'"
@@ -240,6 +323,7 @@ def load_yaml(raw_yaml, error_message, filename=None):
 
 
 def url_exists(url):
+    import urllib2
     request = urllib2.Request(url)
     try:
         with contextlib.closing(urllib2.urlopen(request)):
@@ -47,5 +47,10 @@ setup(
     license='LICENSE',
     description='Cloudify DSL parser',
     zip_safe=False,
-    install_requires=install_requires
+    install_requires=install_requires,
+    entry_points={
+        'console_scripts': [
+            'cloudify-dsl-validate = dsl_parser.cli:main'
+        ]
+    }
 )